@@ -0,0 +1,61 @@
+import pytest
+
+from benchmarks.load import percentile
+from benchmarks.run import compare, parse_args, run_benchmark
+
+pytestmark = pytest.mark.asyncio
+
+SCENARIOS = {
+    "list_first_page",
+    "list_deep_cursor",
+    "search_common",
+    "search_rare",
+    "create",
+}
+
+
+def _results(**latencies: float) -> dict:
+    return {
+        "scenarios": {
+            name: {"p50_ms": value, "p95_ms": value * 2, "errors": 0}
+            for name, value in latencies.items()
+        }
+    }
+
+
+class TestBenchmarks:
+    async def test_sqlite_run(self) -> None:
+        args = parse_args(
+            [
+                "--rows=300",
+                "--batch-size=100",
+                "--author-pool-size=50",
+                "--requests=6",
+                "--concurrency=3",
+                "--warmup=1",
+            ]
+        )
+
+        results = await run_benchmark(args)
+
+        assert results["meta"]["dataset"]["rows"] == 300
+        assert results["scenarios"].keys() == SCENARIOS
+        for summary in results["scenarios"].values():
+            assert summary["requests"] == 6
+            assert summary["errors"] == 0
+            assert 0 < summary["p50_ms"] <= summary["p95_ms"] <= summary["max_ms"]
+
+    async def test_compare_flags_regressions_only(self) -> None:
+        baseline = _results(list_first_page=10, search_rare=10)
+
+        assert compare(_results(list_first_page=12), baseline, tolerance=0.25) == []
+        assert compare(
+            _results(list_first_page=10, search_rare=14), baseline, tolerance=0.25
+        ) == ["search_rare p50_ms +40%", "search_rare p95_ms +40%"]
+
+    async def test_percentile_nearest_rank(self) -> None:
+        values = [float(value) for value in range(1, 101)]
+
+        assert percentile(values, 50) == 50
+        assert percentile(values, 99) == 99
+        assert percentile([3.0], 95) == 3
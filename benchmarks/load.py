@@ -0,0 +1,101 @@
+import asyncio
+import math
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+import httpx
+
+
+@dataclass
+class Scenario:
+    """
+    One kind of request, `url` and `body` get the request's index within the run.
+    """
+
+    name: str
+    method: str
+    url: Callable[[int], str]
+    body: Callable[[int], dict[str, Any]] | None = None
+
+
+@dataclass
+class ScenarioResult:
+    requests: int
+    errors: int
+    seconds: float
+    latencies: list[float]
+
+    def summary(self) -> dict[str, float | int]:
+        latencies = sorted(self.latencies)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "throughput_rps": round(self.requests / self.seconds, 1),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2),
+        }
+
+
+def percentile(sorted_values: list[float], percent: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    rank = max(math.ceil(percent / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    *,
+    requests: int,
+    concurrency: int,
+    warmup: int = 0,
+    first_index: int = 0,
+) -> ScenarioResult:
+    """
+    Send `requests` requests from `concurrency` workers, each sending its next
+    request as soon as the previous one completed (closed loop).
+
+    Non-2xx responses count as errors, their latency is still recorded.
+    `first_index` offsets the request indexes (e.g. to keep created ISBNs unique
+    across scenarios), warmup requests take the indexes after the measured ones.
+    """
+
+    async def send(index: int) -> bool:
+        index += first_index
+        response = await client.request(
+            scenario.method,
+            scenario.url(index),
+            json=scenario.body(index) if scenario.body else None,
+        )
+        return response.is_success
+
+    for index in range(requests, requests + warmup):
+        await send(index)
+
+    latencies: list[float] = []
+    errors = 0
+    pending = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for index in pending:
+            started = time.perf_counter()
+            ok = await send(index)
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return ScenarioResult(
+        requests=requests,
+        errors=errors,
+        seconds=time.perf_counter() - started,
+        latencies=latencies,
+    )
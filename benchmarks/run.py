@@ -0,0 +1,466 @@
+"""
+Load benchmark of the book API: seeds a deterministic dataset with
+`scripts/generate_books.py`, drives the list, search and create endpoints with a
+concurrent async client and reports latency percentiles and throughput.
+
+    python -m benchmarks.run --target sqlite --rows 10000
+    python -m benchmarks.run --target postgresql --rows 1000000 --workers 4 \\
+        --baseline benchmarks/baselines/postgresql.json
+
+`sqlite` runs in-process against the in-memory test engine of `conftest.py`.
+`postgresql` uses the configured database (migrated with `alembic upgrade head`),
+seeding it only when `books` is empty, and calls the app in-process unless
+`--base-url` points at a running server.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import platform
+import subprocess
+import sys
+from collections import Counter
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+from urllib.parse import urlencode
+
+import httpx
+from sqlalchemy import Connection, create_engine, func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from benchmarks.load import Scenario, run_scenario
+from db.database import (
+    AsyncSessionLocal,
+    Base,
+    get_async_db,
+    get_async_sessionmaker,
+    get_read_db,
+    get_read_sessionmaker,
+)
+from db.model_books import Book
+from main import app
+from scripts.generate_books import (
+    AUTHOR_POOL_SIZE,
+    BOOK_COLUMNS,
+    batch_tasks,
+    build_pools,
+    generate_batch,
+    generate_books,
+    isbn13_for_index,
+)
+from services.books.admission import expensive_book_requests
+from services.books.cache import book_list_cache, book_list_flights
+from settings import get_config
+
+BOOK_URL = "/internal_api/book"
+BENCHMARKS_DIR = Path(__file__).parent
+# titles read to pick the search terms
+TERM_SAMPLE_ROWS = 5_000
+# latency metrics compared against the baseline, p99 is too noisy for short runs
+COMPARED_METRICS = ("p50_ms", "p95_ms")
+
+
+@dataclass
+class Dataset:
+    rows: int
+    min_id: int
+    max_id: int
+    # most frequent title word of the sample, matches many books
+    common_term: str
+    # longest title of the sample, matches (almost) only its own book
+    rare_term: str
+    seeded: bool
+
+
+@dataclass
+class Target:
+    name: str
+    client: httpx.AsyncClient
+    session_factory: async_sessionmaker[AsyncSession]
+    seeded: bool
+
+
+def _insert_dataset(
+    connection: Connection,
+    *,
+    rows: int,
+    seed: int,
+    batch_size: int,
+    author_pool_size: int,
+) -> None:
+    pools = build_pools(seed, author_pool_size=author_pool_size)
+    created_at = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    for task in batch_tasks(rows, batch_size, seed=seed, created_at=created_at):
+        connection.execute(
+            insert(Book),
+            [dict(zip(BOOK_COLUMNS, row)) for row in generate_batch(task, pools)],
+        )
+
+
+def _app_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://benchmark"
+    )
+
+
+@asynccontextmanager
+async def sqlite_target(
+    *, rows: int, seed: int, batch_size: int, author_pool_size: int
+) -> AsyncIterator[Target]:
+    """
+    Seed the in-memory test database and route the app's sessions to it.
+
+    Its `StaticPool` shares one connection between all sessions, so requests take
+    turns on the database: concurrency measures queueing, not parallel queries.
+    """
+    from conftest import TestAsyncSessionLocal, test_async_engine
+
+    async with test_async_engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        await connection.run_sync(
+            lambda sync_connection: _insert_dataset(
+                sync_connection,
+                rows=rows,
+                seed=seed,
+                batch_size=batch_size,
+                author_pool_size=author_pool_size,
+            )
+        )
+
+    lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def locked_session() -> AsyncIterator[AsyncSession]:
+        async with lock:
+            async with TestAsyncSessionLocal() as session:
+                yield session
+
+    async def get_benchmark_db() -> AsyncIterator[AsyncSession]:
+        async with locked_session() as session:
+            yield session
+
+    app.dependency_overrides[get_async_db] = get_benchmark_db
+    app.dependency_overrides[get_async_sessionmaker] = lambda: locked_session
+    app.dependency_overrides[get_read_db] = get_benchmark_db
+    app.dependency_overrides[get_read_sessionmaker] = lambda: TestAsyncSessionLocal
+    try:
+        async with _app_client() as client:
+            yield Target(
+                name="sqlite",
+                client=client,
+                session_factory=TestAsyncSessionLocal,
+                seeded=True,
+            )
+    finally:
+        app.dependency_overrides.clear()
+        async with test_async_engine.begin() as connection:
+            await connection.run_sync(Base.metadata.drop_all)
+
+
+def seed_postgresql(
+    *, rows: int, seed: int, batch_size: int, workers: int, author_pool_size: int
+) -> bool:
+    """
+    Load the dataset when `books` is empty, returns whether it did. Runs before the
+    event loop starts, `generate_books` forks its worker processes.
+    """
+    database_url = get_config().sync_database_url
+    engine = create_engine(database_url)
+    with engine.connect() as connection:
+        existing = connection.execute(select(func.count(Book.id))).scalar()
+    if existing:
+        print(f"Reusing the {existing} existing books, --rows and --seed are ignored")
+        engine.dispose()
+        return False
+
+    generate_books(
+        rows,
+        batch_size=batch_size,
+        workers=workers,
+        seed=seed,
+        database_url=database_url,
+        author_pool_size=author_pool_size,
+    )
+    with engine.begin() as connection:
+        connection.execute(text(f"ANALYZE {Book.__tablename__}"))
+    engine.dispose()
+    return True
+
+
+@asynccontextmanager
+async def postgresql_target(
+    *, seeded: bool, base_url: str | None
+) -> AsyncIterator[Target]:
+    client = httpx.AsyncClient(base_url=base_url) if base_url else _app_client()
+    async with client:
+        yield Target(
+            name="postgresql",
+            client=client,
+            session_factory=AsyncSessionLocal,
+            seeded=seeded,
+        )
+
+
+async def describe_dataset(target: Target) -> Dataset:
+    async with target.session_factory() as session:
+        rows, min_id, max_id = (
+            await session.execute(
+                select(func.count(Book.id), func.min(Book.id), func.max(Book.id))
+            )
+        ).one()
+        titles = (
+            (
+                await session.execute(
+                    select(Book.title).order_by(Book.id).limit(TERM_SAMPLE_ROWS)
+                )
+            )
+            .scalars()
+            .all()
+        )
+    words = Counter(word.lower() for title in titles for word in title.split())
+    return Dataset(
+        rows=rows,
+        min_id=min_id,
+        max_id=max_id,
+        common_term=words.most_common(1)[0][0],
+        rare_term=max(titles, key=len),
+        seeded=target.seeded,
+    )
+
+
+def _list_url(**params: Any) -> Callable[[int], str]:
+    url = f"{BOOK_URL}?{urlencode(params)}"
+    return lambda index: url
+
+
+def build_scenarios(dataset: Dataset, *, seed: int, limit: int) -> list[Scenario]:
+    """
+    `create` runs last, the list scenarios all see the seeded dataset.
+    """
+    # 1% of the ids away from the oldest book, i.e. the end of the newest first list
+    deep_cursor_id = dataset.min_id + (dataset.max_id - dataset.min_id) // 100 + 1
+
+    def new_book(index: int) -> dict[str, Any]:
+        # the rows before it (seeded or created by earlier runs) took indexes below
+        isbn = isbn13_for_index(dataset.rows + index, seed)
+        return {
+            "title": f"Benchmark book {index}",
+            "author": "Benchmark Author",
+            "isbn": isbn,
+            "pages": 100 + index % 900,
+            "rating": 1 + index % 5,
+        }
+
+    return [
+        Scenario("list_first_page", "GET", _list_url(limit=limit)),
+        Scenario(
+            "list_deep_cursor",
+            "GET",
+            _list_url(limit=limit, cursorId=deep_cursor_id),
+        ),
+        Scenario(
+            "search_common",
+            "GET",
+            _list_url(limit=limit, search=dataset.common_term),
+        ),
+        Scenario(
+            "search_rare", "GET", _list_url(limit=limit, search=dataset.rare_term)
+        ),
+        Scenario("create", "POST", lambda index: f"{BOOK_URL}/create", new_book),
+    ]
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BENCHMARKS_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_benchmark(args: argparse.Namespace, *, seeded: bool = False) -> dict:
+    """
+    Run the selected scenarios one after another and return the results document.
+    """
+    if args.target == "sqlite":
+        target_context = sqlite_target(
+            rows=args.rows,
+            seed=args.seed,
+            batch_size=args.batch_size,
+            author_pool_size=args.author_pool_size,
+        )
+    else:
+        target_context = postgresql_target(seeded=seeded, base_url=args.base_url)
+
+    cache_enabled, book_list_cache.enabled = book_list_cache.enabled, args.cache
+    coalesce_enabled, book_list_flights.enabled = (
+        book_list_flights.enabled,
+        args.coalesce,
+    )
+    # every concurrent request admitted at once, unless admission is measured too
+    admission_limit = expensive_book_requests.limit
+    if not args.admission:
+        expensive_book_requests.limit = max(admission_limit, args.concurrency)
+    async with target_context as target:
+        dataset = await describe_dataset(target)
+        scenarios = {}
+        for scenario in build_scenarios(dataset, seed=args.seed, limit=args.limit):
+            if args.scenarios and scenario.name not in args.scenarios:
+                continue
+            result = await run_scenario(
+                target.client,
+                scenario,
+                requests=args.requests,
+                concurrency=args.concurrency,
+                warmup=args.warmup,
+            )
+            scenarios[scenario.name] = result.summary()
+            print(f"{scenario.name:<18} {scenarios[scenario.name]}")
+    book_list_cache.enabled = cache_enabled
+    book_list_flights.enabled = coalesce_enabled
+    expensive_book_requests.limit = admission_limit
+
+    return {
+        "meta": {
+            "target": args.target,
+            "dataset": asdict(dataset),
+            "seed": args.seed,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "limit": args.limit,
+            "cache": args.cache,
+            "coalesce": args.coalesce,
+            "admission": args.admission,
+            "base_url": args.base_url,
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        },
+        "scenarios": scenarios,
+    }
+
+
+def compare(results: dict, baseline: dict, *, tolerance: float) -> list[str]:
+    """
+    Regressions of `results` against `baseline`: a compared latency more than
+    `tolerance` (a fraction) above the baseline, or more errors.
+    """
+    regressions = []
+    for name, before in baseline["scenarios"].items():
+        after = results["scenarios"].get(name)
+        if after is None:
+            continue
+        for metric in COMPARED_METRICS:
+            change = after[metric] / before[metric] - 1 if before[metric] else 0
+            print(
+                f"{name:<18} {metric:<7} {before[metric]:>9.2f} -> {after[metric]:>9.2f} ms ({change:+.0%})"
+            )
+            if change > tolerance:
+                regressions.append(f"{name} {metric} {change:+.0%}")
+        if after["errors"] > before["errors"]:
+            regressions.append(f"{name} errors {before['errors']} -> {after['errors']}")
+    return regressions
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--target", choices=("sqlite", "postgresql"), default="sqlite")
+    parser.add_argument("--rows", type=int, default=10_000, help="dataset size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument(
+        "--workers", type=int, default=1, help="seeding processes (postgresql)"
+    )
+    parser.add_argument("--author-pool-size", type=int, default=AUTHOR_POOL_SIZE)
+    parser.add_argument("--requests", type=int, default=200, help="per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--warmup", type=int, default=10, help="unmeasured requests per scenario"
+    )
+    parser.add_argument("--limit", type=int, default=20, help="page size")
+    parser.add_argument(
+        "--scenarios", nargs="+", default=None, help="subset of the scenarios to run"
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="keep the book list response cache enabled (measures cache hits)",
+    )
+    parser.add_argument(
+        "--coalesce",
+        action="store_true",
+        help="let identical concurrent list requests share one query (measures coalescing)",
+    )
+    parser.add_argument(
+        "--admission",
+        action="store_true",
+        help="keep the expensive request concurrency limit (EXPENSIVE_REQUEST_CONCURRENCY) of the in-process app",
+    )
+    parser.add_argument(
+        "--base-url", default=None, help="running server to call (postgresql)"
+    )
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="allowed latency increase over the baseline, as a fraction",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="write the results to --baseline instead of comparing",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    seeded = False
+    if args.target == "postgresql":
+        seeded = seed_postgresql(
+            rows=args.rows,
+            seed=args.seed,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            author_pool_size=args.author_pool_size,
+        )
+
+    results = asyncio.run(run_benchmark(args, seeded=seeded))
+
+    output = args.output or BENCHMARKS_DIR / "results" / f"{args.target}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2) + "\n")
+    print(f"Results written to {output}")
+
+    if args.baseline is None:
+        return 0
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())
+    if baseline["meta"]["target"] != args.target:
+        print(f"Baseline was recorded on {baseline['meta']['target']}, not compared")
+        return 2
+    regressions = compare(results, baseline, tolerance=args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,10 +9,19 @@ from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sess
 from sqlalchemy.pool import StaticPool
 
 from db.model_books import Book
-from db.database import Base, get_async_db
+from db.database import (
+    Base,
+    get_async_db,
+    get_async_sessionmaker,
+    get_read_db,
+    get_read_sessionmaker,
+)
+from helpers.timing import instrument_engine
 from main import app
 from schemas.books import BookCreateRequest
 from schemas.for_tests import BookTESTBulkCreateUpdateField
+from services.books.cache import book_list_cache, book_row_cache
+from services.books.search_strategy import clear_selectivity_cache
 
 TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 
@@ -21,6 +30,7 @@ test_async_engine = create_async_engine(
     poolclass=StaticPool,
     connect_args={"check_same_thread": False},
 )
+instrument_engine(test_async_engine.sync_engine)
 
 TestAsyncSessionLocal = async_sessionmaker(
     bind=test_async_engine,
@@ -46,14 +56,20 @@ async def async_db_session() -> AsyncSession:
         await conn.run_sync(Base.metadata.drop_all)
 
 
-@pytest.fixture
-def test_client(async_db_session: AsyncSession) -> TestClient:
+@pytest_asyncio.fixture
+async def test_client(async_db_session: AsyncSession) -> TestClient:
     """Fixture providing test client with overridden database dependency."""
 
     async def override_get_async_db():
         yield async_db_session
 
     app.dependency_overrides[get_async_db] = override_get_async_db  # type: ignore
+    app.dependency_overrides[get_async_sessionmaker] = lambda: TestAsyncSessionLocal  # type: ignore
+    app.dependency_overrides[get_read_db] = override_get_async_db  # type: ignore
+    app.dependency_overrides[get_read_sessionmaker] = lambda: TestAsyncSessionLocal  # type: ignore
+    clear_selectivity_cache()
+    await book_list_cache.backend.clear()
+    book_row_cache.clear()
 
     with TestClient(app) as client:
         yield client
@@ -125,6 +141,7 @@ async def bulk_create_books(
         books.append(book)
 
     await async_db_session.commit()
+    await book_list_cache.invalidate()
 
     for book in books:
         await async_db_session.refresh(book)
@@ -1,25 +1,124 @@
 from collections.abc import AsyncGenerator
+from functools import cache
 
-from sqlalchemy import create_engine
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from fastapi import Depends, Request
+from sqlalchemy import Engine, create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
+from db.replicas import ReplicaRouter, ReplicaSelection, reads_stick_to_primary
+from helpers.pool import db_pool_timeouts_total, watch_pool
+from helpers.timing import SlowRequestLog, instrument_engine, timed
 from settings import get_config
 
 config = get_config()
 
-async_engine = create_async_engine(config.async_database_url, pool_pre_ping=True)
+
+def _create_api_engine(url: str, *, name: str) -> AsyncEngine:
+    engine = create_async_engine(
+        url,
+        pool_size=config.db_pool_size,
+        max_overflow=config.db_max_overflow,
+        pool_timeout=config.db_pool_timeout,
+        pool_recycle=config.db_pool_recycle,
+        pool_pre_ping=config.db_pool_pre_ping,
+        # a DBAPI argument of SQLAlchemy's asyncpg adapter
+        connect_args={"prepared_statement_cache_size": config.db_statement_cache_size},
+    )
+    instrument_engine(engine.sync_engine)
+    watch_pool(
+        engine.pool,
+        name=name,
+        capacity=config.db_pool_size + config.db_max_overflow,
+    )
+    return engine
+
+
+async_engine = _create_api_engine(config.async_database_url, name="primary")
+replica_router = ReplicaRouter(
+    primary=async_engine,
+    replicas=[
+        _create_api_engine(url, name=f"replica{index}")
+        for index, url in enumerate(config.replica_async_database_urls)
+    ],
+    selection=ReplicaSelection(config.replica_selection),
+    retry_interval=config.replica_retry_interval,
+)
+slow_request_log = SlowRequestLog(
+    maxsize=config.slow_request_log_size,
+    threshold=config.slow_request_threshold_ms / 1000,
+    sample_rate=config.slow_request_sample_rate,
+)
 AsyncSessionLocal = async_sessionmaker(
     bind=async_engine, class_=AsyncSession, expire_on_commit=False
 )
 
-engine = create_engine(config.sync_database_url, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
 Base = declarative_base()
 
 
+@cache
+def get_sync_engine() -> Engine:
+    """
+    psycopg2 engine for scripts, created on first use: the API only uses `async_engine`.
+    """
+    return create_engine(config.sync_database_url, pool_pre_ping=True)
+
+
+@cache
+def get_sync_sessionmaker() -> sessionmaker[Session]:
+    return sessionmaker(autoflush=False, bind=get_sync_engine())
+
+
 async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
+        # connect eagerly, so waiting for the pool shows up as its own stage
+        with timed("session"):
+            try:
+                await session.connection()
+            except PoolTimeoutError:
+                db_pool_timeouts_total.inc(engine="primary")
+                raise
+        yield session
+
+
+def get_async_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    """
+    For streaming responses that must open their own session: sessions from
+    `get_async_db` are closed before the response body is sent.
+    """
+    return AsyncSessionLocal
+
+
+def get_replica_router() -> ReplicaRouter:
+    return replica_router
+
+
+async def get_read_db(
+    request: Request, router: ReplicaRouter = Depends(get_replica_router)
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session for reads that tolerate replication lag, on a replica unless the client
+    wrote within `read_your_writes_window`.
+    """
+    primary = reads_stick_to_primary(request, window=config.read_your_writes_window)
+    with timed("session"):
+        session = await router.connect(primary=primary)
+    async with session:
         yield session
+
+
+def get_read_sessionmaker(
+    request: Request, router: ReplicaRouter = Depends(get_replica_router)
+) -> async_sessionmaker[AsyncSession]:
+    """
+    `get_async_sessionmaker` counterpart of `get_read_db`.
+    """
+    primary = reads_stick_to_primary(request, window=config.read_your_writes_window)
+    return router.sessionmaker(primary=primary)
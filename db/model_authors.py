@@ -0,0 +1,89 @@
+import re
+
+from sqlalchemy import (
+    BigInteger,
+    CheckConstraint,
+    Computed,
+    Connection,
+    Float,
+    Index,
+    Insert,
+    Integer,
+    String,
+    select,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Mapped, mapped_column
+
+from db.model_base import _BaseCreated
+
+_WHITESPACE = re.compile(r"[ \t\n\r\f\v]+")
+
+
+def normalize_author_name(name: str) -> str:
+    """
+    Key of an author: trimmed, inner whitespace collapsed, lower case. Mirrors the
+    `normalize_author_name` SQL function of migration 0007.
+    """
+    return _WHITESPACE.sub(" ", name.strip(" \t\n\r\f\v")).lower()
+
+
+class Author(_BaseCreated):
+    __tablename__ = "authors"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # spelling of the first book seen with this author
+    name: Mapped[str] = mapped_column(String, nullable=False)
+    name_normalized: Mapped[str] = mapped_column(String, nullable=False)
+    # maintained by triggers on `books` inserts, see `db.model_books`
+    book_count: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    rating_sum: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0, server_default="0"
+    )
+    rating_avg: Mapped[float | None] = mapped_column(
+        Float,
+        Computed("CAST(rating_sum AS FLOAT) / NULLIF(book_count, 0)", persisted=True),
+    )
+
+    __table_args__ = (
+        Index("idx_authors_name_normalized", "name_normalized", unique=True),
+        # keyset pages of `GET /author/top` for each `by`
+        Index("idx_authors_book_count_id", "book_count", "id"),
+        Index("idx_authors_rating_avg_id", "rating_avg", "id"),
+        CheckConstraint("book_count >= 0", name="check_author_book_count"),
+    )
+
+    def __repr__(self) -> str:
+        return f"Author {self.id} {self.name_normalized}"
+
+
+def build_author_insert_query(*, dialect_name: str) -> Insert:
+    """
+    Insert of authors skipping those that exist (or are being inserted concurrently).
+    """
+    dialect_insert = (
+        postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    )
+    return dialect_insert(Author).on_conflict_do_nothing(
+        index_elements=[Author.name_normalized]
+    )
+
+
+def resolve_author_id(connection: Connection, name: str) -> int:
+    """
+    Id of the author named `name`, inserted (without books yet) when missing.
+    """
+    key = normalize_author_name(name)
+    query = select(Author.id).where(Author.name_normalized == key)
+    author_id = connection.execute(query).scalar()
+    if author_id is None:
+        connection.execute(
+            build_author_insert_query(dialect_name=connection.dialect.name).values(
+                name=name.strip(), name_normalized=key
+            )
+        )
+        # inserted now, or concurrently by another transaction
+        author_id = connection.execute(query).scalar_one()
+    return author_id
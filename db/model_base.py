@@ -1,7 +1,9 @@
 import datetime
 
 from sqlalchemy import DateTime, func
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql.functions import now
 
 from db.database import Base
 
@@ -11,3 +13,11 @@ class _BaseCreated(Base):
     created_at: Mapped[datetime.datetime] = mapped_column(
         DateTime, default=func.now(), nullable=False
     )
+
+
+@compiles(now, "sqlite")
+def _sqlite_now(element: now, compiler: object, **kw: object) -> str:
+    # SQLite's CURRENT_TIMESTAMP drops the fraction that SQLAlchemy writes for
+    # bound datetimes ("... 08:00:00" vs "... 08:00:00.000000"), and the text
+    # stored values would neither sort nor compare equal to bound cursor values.
+    return "strftime('%Y-%m-%d %H:%M:%f000', 'now')"
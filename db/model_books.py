@@ -1,7 +1,19 @@
-from sqlalchemy import CheckConstraint, Index, String, Integer
+from sqlalchemy import DDL, CheckConstraint, ForeignKey, Index, String, Integer, event
+from sqlalchemy.engine.default import DefaultExecutionContext
 from sqlalchemy.orm import Mapped, mapped_column
 
+from db.model_authors import resolve_author_id
 from db.model_base import _BaseCreated
+from helpers.isbn import to_isbn13_digits
+
+
+def _author_id_default(context: DefaultExecutionContext) -> int | None:
+    if context.dialect.name == "postgresql":
+        # filled by the `books_assign_author` trigger, which also covers COPY
+        return None
+    return resolve_author_id(
+        context.connection, context.get_current_parameters()["author"]
+    )
 
 
 class Book(_BaseCreated):
@@ -11,8 +23,17 @@ class Book(_BaseCreated):
     title: Mapped[str] = mapped_column(String, nullable=False)
     author: Mapped[str] = mapped_column(String, nullable=False)
     isbn: Mapped[str] = mapped_column(String, nullable=False)
+    # canonical ISBN-13 digits derived from `isbn`, unique, used for exact lookups
+    isbn13: Mapped[str] = mapped_column(String(13), nullable=False)
     pages: Mapped[int] = mapped_column(Integer, nullable=False)
     rating: Mapped[int] = mapped_column(Integer, nullable=False)
+    # the `authors` row of `author`, assigned on insert (callers never set it)
+    author_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("authors.id", name="fk_books_author_id"),
+        nullable=False,
+        default=_author_id_default,
+    )
 
     __table_args__ = (
         Index(
@@ -27,6 +48,14 @@ class Book(_BaseCreated):
             postgresql_using="gin",
             postgresql_ops={"author": "gin_trgm_ops"},
         ),
+        Index("idx_books_isbn13", "isbn13", unique=True),
+        # keyset pagination for each `sort` option, see `BOOK_SORT_COLUMNS`
+        Index("idx_books_created_at_id", "created_at", "id"),
+        Index("idx_books_rating_id", "rating", "id"),
+        Index("idx_books_pages_id", "pages", "id"),
+        Index("idx_books_title_id", "title", "id"),
+        # keyset pages of `GET /author/{id}/books`
+        Index("idx_books_author_id_id", "author_id", "id"),
         CheckConstraint("rating >= 1 AND rating <= 5", name="check_rating_range"),
     )
 
@@ -41,8 +70,57 @@ class Book(_BaseCreated):
         self.title = title
         self.author = author
         self.isbn = isbn
+        self.isbn13 = to_isbn13_digits(isbn)
         self.pages = pages
         self.rating = rating
 
     def __repr__(self) -> str:
         return f"Book {self.id} {self.created_at}"
+
+
+# Full-text search structures that have no portable column type. On PostgreSQL
+# `books.search_vector` (tsvector, kept up to date by a trigger) and its GIN index
+# are created by migration 0004; SQLite (tests) gets an external-content FTS5
+# table kept in sync by triggers.
+BOOK_SEARCH_VECTOR_COLUMN = "search_vector"
+BOOK_SEARCH_VECTOR_INDEX = "idx_books_search_vector"
+BOOK_FTS_TABLE = "books_fts"
+
+for _statement in (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {BOOK_FTS_TABLE} "
+    f"USING fts5(title, author, content='books', content_rowid='id')",
+    f"CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN "
+    f"INSERT INTO {BOOK_FTS_TABLE}(rowid, title, author) VALUES (new.id, new.title, new.author); END",
+    f"CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN "
+    f"INSERT INTO {BOOK_FTS_TABLE}({BOOK_FTS_TABLE}, rowid, title, author) "
+    f"VALUES ('delete', old.id, old.title, old.author); END",
+    f"CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, author ON books BEGIN "
+    f"INSERT INTO {BOOK_FTS_TABLE}({BOOK_FTS_TABLE}, rowid, title, author) "
+    f"VALUES ('delete', old.id, old.title, old.author); "
+    f"INSERT INTO {BOOK_FTS_TABLE}(rowid, title, author) VALUES (new.id, new.title, new.author); END",
+):
+    event.listen(
+        Book.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite")
+    )
+
+event.listen(
+    Book.__table__,
+    "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {BOOK_FTS_TABLE}").execute_if(dialect="sqlite"),
+)
+
+
+# `authors.book_count` and `rating_sum` follow the inserted books. On PostgreSQL
+# migration 0007 creates the triggers assigning `author_id` (row level, before
+# insert) and adding the new books to their authors (statement level, locking
+# the authors in id order); SQLite (tests) gets `_author_id_default` and a row
+# level counting trigger. Books are insert-only, there is no update or delete path.
+event.listen(
+    Book.__table__,
+    "after_create",
+    DDL(
+        "CREATE TRIGGER IF NOT EXISTS books_count_authors AFTER INSERT ON books BEGIN "
+        "UPDATE authors SET book_count = book_count + 1, rating_sum = rating_sum + new.rating "
+        "WHERE id = new.author_id; END"
+    ).execute_if(dialect="sqlite"),
+)
@@ -0,0 +1,160 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import defaultdict
+from collections.abc import Sequence
+from enum import Enum
+
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from starlette.requests import Request
+from starlette.responses import Response
+
+logger = logging.getLogger(__name__)
+
+# deadline (unix time) until which the client's reads go to the primary
+READ_YOUR_WRITES_COOKIE = "primary_reads_until"
+# failures of a replica connection, the replica is skipped for `retry_interval`
+REPLICA_ERRORS = (DBAPIError, OSError, asyncio.TimeoutError)
+
+
+class ReplicaSelection(str, Enum):
+    ROUND_ROBIN = "round_robin"
+    LEAST_CONNECTIONS = "least_connections"
+
+
+class ReplicaRouter:
+    """
+    Picks the engine of read-only sessions: a healthy replica by `selection`, or
+    the primary when there are none (or the client just wrote, see `stick_to_primary`).
+
+    A replica failing to connect is marked unhealthy and skipped for `retry_interval`
+    seconds, `check_health` pings them all to notice failures and recoveries early.
+    """
+
+    def __init__(
+        self,
+        *,
+        primary: AsyncEngine,
+        replicas: Sequence[AsyncEngine] = (),
+        selection: ReplicaSelection = ReplicaSelection.ROUND_ROBIN,
+        retry_interval: float = 30,
+    ):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.selection = selection
+        self.retry_interval = retry_interval
+        self._sessionmakers = {
+            engine: async_sessionmaker(
+                bind=engine, class_=AsyncSession, expire_on_commit=False
+            )
+            for engine in (primary, *self.replicas)
+        }
+        self._unhealthy_until: dict[AsyncEngine, float] = {}
+        self._round_robin = itertools.count()
+        # checked out connections per replica, exports included
+        self.in_use: dict[AsyncEngine, int] = defaultdict(int)
+        for replica in self.replicas:
+            self._count_connections(replica)
+
+    def _count_connections(self, engine: AsyncEngine) -> None:
+        @event.listens_for(engine.sync_engine, "checkout")
+        def checkout(dbapi_connection, connection_record, connection_proxy):
+            self.in_use[engine] += 1
+
+        @event.listens_for(engine.sync_engine, "checkin")
+        def checkin(dbapi_connection, connection_record):
+            self.in_use[engine] -= 1
+
+    def healthy_replicas(self) -> list[AsyncEngine]:
+        now = time.monotonic()
+        return [
+            replica
+            for replica in self.replicas
+            if self._unhealthy_until.get(replica, 0) <= now
+        ]
+
+    def mark_unhealthy(self, engine: AsyncEngine) -> None:
+        logger.warning("Replica %s unavailable, reading from the primary", engine.url)
+        self._unhealthy_until[engine] = time.monotonic() + self.retry_interval
+
+    def choose(self) -> AsyncEngine:
+        replicas = self.healthy_replicas()
+        if not replicas:
+            return self.primary
+        if self.selection == ReplicaSelection.LEAST_CONNECTIONS:
+            return min(replicas, key=lambda replica: self.in_use[replica])
+        return replicas[next(self._round_robin) % len(replicas)]
+
+    def sessionmaker(
+        self, *, primary: bool = False
+    ) -> async_sessionmaker[AsyncSession]:
+        return self._sessionmakers[self.primary if primary else self.choose()]
+
+    async def _try_connect(self, engine: AsyncEngine) -> AsyncSession | None:
+        session = self._sessionmakers[engine]()
+        try:
+            await session.connection()
+        except REPLICA_ERRORS:
+            await session.close()
+            if engine is self.primary:
+                raise
+            self.mark_unhealthy(engine)
+            return None
+        return session
+
+    async def connect(self, *, primary: bool = False) -> AsyncSession:
+        """
+        Read-only session connected eagerly, on the primary when the chosen replica
+        cannot be reached.
+        """
+        session = await self._try_connect(self.primary if primary else self.choose())
+        if session is None:
+            session = await self._try_connect(self.primary)
+        assert session is not None
+        return session
+
+    async def check_health(self, *, timeout: float = 5) -> None:
+        for replica in self.replicas:
+            try:
+                async with replica.connect() as connection:
+                    await asyncio.wait_for(
+                        connection.execute(text("SELECT 1")), timeout
+                    )
+            except REPLICA_ERRORS:
+                self.mark_unhealthy(replica)
+            else:
+                self._unhealthy_until.pop(replica, None)
+
+    async def check_health_periodically(self, *, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.check_health()
+
+
+def stick_to_primary(response: Response, *, window: float) -> None:
+    """
+    Route the client's reads to the primary for `window` seconds after a write, so
+    it reads its own writes even when replicas lag. Kept client side as a cookie
+    which works across workers.
+    """
+    if window > 0:
+        response.set_cookie(
+            READ_YOUR_WRITES_COOKIE,
+            f"{time.time() + window:.3f}",
+            max_age=int(window) + 1,
+            httponly=True,
+            samesite="lax",
+        )
+
+
+def reads_stick_to_primary(request: Request, *, window: float) -> bool:
+    try:
+        deadline = float(request.cookies.get(READ_YOUR_WRITES_COOKIE, 0))
+    except ValueError:
+        return False
+    now = time.time()
+    # a forged deadline beyond the window is ignored
+    return now < deadline <= now + window
@@ -0,0 +1,275 @@
+import asyncio
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from helpers.cache import LRUCache
+from helpers.metrics import Counter, Gauge, Histogram
+
+admission_requests_total = Counter(
+    "admission_requests_total",
+    "Requests by admission limiter and result (admitted, queued, rejected, timed_out)",
+    ("limiter", "result"),
+)
+admission_queue_depth = Gauge(
+    "admission_queue_depth", "Requests waiting for a slot", ("limiter",)
+)
+admission_in_flight = Gauge(
+    "admission_in_flight", "Requests holding a slot", ("limiter",)
+)
+admission_queue_wait_seconds = Histogram(
+    "admission_queue_wait_seconds",
+    "Time queued requests waited for a slot, admitted or not",
+    ("limiter",),
+)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, *, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class RateLimitBackend(ABC):
+    """
+    Token buckets by key.
+
+    Implementations backed by a shared store (e.g. a Redis script refilling and
+    taking in one step) limit a client across every worker, the in-memory backend
+    only within the current process.
+    """
+
+    @abstractmethod
+    async def take(self, key: str, *, rate: float, burst: int) -> float:
+        """
+        Take a token from the bucket of `key`, refilled with `rate` tokens per second
+        up to `burst`. Returns 0 when taken, otherwise the seconds until one is available.
+        """
+
+    @abstractmethod
+    async def clear(self) -> None:
+        ...
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """
+    Buckets of at most `maxsize` keys. A bucket expires once it would be full
+    again, the least recently used ones are evicted first (they start full again,
+    which only lets an idle client burst early).
+    """
+
+    def __init__(
+        self, *, maxsize: int, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.clock = clock
+        # key -> (tokens, updated at)
+        self._buckets: LRUCache[str, tuple[float, float]] = LRUCache(maxsize=maxsize)
+
+    async def take(self, key: str, *, rate: float, burst: int) -> float:
+        now = self.clock()
+        tokens, updated_at = self._buckets.get(key) or (float(burst), now)
+        tokens = min(float(burst), tokens + (now - updated_at) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        # `LRUCache` expires on its own monotonic clock, the time to refill is enough
+        self._buckets.set(key, (tokens, now), ttl=(burst - tokens) / rate)
+        return wait
+
+    async def clear(self) -> None:
+        self._buckets.clear()
+
+
+class RateLimiter:
+    """
+    `rate` requests per second per client key with bursts of `burst`, 0 disables.
+    """
+
+    name = "rate"
+
+    def __init__(self, *, backend: RateLimitBackend, rate: float, burst: int):
+        self.backend = backend
+        self.rate = rate
+        self.burst = burst
+
+    async def check(self, key: str) -> None:
+        if self.rate <= 0:
+            return
+        wait = await self.backend.take(
+            f"ratelimit:{key}", rate=self.rate, burst=max(self.burst, 1)
+        )
+        if wait > 0:
+            admission_requests_total.inc(limiter=self.name, result="rejected")
+            raise AdmissionRejected(
+                status_code=429, detail="Too many requests", retry_after=wait
+            )
+        admission_requests_total.inc(limiter=self.name, result="admitted")
+
+
+class ConcurrencyLimiter:
+    """
+    At most `limit` concurrent holders, up to `max_queue` more waiting for a slot
+    in arrival order for at most `timeout` seconds each. Others are rejected at once.
+
+    Per process on purpose, it keeps this process's requests from queueing on its
+    own connection pool. Waiters are plain futures of the running loop, the limiter
+    is not bound to an event loop.
+    """
+
+    def __init__(self, *, name: str, limit: int, max_queue: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self) -> None:
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            self._report()
+            admission_requests_total.inc(limiter=self.name, result="admitted")
+            return
+        if len(self._waiters) >= self.max_queue:
+            admission_requests_total.inc(limiter=self.name, result="rejected")
+            raise self._rejected()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._report()
+        admission_requests_total.inc(limiter=self.name, result="queued")
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over just as the wait ended
+                self.release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            self._report()
+            if isinstance(e, asyncio.TimeoutError):
+                admission_requests_total.inc(limiter=self.name, result="timed_out")
+                raise self._rejected() from None
+            raise
+        finally:
+            admission_queue_wait_seconds.observe(
+                time.perf_counter() - started, limiter=self.name
+            )
+        admission_requests_total.inc(limiter=self.name, result="admitted")
+
+    def release(self) -> None:
+        # hand the slot over to the first waiter still waiting
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._report()
+                return
+        self.in_flight -= 1
+        self._report()
+
+    def _rejected(self) -> AdmissionRejected:
+        return AdmissionRejected(
+            status_code=503,
+            detail="Too many expensive requests, retry later",
+            retry_after=self.timeout,
+        )
+
+    def _report(self) -> None:
+        admission_in_flight.set(self.in_flight, limiter=self.name)
+        admission_queue_depth.set(len(self._waiters), limiter=self.name)
+
+
+class AdmissionControlMiddleware:
+    """
+    Pure ASGI middleware admitting HTTP requests before they reach the routes, so
+    rejected ones never check out a database connection.
+
+    Every request under `path_prefix` takes a token of its client's bucket, those
+    `is_expensive` then hold a slot of `expensive_requests` until their response
+    (streamed bodies included) is sent. Rejections are answered right away with
+    429 (rate) or 503 (no slot in time) and a `Retry-After` header. The client is
+    the `client_header` value when set (behind a proxy or with API keys), the peer
+    address otherwise.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        rate_limiter: RateLimiter,
+        expensive_requests: ConcurrencyLimiter,
+        is_expensive: Callable[[Scope], bool],
+        path_prefix: str = "",
+        exempt_paths: tuple[str, ...] = (),
+        client_header: str | None = None,
+    ):
+        self.app = app
+        self.rate_limiter = rate_limiter
+        self.expensive_requests = expensive_requests
+        self.is_expensive = is_expensive
+        self.path_prefix = path_prefix
+        self.exempt_paths = exempt_paths
+        self.client_header = client_header
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        path = scope.get("path", "")
+        if (
+            scope["type"] != "http"
+            or not path.startswith(self.path_prefix)
+            or path.startswith(self.exempt_paths)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.rate_limiter.check(self.client_key(scope))
+            expensive = self.is_expensive(scope)
+            if expensive:
+                await self.expensive_requests.acquire()
+        except AdmissionRejected as e:
+            response = JSONResponse(
+                {"detail": e.detail},
+                status_code=e.status_code,
+                headers={"Retry-After": str(max(math.ceil(e.retry_after), 1))},
+            )
+            await response(scope, receive, send)
+            return
+
+        if not expensive:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.expensive_requests.release()
+
+    def client_key(self, scope: Scope) -> str:
+        if self.client_header:
+            value = Headers(scope=scope).get(self.client_header)
+            if value:
+                # the entry appended by the proxy in front of the app, those
+                # before it in `X-Forwarded-For` style lists are client supplied
+                return value.split(",")[-1].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
@@ -0,0 +1,124 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Generic, TypeVar
+
+from helpers.metrics import Counter
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+cache_requests_total = Counter(
+    "cache_requests_total", "Cache lookups by result", ("cache", "result")
+)
+cache_evictions_total = Counter(
+    "cache_evictions_total", "Entries evicted to stay within maxsize", ("cache",)
+)
+
+
+class LRUCache(Generic[K, V]):
+    """
+    In-process LRU cache with a per-entry time to live.
+    """
+
+    def __init__(
+        self,
+        *,
+        maxsize: int,
+        ttl: float | None = None,
+        on_evict: Callable[[], None] | None = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def get(self, key: K) -> V | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else float("inf")
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            if self.on_evict:
+                self.on_evict()
+
+    def delete(self, key: K) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class CacheBackend(ABC):
+    """
+    Byte-valued cache shared by the response caches.
+
+    Implementations backed by a shared store (e.g. Redis) make invalidation visible
+    to every worker, the in-memory backend only to the current process.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes | None:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        ...
+
+    @abstractmethod
+    async def get_counter(self, key: str) -> int:
+        ...
+
+    @abstractmethod
+    async def incr(self, key: str) -> int:
+        """
+        Atomically increment a counter that is never evicted, used for key versioning.
+        """
+
+    @abstractmethod
+    async def clear(self) -> None:
+        ...
+
+
+class InMemoryCacheBackend(CacheBackend):
+    def __init__(self, *, name: str, maxsize: int, ttl: float | None = None):
+        self.name = name
+        self._entries: LRUCache[str, bytes] = LRUCache(
+            maxsize=maxsize,
+            ttl=ttl,
+            on_evict=lambda: cache_evictions_total.inc(cache=name),
+        )
+        self._counters: dict[str, int] = {}
+
+    async def get(self, key: str) -> bytes | None:
+        return self._entries.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        self._entries.set(key, value, ttl=ttl)
+
+    async def get_counter(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+    async def incr(self, key: str) -> int:
+        self._counters[key] = self._counters.get(key, 0) + 1
+        return self._counters[key]
+
+    async def clear(self) -> None:
+        self._entries.clear()
+        self._counters.clear()
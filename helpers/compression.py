@@ -0,0 +1,315 @@
+import asyncio
+import gzip
+import zlib
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Sequence
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from helpers.metrics import Counter
+from helpers.timing import timed
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # optional, see requirements/prod.txt
+    brotli = None
+try:
+    import zstandard  # type: ignore
+except ImportError:  # optional, see requirements/prod.txt
+    zstandard = None
+
+# media types worth compressing, by prefix
+COMPRESSIBLE_MEDIA_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+response_compression_bytes_total = Counter(
+    "response_compression_bytes_total",
+    "Response body bytes compressed, before (`original`) and after (`compressed`)",
+    ("encoding", "body"),
+)
+
+
+class StreamCompressor(ABC):
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        """
+        Compress and flush `data`, the client can decode everything sent so far.
+        """
+
+    @abstractmethod
+    def finish(self) -> bytes:
+        ...
+
+
+class Codec(ABC):
+    """
+    A `Content-Encoding` at a fixed compression level.
+    """
+
+    encoding: str
+
+    def __init__(self, *, level: int):
+        self.level = level
+
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        ...
+
+    @abstractmethod
+    def stream(self) -> StreamCompressor:
+        ...
+
+
+class _ZlibStream(StreamCompressor):
+    def __init__(self, level: int):
+        # wbits 31: gzip container
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class GzipCodec(Codec):
+    encoding = "gzip"
+
+    def compress(self, data: bytes) -> bytes:
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def stream(self) -> StreamCompressor:
+        return _ZlibStream(self.level)
+
+
+class _BrotliStream(StreamCompressor):
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class BrotliCodec(Codec):
+    encoding = "br"
+
+    def compress(self, data: bytes) -> bytes:
+        return brotli.compress(data, quality=self.level)
+
+    def stream(self) -> StreamCompressor:
+        return _BrotliStream(self.level)
+
+
+class _ZstdStream(StreamCompressor):
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class ZstdCodec(Codec):
+    encoding = "zstd"
+
+    def compress(self, data: bytes) -> bytes:
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def stream(self) -> StreamCompressor:
+        return _ZstdStream(self.level)
+
+
+def available_codecs(
+    *, gzip_level: int, brotli_level: int, zstd_level: int
+) -> list[Codec]:
+    """
+    Codecs in server preference order (zstd and brotli only when installed).
+    """
+    codecs: list[Codec] = []
+    if zstandard is not None:
+        codecs.append(ZstdCodec(level=zstd_level))
+    if brotli is not None:
+        codecs.append(BrotliCodec(level=brotli_level))
+    codecs.append(GzipCodec(level=gzip_level))
+    return codecs
+
+
+def choose_codec(accept_encoding: str, codecs: Sequence[Codec]) -> Codec | None:
+    """
+    The codec the client accepts with the highest `q` (server order breaks ties),
+    None for `identity`.
+    """
+    qualities: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name.lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+
+    chosen, chosen_quality = None, 0.0
+    for codec in codecs:
+        quality = qualities.get(codec.encoding, qualities.get("*", 0.0))
+        if quality > chosen_quality:
+            chosen, chosen_quality = codec, quality
+    return chosen
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware compressing response bodies with the best `Accept-Encoding`
+    among `codecs`.
+
+    A body sent in one message (the JSON endpoints) is compressed whole when it has
+    at least `minimum_size` bytes. A streamed body (the export) is compressed chunk
+    by chunk, each flushed so the client decodes rows as they arrive. Bodies or
+    chunks of `offload_size` bytes or more are compressed in a worker thread (zlib,
+    brotli and zstd release the GIL), smaller ones cost less than the hand-off.
+
+    Responses to a client accepting one of `codecs` get a weak ETag, the compressed
+    representation differs from the identity one while `If-None-Match` (weak
+    comparison) still matches. Small bodies sent as is and 304s are tagged the same
+    way, so a client revalidates with the tag the 304 answers with.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        codecs: Sequence[Codec],
+        minimum_size: int = 1024,
+        offload_size: int = 64 * 1024,
+    ):
+        self.app = app
+        self.codecs = codecs
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        codec = choose_codec(
+            Headers(scope=scope).get("accept-encoding", ""), self.codecs
+        )
+        if codec is None:
+
+            async def send_with_vary(message: Message) -> None:
+                if message["type"] == "http.response.start" and _compressible(message):
+                    MutableHeaders(scope=message).add_vary_header("Accept-Encoding")
+                await send(message)
+
+            await self.app(scope, receive, send_with_vary)
+            return
+        responder = _CompressingResponder(
+            send,
+            codec=codec,
+            minimum_size=self.minimum_size,
+            offload_size=self.offload_size,
+        )
+        await self.app(scope, receive, responder.send)
+
+
+def _compressible(start: Message) -> bool:
+    headers = Headers(raw=start["headers"])
+    return (
+        "content-encoding" not in headers
+        and start["status"] >= 200
+        and start["status"] not in (204, 304)
+        and headers.get("content-type", "").startswith(COMPRESSIBLE_MEDIA_TYPES)
+    )
+
+
+def _weaken_etag(headers: MutableHeaders) -> None:
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = f"W/{etag}"
+
+
+class _CompressingResponder:
+    def __init__(
+        self, send: Send, *, codec: Codec, minimum_size: int, offload_size: int
+    ):
+        self._send = send
+        self.codec = codec
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self._start: Message | None = None
+        self._stream: StreamCompressor | None = None
+        # pass through: not compressible, already encoded or too small
+        self._passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            if _compressible(message):
+                headers = MutableHeaders(scope=message)
+                # caches must store a representation per encoding
+                headers.add_vary_header("Accept-Encoding")
+                _weaken_etag(headers)
+                # held until the first body message tells its size
+                self._start = message
+            else:
+                if message["status"] == 304:
+                    _weaken_etag(MutableHeaders(scope=message))
+                self._passthrough = True
+                await self._send(message)
+            return
+        if message["type"] != "http.response.body" or self._passthrough:
+            await self._send(message)
+            return
+
+        body: bytes = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self._start is not None:
+            start, self._start = self._start, None
+            if not more_body and len(body) < self.minimum_size:
+                self._passthrough = True
+                await self._send(start)
+                await self._send(message)
+                return
+            headers = MutableHeaders(scope=start)
+            headers["Content-Encoding"] = self.codec.encoding
+            if more_body:
+                del headers["Content-Length"]
+                self._stream = self.codec.stream()
+            else:
+                compressed = await self._compress(self.codec.compress, body)
+                headers["Content-Length"] = str(len(compressed))
+                await self._send(start)
+                await self._send({**message, "body": compressed})
+                return
+            await self._send(start)
+
+        assert self._stream is not None
+        compressed = await self._compress(self._stream.compress, body) if body else b""
+        if not more_body:
+            compressed += self._stream.finish()
+        await self._send({**message, "body": compressed})
+
+    async def _compress(self, compress: Callable[[bytes], bytes], data: bytes) -> bytes:
+        with timed("compress"):
+            if len(data) >= self.offload_size:
+                compressed = await asyncio.to_thread(compress, data)
+            else:
+                compressed = compress(data)
+        response_compression_bytes_total.inc(
+            len(data), encoding=self.codec.encoding, body="original"
+        )
+        response_compression_bytes_total.inc(
+            len(compressed), encoding=self.codec.encoding, body="compressed"
+        )
+        return compressed
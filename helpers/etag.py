@@ -0,0 +1,28 @@
+import hashlib
+
+from starlette import status
+from starlette.responses import Response
+
+
+def make_etag(*parts: object) -> str:
+    """
+    Strong ETag derived from cheap version parts instead of the response body.
+    """
+    digest = hashlib.sha1(":".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    `If-None-Match` check using weak comparison (RFC 9110 13.1.2).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (candidate.strip() for candidate in if_none_match.split(","))
+    return etag in (candidate.removeprefix("W/") for candidate in candidates)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
@@ -0,0 +1,10 @@
+from stdnum import isbn  # type: ignore
+
+
+def to_isbn13_digits(value: str) -> str:
+    """
+    Normalize an ISBN-10 or ISBN-13 (hyphens/spaces allowed) to canonical ISBN-13 digits.
+
+    Raises `stdnum.exceptions.ValidationError` (a `ValueError`) for invalid input.
+    """
+    return isbn.to_isbn13(isbn.validate(value))
@@ -0,0 +1,167 @@
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Callable
+from threading import Lock
+
+
+class Counter:
+    """
+    Minimal Prometheus style counter with optional labels.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = defaultdict(float)
+        self._lock = Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] += amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge:
+    """
+    Minimal Prometheus style gauge with optional labels. `collect`, when given, is
+    called before rendering to refresh values read from elsewhere (e.g. a pool).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        collect: Callable[[], None] | None = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.collect = collect
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = Lock()
+        REGISTRY.append(self)
+
+    def set(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels: str) -> float:
+        if self.collect is not None:
+            self.collect()
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> list[str]:
+        if self.collect is not None:
+            self.collect()
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} gauge",
+        ]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+# Prometheus client defaults, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    Minimal Prometheus style histogram with optional labels, bucket counts are
+    rendered cumulatively.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # per label values: count per bucket (last one is +Inf), sum
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+        self._lock = Lock()
+        REGISTRY.append(self)
+
+    def observe(self, amount: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, amount)
+        with self._lock:
+            counts, total = self._values.setdefault(
+                key, ([0] * (len(self.buckets) + 1), [0.0])
+            )
+            counts[index] += 1
+            total[0] += amount
+
+    def count(self, **labels: str) -> int:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        return sum(self._values[key][0]) if key in self._values else 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                labels = _format_labels((*self.labelnames, "le"), (*key, str(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total[0]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def _format_labels(labelnames: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(labelnames, values))
+    return f"{{{pairs}}}"
+
+
+REGISTRY: list[Counter | Gauge | Histogram] = []
+
+
+def render_metrics() -> str:
+    """
+    Render every registered metric in the Prometheus text exposition format.
+    """
+    lines: list[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,41 @@
+from sqlalchemy.pool import Pool, QueuePool
+
+from helpers.metrics import Counter, Gauge
+
+# watched pools by engine name, with their size + max overflow
+_pools: dict[str, tuple[QueuePool, int]] = {}
+
+
+def _collect() -> None:
+    for name, (pool, capacity) in _pools.items():
+        db_pool_connections.set(pool.checkedout(), engine=name, state="checked_out")
+        db_pool_connections.set(pool.checkedin(), engine=name, state="checked_in")
+        # `overflow()` counts up from `-pool_size` as connections are opened
+        db_pool_connections.set(max(pool.overflow(), 0), engine=name, state="overflow")
+        db_pool_capacity.set(capacity, engine=name)
+
+
+db_pool_connections = Gauge(
+    "db_pool_connections",
+    "Pooled connections by state, checked_out over capacity is the saturation",
+    ("engine", "state"),
+    collect=_collect,
+)
+db_pool_capacity = Gauge(
+    "db_pool_capacity",
+    "Connections the pool may open (pool size + max overflow)",
+    ("engine",),
+)
+db_pool_timeouts_total = Counter(
+    "db_pool_timeouts_total",
+    "Checkouts that gave up after the pool timeout",
+    ("engine",),
+)
+
+
+def watch_pool(pool: Pool, *, name: str, capacity: int) -> None:
+    """
+    Expose the connection counts of a queue pool (SQLite's static pools are skipped).
+    """
+    if isinstance(pool, QueuePool):
+        _pools[name] = (pool, capacity)
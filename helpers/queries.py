@@ -1,11 +1,67 @@
-from typing import TypeVar
+from collections.abc import Sequence
+from typing import Any, TypeVar
 
 from sqlalchemy import Select, text
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
 
 T = TypeVar("T")
 
 
+def _explain_prefix(dialect_name: str, *, analyze: bool = False) -> str:
+    if dialect_name == "sqlite":
+        return "EXPLAIN QUERY PLAN"
+    options = "ANALYZE, BUFFERS, FORMAT TEXT" if analyze else "FORMAT TEXT"
+    return f"EXPLAIN ({options})"
+
+
+def _plan_lines(dialect_name: str, rows: Sequence[Any]) -> list[str]:
+    # sqlite returns (id, parent, notused, detail)
+    return [row[3] if dialect_name == "sqlite" else row[0] for row in rows]
+
+
+async def capture_explain(
+    query: Select, async_db: AsyncSession, *, analyze: bool = False
+) -> list[str]:
+    """
+    Return the execution plan of a SQLAlchemy Select statement as a list of lines.
+
+    PostgreSQL runs `EXPLAIN` (with `ANALYZE, BUFFERS` when `analyze` is set, which
+    executes the statement), SQLite runs `EXPLAIN QUERY PLAN` and returns the `detail` column.
+    The statement is compiled for the session's dialect with literal binds.
+    """
+    dialect = async_db.bind.dialect
+    compiled = query.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+    prefix = _explain_prefix(dialect.name, analyze=analyze)
+    explain_result = await async_db.execute(text(f"{prefix} {compiled}"))
+    return _plan_lines(dialect.name, explain_result.all())
+
+
+async def explain_statement(
+    connection: AsyncConnection,
+    statement: str,
+    parameters: Sequence[Any] | dict[str, Any],
+    *,
+    settings: Sequence[str] = (),
+) -> list[str]:
+    """
+    Plan (without `ANALYZE`) of a statement as sent to the DBAPI, e.g. captured by
+    a `before_cursor_execute` event, with its bound `parameters`.
+
+    `settings` (e.g. `SET LOCAL enable_seqscan = OFF`) are applied first in a
+    transaction that is rolled back, so the plan matches the one the request got.
+    """
+    dialect_name = connection.dialect.name
+    async with connection.begin() as transaction:
+        for setting in settings:
+            await connection.exec_driver_sql(setting)
+        explain_result = await connection.exec_driver_sql(
+            f"{_explain_prefix(dialect_name)} {statement}", parameters
+        )
+        plan = _plan_lines(dialect_name, explain_result.all())
+        await transaction.rollback()
+    return plan
+
+
 async def print_explain_analyze(query: Select, async_db: AsyncSession) -> None:
     """
     Prints the query execution plan with analysis data for a given SQLAlchemy Select statement.
@@ -14,10 +70,6 @@ async def print_explain_analyze(query: Select, async_db: AsyncSession) -> None:
     allowing you to inspect how PostgreSQL (or another compatible database) executes the statement, including
     performance metrics and buffer usage.
     """
-    explain_stmt = text(
-        f"EXPLAIN (ANALYZE, BUFFERS, FORMAT TEXT) {query.compile(compile_kwargs={'literal_binds': True})}"
-    )
-    explain_result = await async_db.execute(explain_stmt)
     print("Plan:")
-    for row in explain_result:
-        print(row[0])
+    for line in await capture_explain(query, async_db, analyze=True):
+        print(line)
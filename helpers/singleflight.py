@@ -0,0 +1,70 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Generic, TypeVar
+
+from helpers.metrics import Counter
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+singleflight_requests_total = Counter(
+    "singleflight_requests_total",
+    "Calls by flight and role: `leader` ran the work, `shared` got its result",
+    ("flight", "role"),
+)
+
+
+class _LeaderCancelled(Exception):
+    pass
+
+
+class SingleFlight(Generic[K, V]):
+    """
+    Concurrent calls with the same key share one execution: the first caller (the
+    leader) runs its function, the others wait for its result or exception. Nothing
+    is kept once the call completes, a later call runs again.
+
+    The work runs in the leader's task (with its session), so a leader cancelled
+    mid-flight (client gone) makes the waiters elect a new leader among themselves
+    instead of failing. A cancelled waiter leaves the flight untouched. Disabled,
+    every call runs its own function.
+    """
+
+    def __init__(self, *, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self._flights: dict[K, asyncio.Future[V]] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: K, func: Callable[[], Awaitable[V]]) -> V:
+        if not self.enabled:
+            return await func()
+        while (flight := self._flights.get(key)) is not None:
+            try:
+                # shielded, cancelling one waiter must not cancel the flight
+                value = await asyncio.shield(flight)
+            except _LeaderCancelled:
+                continue
+            singleflight_requests_total.inc(flight=self.name, role="shared")
+            return value
+
+        flight = asyncio.get_running_loop().create_future()
+        self._flights[key] = flight
+        singleflight_requests_total.inc(flight=self.name, role="leader")
+        try:
+            value = await func()
+        except asyncio.CancelledError:
+            flight.set_exception(_LeaderCancelled())
+            raise
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        else:
+            flight.set_result(value)
+            return value
+        finally:
+            del self._flights[key]
+            # retrieved, so a flight nobody joined does not log its exception
+            flight.exception()
@@ -0,0 +1,257 @@
+import logging
+import random
+import time
+from collections import defaultdict, deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import Engine, event
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from helpers.metrics import Histogram
+from helpers.queries import explain_statement
+
+logger = logging.getLogger(__name__)
+
+SERVER_TIMING_HEADER = "Server-Timing"
+# stage of the time spent in SQL statements, see `instrument_engine`
+DB_STAGE = "db"
+TOTAL_STAGE = "total"
+
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds",
+    "Request duration until the last body chunk was sent",
+    ("method", "route", "status"),
+)
+http_request_stage_duration_seconds = Histogram(
+    "http_request_stage_duration_seconds",
+    "Time spent per request stage (session, db, hydrate, serialize)",
+    ("route", "stage"),
+)
+db_query_duration_seconds = Histogram(
+    "db_query_duration_seconds", "Duration of single SQL statements"
+)
+
+
+@dataclass
+class SlowStatement:
+    engine: Engine
+    statement: str
+    parameters: Any
+    duration: float
+
+
+@dataclass
+class RequestTimings:
+    """
+    Seconds spent per stage by the current request, summed over repeated stages.
+    """
+
+    stages: dict[str, float] = field(default_factory=lambda: defaultdict(float))
+    queries: int = 0
+    # `SET LOCAL ...` statements of the request, replayed to explain its plans
+    settings: list[str] = field(default_factory=list)
+    slowest: SlowStatement | None = None
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] += seconds
+
+    def server_timing(self, total: float) -> str:
+        metrics = [
+            f"{stage};dur={seconds * 1000:.1f}"
+            for stage, seconds in self.stages.items()
+        ]
+        if self.queries:
+            metrics.append(f'queries;desc="{self.queries}"')
+        metrics.append(f"{TOTAL_STAGE};dur={total * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+_current_timings: ContextVar[RequestTimings | None] = ContextVar(
+    "current_timings", default=None
+)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """
+    Add the duration of the block to `stage` of the current request, if any.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _current_timings.get()
+        if timings is not None:
+            timings.add(stage, time.perf_counter() - start)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Time every statement of `engine` (the `sync_engine` of async engines) into the
+    `db` stage of the request executing it.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        duration = time.perf_counter() - conn.info["query_start"].pop()
+        db_query_duration_seconds.observe(duration)
+        timings = _current_timings.get()
+        if timings is None:
+            return
+        timings.add(DB_STAGE, duration)
+        timings.queries += 1
+        if statement.startswith("SET LOCAL"):
+            timings.settings.append(statement)
+        elif not many and (
+            timings.slowest is None or duration > timings.slowest.duration
+        ):
+            timings.slowest = SlowStatement(
+                engine=conn.engine,
+                statement=statement,
+                parameters=parameters,
+                duration=duration,
+            )
+
+
+@dataclass
+class SlowRequest:
+    method: str
+    path: str
+    duration_ms: float
+    stages_ms: dict[str, float]
+    statement: str
+    statement_ms: float
+    plan: list[str]
+
+
+class SlowRequestLog:
+    """
+    The last `maxsize` slow requests with the plan of their slowest statement.
+
+    A `sample_rate` share of the requests taking at least `threshold` seconds is
+    captured, explaining costs a round trip per captured request.
+    """
+
+    def __init__(self, *, maxsize: int, threshold: float, sample_rate: float):
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self._entries: deque[SlowRequest] = deque(maxlen=maxsize)
+
+    def should_capture(self, duration: float) -> bool:
+        return duration >= self.threshold and random.random() < self.sample_rate
+
+    async def capture(
+        self, *, method: str, path: str, duration: float, timings: RequestTimings
+    ) -> None:
+        slowest = timings.slowest
+        if slowest is None:
+            return
+        try:
+            async with AsyncEngine(slowest.engine).connect() as connection:
+                plan = await explain_statement(
+                    connection,
+                    slowest.statement,
+                    slowest.parameters,
+                    settings=timings.settings,
+                )
+        except SQLAlchemyError:
+            logger.exception("Failed to explain a slow request statement")
+            return
+        self._entries.append(
+            SlowRequest(
+                method=method,
+                path=path,
+                duration_ms=duration * 1000,
+                stages_ms={
+                    stage: seconds * 1000 for stage, seconds in timings.stages.items()
+                },
+                statement=slowest.statement,
+                statement_ms=slowest.duration * 1000,
+                plan=plan,
+            )
+        )
+
+    def entries(self) -> list[SlowRequest]:
+        return list(reversed(self._entries))
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class ServerTimingMiddleware:
+    """
+    Pure ASGI middleware (the body is not buffered, so streaming responses keep
+    streaming) timing each HTTP request.
+
+    Stage durations recorded with `timed` and `instrument_engine` are sent in a
+    `Server-Timing` header (as far as they are known when the headers go out) and
+    observed in the request histograms once the response is complete. Sampled
+    slow requests are explained into `slow_request_log` after the response was sent.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        slow_request_log: SlowRequestLog,
+        emit_header: bool = True,
+    ):
+        self.app = app
+        self.slow_request_log = slow_request_log
+        self.emit_header = emit_header
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.emit_header:
+                    headers = MutableHeaders(scope=message)
+                    headers.append(
+                        SERVER_TIMING_HEADER,
+                        timings.server_timing(time.perf_counter() - start),
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_timings.reset(token)
+            duration = time.perf_counter() - start
+            # the route template keeps the label cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_request_duration_seconds.observe(
+                duration, method=scope["method"], route=route, status=str(status_code)
+            )
+            for stage, seconds in timings.stages.items():
+                http_request_stage_duration_seconds.observe(
+                    seconds, route=route, stage=stage
+                )
+
+        if self.slow_request_log.should_capture(duration):
+            await self.slow_request_log.capture(
+                method=scope["method"],
+                path=scope["path"],
+                duration=duration,
+                timings=timings,
+            )
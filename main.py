@@ -1,13 +1,78 @@
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
 from fastapi.exceptions import RequestValidationError
 from pydantic import ValidationError
 from fastapi import Request
 from fastapi.middleware.cors import CORSMiddleware
+from db.database import AsyncSessionLocal, replica_router, slow_request_log
+from helpers.admission import AdmissionControlMiddleware
+from helpers.compression import CompressionMiddleware, available_codecs
+from helpers.timing import ServerTimingMiddleware
 from router.routes import api_router
+from services.books.admission import (
+    book_rate_limiter,
+    expensive_book_requests,
+    is_expensive_book_request,
+)
+from services.books.aggregates import refresh_book_facets_periodically
+from services.books.partitions import book_partitions
+from services.books.suggest import book_suggestions
+from services.books.write_behind import book_create_queue
 from settings import get_config
 
 config = get_config()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    tasks = []
+    if config.book_facets_refresh_interval > 0:
+        tasks.append(
+            asyncio.create_task(
+                refresh_book_facets_periodically(
+                    session_factory=AsyncSessionLocal,
+                    interval=config.book_facets_refresh_interval,
+                )
+            )
+        )
+    if config.book_partitions_extend_interval > 0:
+        tasks.append(
+            asyncio.create_task(
+                book_partitions.extend_periodically(
+                    # on the primary, replicas get the partitions through replication
+                    session_factory=AsyncSessionLocal,
+                    interval=config.book_partitions_extend_interval,
+                )
+            )
+        )
+    tasks.append(
+        asyncio.create_task(
+            book_suggestions.load_periodically(
+                # a replica when there are any, chosen again for every reload
+                session_factory=lambda: replica_router.sessionmaker()(),
+                interval=config.suggest_reload_interval,
+            )
+        )
+    )
+    if replica_router.replicas and config.replica_health_check_interval > 0:
+        tasks.append(
+            asyncio.create_task(
+                replica_router.check_health_periodically(
+                    interval=config.replica_health_check_interval
+                )
+            )
+        )
+    yield
+    await book_create_queue.close()
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+
 app = FastAPI(
     docs_url="/docs",
     openapi_url="/openapi.json",
@@ -23,6 +88,7 @@ app = FastAPI(
     },
     debug=config.debug,
     extra={"requests_client": None},
+    lifespan=lifespan,
 )
 
 app.include_router(api_router)
@@ -57,6 +123,39 @@ origins = []
 origins.extend(LOCAL_ROUTER_DOMAINS)
 
 
+# innermost: rejected requests are still timed, and get CORS headers
+app.add_middleware(
+    AdmissionControlMiddleware,
+    rate_limiter=book_rate_limiter,
+    expensive_requests=expensive_book_requests,
+    is_expensive=is_expensive_book_request,
+    path_prefix=api_router.prefix,
+    # scrapes and docs are never limited
+    exempt_paths=tuple(
+        f"{api_router.prefix}{path}" for path in ("/metrics", "/docs", "/openapi.json")
+    ),
+    client_header=config.rate_limit_client_header or None,
+)
+
+# inside the timing middleware, compression is timed as a request stage
+if config.compression_enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        codecs=available_codecs(
+            gzip_level=config.compression_gzip_level,
+            brotli_level=config.compression_brotli_level,
+            zstd_level=config.compression_zstd_level,
+        ),
+        minimum_size=config.compression_minimum_size,
+        offload_size=config.compression_offload_size,
+    )
+
+app.add_middleware(
+    ServerTimingMiddleware,
+    slow_request_log=slow_request_log,
+    emit_header=config.server_timing_enabled,
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -2,7 +2,7 @@ from logging.config import fileConfig
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 from alembic import context
-import os, sys
+import os, re, sys
 from dotenv import load_dotenv
 
 from settings import get_config
@@ -35,6 +35,8 @@ if config.config_file_name is not None:
 
 #!!!!!!!!!!!!!!!!!!!       IMPORT ALL YOUR MODELS HERE           !!!!!!!!!!!!!!!!!!
 import migrations.import_models
+from db.model_books import BOOK_SEARCH_VECTOR_COLUMN, BOOK_SEARCH_VECTOR_INDEX
+from migrations import online
 # _________________________________________________________________________________
 
 target_metadata = Base.metadata
@@ -54,6 +56,21 @@ def include_object(object, name, type_, reflected, compare_to):
     )
     if type_ == "table" and (name in postgis_tables or 'postgis' in name):
         return False
+    # maintained by hand written migrations, not mapped on the models
+    if type_ == "column" and name == BOOK_SEARCH_VECTOR_COLUMN:
+        return False
+    if type_ == "index" and name == BOOK_SEARCH_VECTOR_INDEX:
+        return False
+    if type_ == "table" and name == online.jobs_table.name:
+        return False
+    # tables of the optional `books` partitioning (0008), not mapped on the models
+    if type_ == "table" and reflected and (name == "book_isbns" or re.fullmatch(r"books_p\d+", name)):
+        return False
+    # not unique on the partitioned table, `book_isbns` enforces it
+    if type_ == "index" and name == "idx_books_isbn13":
+        database_index = object if reflected else compare_to
+        if database_index is not None and not database_index.unique:
+            return False
     return True
 
 def run_migrations_offline() -> None:
@@ -91,11 +108,28 @@ def run_migrations_online() -> None:
         poolclass=pool.NullPool,
     )
 
+    # `-x online=inline|defer|jobs`, see `migrations/online.py`
+    x_arguments = context.get_x_argument(as_dictionary=True)
+    online_mode = online.get_mode(x_arguments)
+    online_pause = x_arguments.get("online_pause")
+    online_pause = None if online_pause is None else float(online_pause)
+
+    # steps queued by earlier `defer` runs go before any newer revision
+    command = getattr(config.cmd_opts, "cmd", (None,))[0]
+    upgrading = getattr(command, "__name__", None) == "upgrade"
+    if online_mode == online.JOBS or (online_mode == online.INLINE and upgrading):
+        with connectable.execution_options(isolation_level="AUTOCOMMIT").connect() as connection:
+            online.run_pending_jobs(connection, pause=online_pause)
+    if online_mode == online.JOBS:
+        return
+
     with connectable.connect() as connection:
         context.configure(
             connection=connection,
             target_metadata=target_metadata,
             include_object=include_object,  # Dodaj tę linię
+            online_mode=online_mode,
+            online_pause=online_pause,
         )
 
         with context.begin_transaction():
@@ -1 +1,2 @@
-from db.model_books import Book
\ No newline at end of file
+from db.model_authors import Author
+from db.model_books import Book
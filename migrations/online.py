@@ -0,0 +1,276 @@
+"""
+Online steps of Alembic revisions: concurrent index builds, batched backfills and
+statements that scan large tables (constraint validation), run outside of the
+migration transaction so the tables stay writable.
+
+Each step is a job recorded in `online_migration_jobs` under a unique name
+(`<revision>.<step>` by convention). Backfills checkpoint their position after
+every batch, a migration interrupted mid-backfill resumes where it stopped when
+rerun. The mode is chosen with `alembic -x online=...`:
+
+- `inline` (default): pending jobs of earlier deferred runs go first, then the
+  revisions run with their online steps in place.
+- `defer`: the revisions only run their fast DDL and queue their online steps.
+- `jobs`: only run the queued jobs (`alembic -x online=jobs upgrade head`).
+
+Everything a revision does after an online step and that depends on it must be
+an online step too, so it runs after it in both modes. Backfill statements must
+be idempotent (`... WHERE id >= :start AND id < :end AND <column> IS NULL`), the
+batch running when a migration is interrupted runs again on resume; rows
+inserted during the backfill are expected to be handled by a trigger created in
+the DDL phase. `-x online_pause=<seconds>` overrides the pause between batches
+to throttle (or speed up) backfills.
+"""
+import logging
+import time
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger("alembic.online")
+
+INLINE = "inline"
+DEFER = "defer"
+JOBS = "jobs"
+MODES = (INLINE, DEFER, JOBS)
+
+# a progress line at most every this many seconds
+PROGRESS_INTERVAL = 10
+
+# not part of `Base.metadata`: created on first use, ignored by autogenerate
+jobs_table = sa.Table(
+    "online_migration_jobs",
+    sa.MetaData(),
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("name", sa.String, nullable=False, unique=True),
+    # "backfill", "index" or "execute"
+    sa.Column("kind", sa.String, nullable=False),
+    sa.Column("statement", sa.Text, nullable=False),
+    sa.Column("table_name", sa.String),
+    sa.Column("index_name", sa.String),
+    sa.Column("batch_size", sa.Integer),
+    sa.Column("pause", sa.Float),
+    # backfill checkpoint: first id of the next batch, and the last id to process
+    sa.Column("next_id", sa.BigInteger),
+    sa.Column("end_id", sa.BigInteger),
+    sa.Column("created_at", sa.DateTime, nullable=False, server_default=sa.func.now()),
+    sa.Column("finished_at", sa.DateTime),
+)
+
+
+def create_index(
+    job: str,
+    index_name: str,
+    table_name: str,
+    columns: Sequence[str],
+    *,
+    unique: bool = False,
+    **kw,
+) -> None:
+    """
+    `CREATE INDEX CONCURRENTLY`, an INVALID index left behind by a failed build is
+    dropped and built again. `kw` are the dialect options of `op.create_index`.
+    """
+    table = sa.Table(table_name, sa.MetaData(), *(sa.Column(name) for name in columns))
+    index = sa.Index(
+        index_name,
+        *(table.c[name] for name in columns),
+        unique=unique,
+        postgresql_concurrently=True,
+        **kw,
+    )
+    statement = str(
+        sa.schema.CreateIndex(index).compile(dialect=op.get_context().dialect)
+    )
+    _submit(
+        job,
+        kind="index",
+        statement=statement,
+        table_name=table_name,
+        index_name=index_name,
+    )
+
+
+def backfill(
+    job: str,
+    *,
+    table_name: str,
+    statement: str,
+    batch_size: int,
+    pause: float = 0,
+) -> None:
+    """
+    Run `statement` for consecutive id ranges `[:start, :end)` of `table_name`, up
+    to the largest id when the job starts, sleeping `pause` seconds between batches.
+    """
+    _submit(
+        job,
+        kind="backfill",
+        statement=statement,
+        table_name=table_name,
+        batch_size=batch_size,
+        pause=pause,
+    )
+
+
+def execute(job: str, statement: str) -> None:
+    """
+    A statement that must run after the previous online steps, or scans a large
+    table under a lock that does not block writes (`VALIDATE CONSTRAINT`).
+    """
+    _submit(job, kind="execute", statement=statement)
+
+
+def discard(prefix: str) -> None:
+    """
+    Forget the jobs named `prefix*`, for the downgrade of their revision: they run
+    again on the next upgrade, and pending ones no longer run.
+    """
+    if op.get_context().as_sql:
+        return
+    bind = op.get_bind()
+    if sa.inspect(bind).has_table(jobs_table.name):
+        bind.execute(
+            jobs_table.delete().where(
+                jobs_table.c.name.startswith(prefix, autoescape=True)
+            )
+        )
+
+
+def get_mode(x_arguments: dict[str, str]) -> str:
+    mode = x_arguments.get("online", INLINE)
+    if mode not in MODES:
+        raise ValueError(f"-x online={mode}, expected one of {', '.join(MODES)}")
+    return mode
+
+
+def run_pending_jobs(connection: Connection, *, pause: float | None = None) -> None:
+    """
+    Run the unfinished jobs in the order they were queued, `connection` in autocommit.
+    """
+    if not sa.inspect(connection).has_table(jobs_table.name):
+        return
+    pending = connection.execute(
+        jobs_table.select()
+        .where(jobs_table.c.finished_at.is_(None))
+        .order_by(jobs_table.c.id)
+    ).all()
+    for job in pending:
+        _run_job(connection, job, pause=pause)
+
+
+def _submit(job: str, **values) -> None:
+    context = op.get_context()
+    if context.as_sql:
+        # `--sql` scripts get the steps as plain statements, backfills as one range
+        statement = sa.text(values["statement"])
+        if values["kind"] == "backfill":
+            statement = statement.bindparams(start=0, end=2**63 - 1)
+        op.execute(statement)
+        return
+
+    if context.opts.get("online_mode", INLINE) == DEFER:
+        # queued in the migration transaction, dropped with it on failure
+        _queue(op.get_bind(), job, values)
+        logger.info("Deferred online step %s", job)
+        return
+
+    with context.autocommit_block():
+        bind = op.get_bind()
+        _queue(bind, job, values)
+        row = bind.execute(jobs_table.select().where(jobs_table.c.name == job)).one()
+        if row.finished_at is None:
+            _run_job(bind, row, pause=context.opts.get("online_pause"))
+
+
+def _queue(bind: Connection, job: str, values: dict) -> None:
+    jobs_table.create(bind, checkfirst=True)
+    bind.execute(
+        postgresql.insert(jobs_table)
+        .values(name=job, **values)
+        .on_conflict_do_nothing(index_elements=[jobs_table.c.name])
+    )
+
+
+def _run_job(bind: Connection, job: sa.Row, *, pause: float | None) -> None:
+    started = time.monotonic()
+    logger.info("Running online step %s", job.name)
+    if job.kind == "backfill":
+        _run_backfill(bind, job, pause=job.pause if pause is None else pause)
+    elif job.kind == "index":
+        _run_index(bind, job)
+    else:
+        bind.execute(sa.text(job.statement))
+    bind.execute(
+        jobs_table.update()
+        .where(jobs_table.c.id == job.id)
+        .values(finished_at=sa.func.now())
+    )
+    logger.info(
+        "Finished online step %s in %.1fs", job.name, time.monotonic() - started
+    )
+
+
+def _run_index(bind: Connection, job: sa.Row) -> None:
+    valid = bind.execute(
+        sa.text(
+            "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"
+        ),
+        {"name": job.index_name},
+    ).scalar()
+    if valid:
+        return
+    if valid is False:
+        logger.info("Dropping the invalid index %s of a failed build", job.index_name)
+        bind.execute(sa.text(f"DROP INDEX CONCURRENTLY IF EXISTS {job.index_name}"))
+    bind.execute(sa.text(job.statement))
+
+
+def _run_backfill(bind: Connection, job: sa.Row, *, pause: float) -> None:
+    table = sa.table(job.table_name, sa.column("id"))
+    next_id, end_id = job.next_id, job.end_id
+    if end_id is None:
+        next_id, end_id = bind.execute(
+            sa.select(
+                sa.func.coalesce(sa.func.min(table.c.id), 0),
+                sa.func.coalesce(sa.func.max(table.c.id), -1),
+            )
+        ).one()
+        _checkpoint(bind, job, next_id=next_id, end_id=end_id)
+    elif next_id <= end_id:
+        logger.info("Resuming %s at id %s", job.name, next_id)
+
+    first_id, started = next_id, time.monotonic()
+    reported = started
+    while next_id <= end_id:
+        bind.execute(
+            sa.text(job.statement),
+            {"start": next_id, "end": next_id + job.batch_size},
+        )
+        next_id += job.batch_size
+        _checkpoint(bind, job, next_id=next_id)
+
+        now = time.monotonic()
+        if now - reported >= PROGRESS_INTERVAL or next_id > end_id:
+            reported = now
+            done = min(next_id, end_id + 1) - first_id
+            remaining = max(end_id + 1 - next_id, 0)
+            rate = done / max(now - started, 1e-9)
+            logger.info(
+                "%s: %.1f%% (id %s of %s), %.0f ids/s, ETA %.0fs",
+                job.name,
+                100 * (1 - remaining / max(end_id + 1 - first_id, 1)),
+                min(next_id - 1, end_id),
+                end_id,
+                rate,
+                remaining / rate if rate else 0,
+            )
+        if pause and next_id <= end_id:
+            time.sleep(pause)
+
+
+def _checkpoint(bind: Connection, job: sa.Row, **values) -> None:
+    bind.execute(jobs_table.update().where(jobs_table.c.id == job.id).values(**values))
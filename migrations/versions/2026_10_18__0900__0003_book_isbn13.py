@@ -0,0 +1,123 @@
+"""0003_book_isbn13
+
+Revision ID: 3b7c1d2e9f40
+Revises: 6192af95ed12
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7c1d2e9f40'
+down_revision: Union[str, None] = '6192af95ed12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 50_000
+NOT_NULL_CHECK = 'check_books_isbn13_not_null'
+DUPLICATES_REPORTED = 100
+
+# Canonical ISBN-13 digits for a stored ISBN-10/13 (hyphens/spaces allowed),
+# mirrors `helpers.isbn.to_isbn13_digits` for already validated values.
+ISBN13_FUNCTION = """
+CREATE OR REPLACE FUNCTION pg_temp.isbn13_digits(value text) RETURNS text AS $$
+    SELECT CASE
+        WHEN length(digits) = 13 THEN digits
+        ELSE core || (
+            (10 - (
+                SELECT sum(substr(core, i, 1)::int * CASE WHEN i % 2 = 1 THEN 1 ELSE 3 END)
+                FROM generate_series(1, 12) AS i
+            ) % 10) % 10
+        )::text
+    END
+    FROM (SELECT upper(regexp_replace(value, '[^0-9Xx]', '', 'g')) AS digits) AS d,
+    LATERAL (SELECT '978' || substr(d.digits, 1, 9) AS core) AS c
+$$ LANGUAGE sql IMMUTABLE;
+"""
+
+
+def upgrade() -> None:
+    # IF NOT EXISTS: rerun after resolving the duplicates the first run reported
+    op.execute("ALTER TABLE books ADD COLUMN IF NOT EXISTS isbn13 varchar(13)")
+
+    # Backfill in id ranges, committing every batch so 10M rows never sit in one
+    # transaction and concurrent writers are only blocked per batch.
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        bind.execute(sa.text(ISBN13_FUNCTION))
+        max_id = bind.execute(sa.text("SELECT coalesce(max(id), 0) FROM books")).scalar()
+        for start in range(0, max_id + 1, BACKFILL_BATCH_SIZE):
+            bind.execute(
+                sa.text(
+                    "UPDATE books SET isbn13 = pg_temp.isbn13_digits(isbn) "
+                    "WHERE id >= :start AND id < :end AND isbn13 IS NULL"
+                ),
+                {"start": start, "end": start + BACKFILL_BATCH_SIZE},
+            )
+        # Checked on new rows at once (a catalog only change), existing ones are
+        # validated below without blocking writes
+        bind.execute(sa.text(f"ALTER TABLE books DROP CONSTRAINT IF EXISTS {NOT_NULL_CHECK}"))
+        bind.execute(
+            sa.text(
+                f"ALTER TABLE books ADD CONSTRAINT {NOT_NULL_CHECK} "
+                "CHECK (isbn13 IS NOT NULL) NOT VALID"
+            )
+        )
+        # rows inserted by the old code while the backfill was running
+        bind.execute(
+            sa.text("UPDATE books SET isbn13 = pg_temp.isbn13_digits(isbn) WHERE isbn13 IS NULL")
+        )
+
+        _check_duplicates(bind)
+        # CONCURRENTLY keeps the table writable during the build, a duplicate
+        # inserted meanwhile by the old code fails it and the migration is rerun
+        # (dropping the INVALID index a failed build leaves behind)
+        op.drop_index(
+            'idx_books_isbn13', table_name='books', postgresql_concurrently=True, if_exists=True
+        )
+        op.create_index(
+            'idx_books_isbn13', 'books', ['isbn13'], unique=True, postgresql_concurrently=True
+        )
+
+        # VALIDATE scans under SHARE UPDATE EXCLUSIVE, writes go on; SET NOT NULL
+        # then trusts the validated check instead of scanning under an exclusive lock
+        bind.execute(sa.text(f"ALTER TABLE books VALIDATE CONSTRAINT {NOT_NULL_CHECK}"))
+        bind.execute(sa.text("ALTER TABLE books ALTER COLUMN isbn13 SET NOT NULL"))
+        bind.execute(sa.text(f"ALTER TABLE books DROP CONSTRAINT {NOT_NULL_CHECK}"))
+
+
+def _check_duplicates(bind: sa.Connection) -> None:
+    """
+    ISBN-10/13 spellings of one book collapse to the same ISBN-13. Which row to
+    keep is a catalog decision, so abort with the clashing ids instead of deleting
+    any: resolve them, then rerun the migration.
+    """
+    duplicates = bind.execute(
+        sa.text(
+            "SELECT isbn13, array_agg(id ORDER BY id) FROM books "
+            "GROUP BY isbn13 HAVING count(*) > 1 ORDER BY isbn13"
+        )
+    ).all()
+    if not duplicates:
+        return
+    report = "\n".join(
+        f"  {isbn13}: ids {', '.join(map(str, ids))}"
+        for isbn13, ids in duplicates[:DUPLICATES_REPORTED]
+    )
+    more = len(duplicates) - DUPLICATES_REPORTED
+    if more > 0:
+        report += f"\n  ... and {more} more"
+    raise RuntimeError(
+        f"Books sharing an ISBN-13 ({len(duplicates)} values), keep one book per "
+        f"ISBN-13 and rerun the migration:\n{report}"
+    )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('idx_books_isbn13', table_name='books', postgresql_concurrently=True)
+    op.drop_column('books', 'isbn13')
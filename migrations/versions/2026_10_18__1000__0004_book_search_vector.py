@@ -0,0 +1,82 @@
+"""0004_book_search_vector
+
+Revision ID: 8e2f4a61c5d7
+Revises: 3b7c1d2e9f40
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e2f4a61c5d7'
+down_revision: Union[str, None] = '3b7c1d2e9f40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 50_000
+
+# title weighs more than author in ts_rank
+SEARCH_VECTOR_EXPRESSION = (
+    "setweight(to_tsvector('simple', coalesce({row}title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce({row}author, '')), 'B')"
+)
+
+
+def upgrade() -> None:
+    # A trigger maintained column instead of GENERATED ... STORED: adding a generated
+    # column rewrites the whole table under an exclusive lock, this can be backfilled
+    # in batches while the table stays writable.
+    op.execute("ALTER TABLE books ADD COLUMN search_vector tsvector")
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION books_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {SEARCH_VECTOR_EXPRESSION.format(row="NEW.")};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER books_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF title, author ON books
+        FOR EACH ROW EXECUTE FUNCTION books_search_vector_update();
+        """
+    )
+
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        max_id = bind.execute(sa.text("SELECT coalesce(max(id), 0) FROM books")).scalar()
+        for start in range(0, max_id + 1, BACKFILL_BATCH_SIZE):
+            bind.execute(
+                sa.text(
+                    f"UPDATE books SET search_vector = {SEARCH_VECTOR_EXPRESSION.format(row='')} "
+                    "WHERE id >= :start AND id < :end AND search_vector IS NULL"
+                ),
+                {"start": start, "end": start + BACKFILL_BATCH_SIZE},
+            )
+
+        # CONCURRENTLY so the GIN build does not block writes either
+        op.create_index(
+            'idx_books_search_vector',
+            'books',
+            ['search_vector'],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'idx_books_search_vector', table_name='books', postgresql_concurrently=True
+        )
+    op.execute("DROP TRIGGER IF EXISTS books_search_vector_trigger ON books")
+    op.execute("DROP FUNCTION IF EXISTS books_search_vector_update()")
+    op.execute("ALTER TABLE books DROP COLUMN search_vector")
@@ -0,0 +1,40 @@
+"""0005_book_sort_indexes
+
+Revision ID: a4c9e03b7f12
+Revises: 8e2f4a61c5d7
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4c9e03b7f12'
+down_revision: Union[str, None] = '8e2f4a61c5d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (sort key, id) indexes serving keyset pages of every `sort` option in both directions
+SORT_INDEXES = {
+    'idx_books_created_at_id': ['created_at', 'id'],
+    'idx_books_rating_id': ['rating', 'id'],
+    'idx_books_pages_id': ['pages', 'id'],
+    'idx_books_title_id': ['title', 'id'],
+}
+
+
+def upgrade() -> None:
+    # CONCURRENTLY keeps the table writable while each index is built
+    with op.get_context().autocommit_block():
+        for name, columns in SORT_INDEXES.items():
+            op.create_index(
+                name, 'books', columns, unique=False, postgresql_concurrently=True, if_not_exists=True
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in SORT_INDEXES:
+            op.drop_index(name, table_name='books', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,46 @@
+"""0006_book_facet_counts
+
+Revision ID: c2d8f5a91e07
+Revises: a4c9e03b7f12
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2d8f5a91e07'
+down_revision: Union[str, None] = 'a4c9e03b7f12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# buckets mirror `services.books.queries.book_facet_buckets`
+PAGES_BUCKET = "CASE WHEN pages >= 1000 THEN 1000 ELSE pages / 100 * 100 END"
+
+
+def upgrade() -> None:
+    # Catalog wide facets for `GET /book?include=facets`, refreshed periodically by
+    # the app (REFRESH ... CONCURRENTLY needs the unique index).
+    op.execute(
+        f"""
+        CREATE MATERIALIZED VIEW book_facet_counts AS
+        SELECT facet, bucket, count, now() AS refreshed_at
+        FROM (
+            SELECT 'rating' AS facet, rating AS bucket, count(*) AS count
+            FROM books GROUP BY rating
+            UNION ALL
+            SELECT 'pages', {PAGES_BUCKET}, count(*)
+            FROM books GROUP BY {PAGES_BUCKET}
+        ) AS facets
+        WITH DATA
+        """
+    )
+    op.execute(
+        "CREATE UNIQUE INDEX idx_book_facet_counts ON book_facet_counts (facet, bucket)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS book_facet_counts")
@@ -0,0 +1,205 @@
+"""0007_authors
+
+Revision ID: 5f1b7e3c9a24
+Revises: c2d8f5a91e07
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations import online
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f1b7e3c9a24'
+down_revision: Union[str, None] = 'c2d8f5a91e07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 10_000
+
+# mirrors `db.model_authors.normalize_author_name`
+NORMALIZE_FUNCTION = r"""
+CREATE OR REPLACE FUNCTION normalize_author_name(name text) RETURNS text AS $$
+    SELECT lower(regexp_replace(btrim(name, E' \t\n\r\f\v'), E'[ \t\n\r\f\v]+', ' ', 'g'))
+$$ LANGUAGE sql IMMUTABLE;
+"""
+
+# `author_id` of a new book, inserting its author on first sight. The second select
+# finds an author inserted by a concurrent transaction (ON CONFLICT waited for it).
+ASSIGN_AUTHOR_FUNCTION = """
+CREATE OR REPLACE FUNCTION books_assign_author() RETURNS trigger AS $$
+DECLARE
+    key text := normalize_author_name(NEW.author);
+BEGIN
+    IF NEW.author_id IS NULL THEN
+        SELECT id INTO NEW.author_id FROM authors WHERE name_normalized = key;
+    END IF;
+    IF NEW.author_id IS NULL THEN
+        INSERT INTO authors (name, name_normalized, created_at)
+        VALUES (btrim(NEW.author), key, now())
+        ON CONFLICT (name_normalized) DO NOTHING
+        RETURNING id INTO NEW.author_id;
+    END IF;
+    IF NEW.author_id IS NULL THEN
+        SELECT id INTO NEW.author_id FROM authors WHERE name_normalized = key;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+# Adds the books of an insert statement (a batch, a COPY) to their authors, one
+# update per author. The authors are locked in id order first so concurrent
+# batches sharing authors wait for each other instead of deadlocking.
+COUNT_AUTHORS_FUNCTION = """
+CREATE OR REPLACE FUNCTION books_count_authors() RETURNS trigger AS $$
+BEGIN
+    PERFORM 1 FROM authors
+    WHERE id IN (SELECT author_id FROM new_books)
+    ORDER BY id FOR UPDATE;
+    UPDATE authors
+    SET book_count = authors.book_count + added.book_count,
+        rating_sum = authors.rating_sum + added.rating_sum
+    FROM (
+        SELECT author_id, count(*) AS book_count, sum(rating) AS rating_sum
+        FROM new_books GROUP BY author_id
+    ) AS added
+    WHERE authors.id = added.author_id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+# One id range of the backfill: insert the missing authors, lock the range's
+# authors in id order (as `books_count_authors`), assign and count the books.
+# Books inserted meanwhile already have their `author_id` and are skipped.
+BACKFILL_FUNCTION = """
+CREATE OR REPLACE FUNCTION authors_backfill_range(range_start bigint, range_end bigint)
+RETURNS void AS $$
+BEGIN
+    INSERT INTO authors (name, name_normalized, created_at)
+    SELECT DISTINCT ON (normalize_author_name(author))
+        btrim(author), normalize_author_name(author), now()
+    FROM books
+    WHERE id >= range_start AND id < range_end AND author_id IS NULL
+    ORDER BY normalize_author_name(author), id
+    ON CONFLICT (name_normalized) DO NOTHING;
+
+    PERFORM 1 FROM authors
+    WHERE name_normalized IN (
+        SELECT normalize_author_name(author) FROM books
+        WHERE id >= range_start AND id < range_end AND author_id IS NULL
+    )
+    ORDER BY id FOR UPDATE;
+
+    WITH assigned AS (
+        UPDATE books SET author_id = authors.id
+        FROM authors
+        WHERE books.id >= range_start AND books.id < range_end
+            AND books.author_id IS NULL
+            AND authors.name_normalized = normalize_author_name(books.author)
+        RETURNING books.author_id, books.rating
+    )
+    UPDATE authors
+    SET book_count = authors.book_count + added.book_count,
+        rating_sum = authors.rating_sum + added.rating_sum
+    FROM (
+        SELECT author_id, count(*) AS book_count, sum(rating) AS rating_sum
+        FROM assigned GROUP BY author_id
+    ) AS added
+    WHERE authors.id = added.author_id;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade() -> None:
+    op.create_table('authors',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('name_normalized', sa.String(), nullable=False),
+    sa.Column('book_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('rating_sum', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('rating_avg', sa.Float(), sa.Computed('CAST(rating_sum AS FLOAT) / NULLIF(book_count, 0)', persisted=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.CheckConstraint('book_count >= 0', name='check_author_book_count'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_authors_name_normalized', 'authors', ['name_normalized'], unique=True)
+    op.create_index('idx_authors_book_count_id', 'authors', ['book_count', 'id'], unique=False)
+    op.create_index('idx_authors_rating_avg_id', 'authors', ['rating_avg', 'id'], unique=False)
+
+    # Nullable and unvalidated first: adding the column and the constraint are
+    # catalog only changes, new books get their author from the triggers at once.
+    op.add_column('books', sa.Column('author_id', sa.Integer(), nullable=True))
+    op.execute(
+        "ALTER TABLE books ADD CONSTRAINT fk_books_author_id "
+        "FOREIGN KEY (author_id) REFERENCES authors (id) NOT VALID"
+    )
+    op.execute(NORMALIZE_FUNCTION)
+    op.execute(ASSIGN_AUTHOR_FUNCTION)
+    op.execute(COUNT_AUTHORS_FUNCTION)
+    op.execute(
+        """
+        CREATE TRIGGER books_assign_author
+        BEFORE INSERT ON books
+        FOR EACH ROW EXECUTE FUNCTION books_assign_author();
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER books_count_authors
+        AFTER INSERT ON books REFERENCING NEW TABLE AS new_books
+        FOR EACH STATEMENT EXECUTE FUNCTION books_count_authors();
+        """
+    )
+
+    op.execute(
+        "ALTER TABLE books ADD CONSTRAINT check_books_author_id_not_null "
+        "CHECK (author_id IS NOT NULL) NOT VALID"
+    )
+    op.execute(BACKFILL_FUNCTION)
+
+    online.backfill(
+        '0007_authors.backfill',
+        table_name='books',
+        statement="SELECT authors_backfill_range(:start, :end)",
+        batch_size=BACKFILL_BATCH_SIZE,
+    )
+    online.execute('0007_authors.drop_backfill_function', "DROP FUNCTION IF EXISTS authors_backfill_range(bigint, bigint)")
+    online.create_index('0007_authors.idx_books_author_id_id', 'idx_books_author_id_id', 'books', ['author_id', 'id'])
+    # VALIDATE scans under SHARE UPDATE EXCLUSIVE, writes go on; SET NOT NULL
+    # then trusts the validated check instead of scanning under an exclusive lock
+    online.execute('0007_authors.validate_fk', "ALTER TABLE books VALIDATE CONSTRAINT fk_books_author_id")
+    online.execute(
+        '0007_authors.set_not_null',
+        "ALTER TABLE books VALIDATE CONSTRAINT check_books_author_id_not_null; "
+        "ALTER TABLE books ALTER COLUMN author_id SET NOT NULL; "
+        "ALTER TABLE books DROP CONSTRAINT IF EXISTS check_books_author_id_not_null",
+    )
+
+
+def downgrade() -> None:
+    online.discard('0007_authors.')
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'idx_books_author_id_id',
+            table_name='books',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+    op.execute("DROP TRIGGER IF EXISTS books_count_authors ON books")
+    op.execute("DROP TRIGGER IF EXISTS books_assign_author ON books")
+    op.execute("DROP FUNCTION IF EXISTS books_count_authors()")
+    op.execute("DROP FUNCTION IF EXISTS books_assign_author()")
+    op.execute("DROP FUNCTION IF EXISTS authors_backfill_range(bigint, bigint)")
+    op.drop_column('books', 'author_id')
+    op.execute("DROP FUNCTION IF EXISTS normalize_author_name(text)")
+    op.drop_index('idx_authors_rating_avg_id', table_name='authors')
+    op.drop_index('idx_authors_book_count_id', table_name='authors')
+    op.drop_index('idx_authors_name_normalized', table_name='authors')
+    op.drop_table('authors')
@@ -0,0 +1,305 @@
+"""0008_books_partitioning
+
+Revision ID: 9d4e6b2a7c15
+Revises: 5f1b7e3c9a24
+Create Date: 2026-10-18 14:00:00.000000
+
+Optional: `books` becomes range partitioned on `id` only when upgrading with
+`alembic -x books_partition_size=1000000 upgrade head`, without it the revision
+changes nothing (downgrade to 0007 and upgrade again to partition later).
+
+The table is converted online: an empty copy (partitioned, or plain again on
+downgrade) is created with all its indexes, new rows are mirrored into it by a
+trigger while `online.backfill` copies the existing ones, then the tables are
+swapped under a short lock (`SWAP_LOCK_TIMEOUT`, the step fails and can be rerun
+when the lock is not granted in time). Nothing ever builds an index on a
+populated table, the copy pays for incremental index maintenance instead.
+
+PostgreSQL cannot enforce a unique index without the partition key, so on the
+partitioned table the unique ISBN-13 moves to the `book_isbns` table, claimed
+by a statement trigger (duplicates still fail with a unique violation).
+
+Partitions cannot be created by a trigger of the table being inserted into:
+`SELECT books_extend_partitions()` creates them `PARTITIONS_AHEAD` ahead of the
+id sequence, the application calls it periodically (see
+`services.books.partitions`), an insert past the last partition fails.
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+from migrations import online
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4e6b2a7c15'
+down_revision: Union[str, None] = '5f1b7e3c9a24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COPY_BATCH_SIZE = 10_000
+# partitions kept ahead of the newest id
+PARTITIONS_AHEAD = 2
+SWAP_LOCK_TIMEOUT = "10s"
+# `pg_advisory_xact_lock` key serializing the creation of partitions
+PARTITIONS_LOCK = 7_311_006
+# unique on the plain table, claimed through `book_isbns` when partitioned
+ISBN13_INDEX = "idx_books_isbn13"
+FACETS_VIEW = "book_facet_counts"
+
+CREATE_PARTITIONS_FUNCTION = rf"""
+CREATE OR REPLACE FUNCTION books_create_partitions(parent regclass, size bigint, up_to bigint)
+RETURNS void AS $$
+DECLARE
+    upper_bound bigint;
+BEGIN
+    FOR attempt IN 1..2 LOOP
+        SELECT max(substring(pg_get_expr(c.relpartbound, c.oid) FROM 'TO \((\d+)\)')::bigint)
+        INTO upper_bound
+        FROM pg_inherits AS i JOIN pg_class AS c ON c.oid = i.inhrelid
+        WHERE i.inhparent = parent;
+        IF coalesce(upper_bound, 0) > up_to THEN
+            RETURN;
+        END IF;
+        -- one creator at a time, the others find its partitions when checking again
+        PERFORM pg_advisory_xact_lock({PARTITIONS_LOCK});
+    END LOOP;
+    upper_bound := coalesce(upper_bound, 0);
+    WHILE upper_bound <= up_to LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF %s FOR VALUES FROM (%s) TO (%s)',
+            'books_p' || upper_bound / size, parent, upper_bound, upper_bound + size
+        );
+        upper_bound := upper_bound + size;
+    END LOOP;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+CLAIM_ISBNS_FUNCTION = """
+CREATE OR REPLACE FUNCTION books_claim_isbns() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO book_isbns (isbn13, book_id) SELECT isbn13, id FROM new_books;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade() -> None:
+    online.discard('0008_books_partitioning.unpartition.')
+    partition_size = context.get_x_argument(as_dictionary=True).get('books_partition_size')
+    if partition_size is None or _is_partitioned():
+        return
+    _convert(job='0008_books_partitioning.partition', partition_size=int(partition_size))
+
+
+def downgrade() -> None:
+    online.discard('0008_books_partitioning.partition.')
+    if not _is_partitioned():
+        return
+    _convert(job='0008_books_partitioning.unpartition', partition_size=None)
+
+
+def _is_partitioned() -> bool:
+    return bool(
+        op.get_bind().execute(
+            sa.text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('books')")
+        ).scalar()
+    )
+
+
+def _convert(*, job: str, partition_size: int | None) -> None:
+    """
+    Rebuild `books` as `books_new`, partitioned by `partition_size` ids or plain.
+    """
+    bind = op.get_bind()
+    partitioned = partition_size is not None
+    max_id = bind.execute(sa.text("SELECT coalesce(max(id), 0) FROM books")).scalar()
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence('books', 'id')")).scalar()
+    indexes = dict(
+        bind.execute(
+            sa.text(
+                "SELECT indexname, indexdef FROM pg_indexes "
+                "WHERE schemaname = current_schema() AND tablename = 'books'"
+            )
+        ).all()
+    )
+    view_definition = bind.execute(sa.text(f"SELECT pg_get_viewdef('{FACETS_VIEW}')")).scalar()
+    view_indexes = bind.execute(
+        sa.text(
+            "SELECT indexdef FROM pg_indexes "
+            f"WHERE schemaname = current_schema() AND tablename = '{FACETS_VIEW}'"
+        )
+    ).scalars().all()
+
+    op.execute(
+        "CREATE TABLE books_new (LIKE books INCLUDING DEFAULTS INCLUDING CONSTRAINTS "
+        "INCLUDING GENERATED INCLUDING STORAGE)"
+        + (" PARTITION BY RANGE (id)" if partitioned else "")
+    )
+    op.execute("ALTER TABLE books_new ADD CONSTRAINT books_pkey_new PRIMARY KEY (id)")
+    op.execute(
+        "ALTER TABLE books_new ADD CONSTRAINT fk_books_author_id "
+        "FOREIGN KEY (author_id) REFERENCES authors (id)"
+    )
+    if partitioned:
+        op.execute(CREATE_PARTITIONS_FUNCTION)
+        op.execute(CLAIM_ISBNS_FUNCTION)
+        # partitions `PARTITIONS_AHEAD` ahead of the sequence, `books` as of the call
+        op.execute(
+            f"""
+            CREATE OR REPLACE FUNCTION books_extend_partitions() RETURNS void AS $$
+                SELECT books_create_partitions(
+                    to_regclass('books'),
+                    {partition_size},
+                    coalesce(pg_sequence_last_value('{sequence}'), 0) + {PARTITIONS_AHEAD * partition_size}
+                )
+            $$ LANGUAGE sql;
+            """
+        )
+        op.execute(
+            "CREATE TABLE book_isbns (isbn13 varchar(13) PRIMARY KEY, book_id integer NOT NULL)"
+        )
+        op.execute(
+            f"SELECT books_create_partitions('books_new', {partition_size}, "
+            f"{max_id + PARTITIONS_AHEAD * partition_size})"
+        )
+    # empty tables: created in place, partitions get theirs from the parent
+    for name, definition in indexes.items():
+        if name == "books_pkey":
+            continue
+        op.execute(_copy_index(definition, name=name, partitioned=partitioned))
+
+    # rows inserted from now on are mirrored, the backfill copies the older ones
+    mirror = ["INSERT INTO books_new SELECT * FROM new_rows ON CONFLICT (id) DO NOTHING;"]
+    if partitioned:
+        mirror = [
+            f"PERFORM books_create_partitions('books_new', {partition_size}, "
+            f"(SELECT max(id) FROM new_rows) + {PARTITIONS_AHEAD * partition_size});",
+            *mirror,
+            "INSERT INTO book_isbns (isbn13, book_id) SELECT isbn13, id FROM new_rows "
+            "ON CONFLICT (isbn13) DO NOTHING;",
+        ]
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION books_copy_new() RETURNS trigger AS $$
+        BEGIN
+            {' '.join(mirror)}
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER books_copy_new
+        AFTER INSERT ON books REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION books_copy_new();
+        """
+    )
+
+    copy = (
+        "INSERT INTO books_new SELECT * FROM books "
+        "WHERE id >= :start AND id < :end ON CONFLICT (id) DO NOTHING"
+    )
+    if partitioned:
+        copy += (
+            "; INSERT INTO book_isbns (isbn13, book_id) SELECT isbn13, id FROM books "
+            "WHERE id >= :start AND id < :end ON CONFLICT (isbn13) DO NOTHING"
+        )
+    online.backfill(f'{job}.copy', table_name='books', statement=copy, batch_size=COPY_BATCH_SIZE)
+
+    # the facets view reads `books` by oid, a copy reading `books_new` replaces it
+    view_definition = re.sub(r"\bbooks\b", "books_new", view_definition).rstrip().rstrip(";")
+    online.execute(
+        f'{job}.facets_view',
+        f"DROP MATERIALIZED VIEW IF EXISTS {FACETS_VIEW}_new; "
+        f"CREATE MATERIALIZED VIEW {FACETS_VIEW}_new AS {view_definition} WITH DATA; "
+        + " ".join(
+            _rename_index_definition(definition, suffix="_new", table=f"{FACETS_VIEW}_new") + ";"
+            for definition in view_indexes
+        ),
+    )
+
+    renames = []
+    for name in indexes:
+        renames.append(f"ALTER INDEX {name} RENAME TO {name}_old;")
+    renames.append("ALTER TABLE books_new RENAME TO books;")
+    for name in indexes:
+        renames.append(f"ALTER INDEX {name}_new RENAME TO {name};")
+    if partitioned:
+        new_triggers = [
+            "CREATE TRIGGER books_claim_isbns AFTER INSERT ON books "
+            "REFERENCING NEW TABLE AS new_books "
+            "FOR EACH STATEMENT EXECUTE FUNCTION books_claim_isbns();",
+        ]
+    else:
+        new_triggers = []
+    # the triggers of the old table move over, except the partitioning one
+    online.execute(
+        f'{job}.swap',
+        f"""
+        DO $$
+        DECLARE
+            definition text;
+            definitions text[];
+        BEGIN
+            PERFORM set_config('lock_timeout', '{SWAP_LOCK_TIMEOUT}', true);
+            LOCK TABLE books, books_new IN ACCESS EXCLUSIVE MODE;
+            DROP TRIGGER books_copy_new ON books;
+            SELECT coalesce(array_agg(pg_get_triggerdef(oid) ORDER BY tgname), ARRAY[]::text[])
+            INTO definitions
+            FROM pg_trigger
+            WHERE tgrelid = 'books'::regclass AND NOT tgisinternal
+                AND tgname <> 'books_claim_isbns';
+            ALTER TABLE books RENAME TO books_old;
+            {' '.join(renames)}
+            FOREACH definition IN ARRAY definitions LOOP
+                EXECUTE definition;
+            END LOOP;
+            {' '.join(new_triggers)}
+            ALTER SEQUENCE {sequence} OWNED BY books.id;
+            DROP MATERIALIZED VIEW {FACETS_VIEW};
+            ALTER MATERIALIZED VIEW {FACETS_VIEW}_new RENAME TO {FACETS_VIEW};
+            {' '.join(f"ALTER INDEX {_index_name(definition)}_new RENAME TO {_index_name(definition)};" for definition in view_indexes)}
+        END
+        $$
+        """,
+    )
+    cleanup = ["DROP TABLE books_old", "DROP FUNCTION IF EXISTS books_copy_new()"]
+    if not partitioned:
+        cleanup += [
+            "DROP TABLE IF EXISTS book_isbns",
+            "DROP FUNCTION IF EXISTS books_claim_isbns()",
+            "DROP FUNCTION IF EXISTS books_extend_partitions()",
+            "DROP FUNCTION IF EXISTS books_create_partitions(regclass, bigint, bigint)",
+        ]
+    online.execute(f'{job}.cleanup', "; ".join(cleanup))
+
+
+def _index_name(definition: str) -> str:
+    return re.match(r"CREATE (?:UNIQUE )?INDEX (\S+) ON", definition).group(1)
+
+
+def _rename_index_definition(definition: str, *, suffix: str, table: str) -> str:
+    match = re.match(r"CREATE (UNIQUE )?INDEX (\S+) ON (?:ONLY )?\S+ (USING .*)", definition)
+    unique, name, rest = match.groups()
+    return f"CREATE {unique or ''}INDEX {name}{suffix} ON {table} {rest}"
+
+
+def _copy_index(definition: str, *, name: str, partitioned: bool) -> str:
+    """
+    `definition` of a `books` index for `books_new`, named `<name>_new`.
+    """
+    statement = _rename_index_definition(definition, suffix="_new", table="books_new")
+    unique = statement.startswith("CREATE UNIQUE ")
+    if partitioned and unique:
+        if name != ISBN13_INDEX:
+            raise RuntimeError(f"{name} cannot stay unique on the partitioned table")
+        statement = statement.replace("CREATE UNIQUE INDEX", "CREATE INDEX", 1)
+    if not partitioned and name == ISBN13_INDEX and not unique:
+        statement = statement.replace("CREATE INDEX", "CREATE UNIQUE INDEX", 1)
+    return statement
@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+
+from db.database import get_read_db
+from schemas.authors import (
+    AuthorBooksQueryParams,
+    AuthorTopQueryParams,
+    AuthorTopResponse,
+)
+from schemas.base import PaginatedListResponse
+from schemas.books import BookResponse
+from services.authors import service
+
+router = APIRouter(
+    prefix="/author",
+    tags=["author"],
+)
+
+
+@router.get(
+    "/top",
+    status_code=status.HTTP_200_OK,
+    summary="Top authors by average rating or book count",
+    description="Ranked from the per-author aggregates maintained as books are inserted",
+    response_model=AuthorTopResponse,
+)
+async def get_top_authors(
+    query_params: AuthorTopQueryParams = Depends(),
+    async_db: AsyncSession = Depends(get_read_db),
+) -> AuthorTopResponse:
+    return await service.get_top_authors(query_params=query_params, async_db=async_db)
+
+
+@router.get(
+    "/{author_id}/books",
+    status_code=status.HTTP_200_OK,
+    summary="List the books of an author",
+    description="Books of the author, newest first, with cursor pagination",
+    response_model=PaginatedListResponse[BookResponse],
+)
+async def get_author_books(
+    author_id: int,
+    query_params: AuthorBooksQueryParams = Depends(),
+    async_db: AsyncSession = Depends(get_read_db),
+) -> PaginatedListResponse[BookResponse]:
+    return await service.get_author_books(
+        author_id=author_id, query_params=query_params, async_db=async_db
+    )
@@ -1,11 +1,47 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, Path, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from starlette import status
+from starlette.exceptions import HTTPException
 
-from db.database import get_async_db
-from schemas.base import PaginatedListResponse
-from schemas.books import BookCreateRequest, BookResponse, BookListQueryParams
-from services.books import service
+from db.database import (
+    get_async_db,
+    get_async_sessionmaker,
+    get_read_db,
+    get_read_sessionmaker,
+)
+from db.replicas import stick_to_primary
+from helpers.etag import etag_matches, make_etag, not_modified
+from helpers.timing import timed
+from settings import get_config
+from schemas.books import (
+    BOOK_BATCH_GET_MAX_IDS,
+    BOOK_ID_MAX,
+    BookBatchGetRequest,
+    BookBatchGetResponse,
+    BookBulkCreateResponse,
+    BookBulkFormat,
+    BookCreateRequest,
+    BookCreateResponse,
+    BookExportQueryParams,
+    BookListResponse,
+    BookResponse,
+    BookListQueryParams,
+    BookSuggestQueryParams,
+    BookSuggestResponse,
+)
+from services.books import bulk, export, service
+from services.books.cache import CACHE_HEADER, book_list_cache, book_list_flights
+from services.books.partitions import BookPartitions, get_book_partitions
+from services.books.serializers import serialize_book, serialize_book_batch
+from services.books.search_strategy import (
+    SEARCH_STRATEGY_HEADER,
+    choose_search_strategy,
+)
+from services.books.suggest import BookSuggestions, get_book_suggestions
+from services.books.write_behind import BookCreateQueue, get_book_create_queue
+
+config = get_config()
 
 router = APIRouter(
     prefix="/book",
@@ -18,12 +54,64 @@ router = APIRouter(
     status_code=status.HTTP_201_CREATED,
     summary="Create a new book entry",
     description="Adds a new book with validated ISBN, page count, and rating (1–5)",
+    response_model=BookCreateResponse,
 )
 async def create_book(
     request_data: BookCreateRequest,
+    response: Response,
+    create_queue: BookCreateQueue | None = Depends(get_book_create_queue),
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_async_sessionmaker),
+    book_suggestions: BookSuggestions = Depends(get_book_suggestions),
+) -> BookCreateResponse:
+    # no session is held while the request waits in the write-behind queue
+    if create_queue is not None:
+        created = await create_queue.create(request_data)
+    else:
+        async with session_factory() as async_db:
+            created = await service.create_book(
+                request_data=request_data, async_db=async_db
+            )
+    book_suggestions.add(title=request_data.title, author=request_data.author)
+    stick_to_primary(response, window=config.read_your_writes_window)
+    return created
+
+
+@router.post(
+    "/bulk",
+    status_code=status.HTTP_200_OK,
+    summary="Bulk create books from a streamed NDJSON or CSV body",
+    description=(
+        "Rows are validated with the same rules as `/create` and inserted in chunks "
+        "(COPY on PostgreSQL). Invalid rows are reported per line without aborting the upload. "
+        "CSV bodies must start with a header row and keep one record per line."
+    ),
+    response_model=BookBulkCreateResponse,
+)
+async def bulk_create_books(
+    request: Request,
+    response: Response,
+    file_format: BookBulkFormat
+    | None = Query(
+        None,
+        alias="format",
+        description="Body format; defaults to `csv` for `text/csv` content type, `ndjson` otherwise.",
+    ),
     async_db: AsyncSession = Depends(get_async_db),
-) -> None:
-    return await service.create_book(request_data=request_data, async_db=async_db)
+) -> BookBulkCreateResponse:
+    if file_format is None:
+        content_type = request.headers.get("content-type", "")
+        file_format = (
+            BookBulkFormat.CSV
+            if content_type.startswith("text/csv")
+            else BookBulkFormat.NDJSON
+        )
+    result = await bulk.ingest_books(
+        lines=bulk.iter_lines(request.stream()),
+        file_format=file_format,
+        async_db=async_db,
+    )
+    stick_to_primary(response, window=config.read_your_writes_window)
+    return result
 
 
 @router.get(
@@ -31,10 +119,178 @@ async def create_book(
     status_code=status.HTTP_200_OK,
     summary="List books with pagination and search",
     description="Books ordered by creation date, with search and cursor pagination",
-    response_model=PaginatedListResponse[BookResponse],
+    response_model=BookListResponse,
 )
 async def get_book_list(
+    request: Request,
     query_params: BookListQueryParams = Depends(),
+    async_db: AsyncSession = Depends(get_read_db),
+    partitions: BookPartitions = Depends(get_book_partitions),
+) -> Response:
+    watermark = await service.get_book_list_watermark(async_db=async_db)
+    etag = service.get_book_list_etag(query_params=query_params, watermark=watermark)
+    cache_key = await book_list_cache.key(query_params, watermark)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+
+    body = await book_list_cache.get(cache_key)
+    if body is not None:
+        return Response(
+            body,
+            media_type="application/json",
+            headers={CACHE_HEADER: "HIT", "ETag": etag},
+        )
+
+    async def compute_page() -> tuple[bytes, str]:
+        strategy = await choose_search_strategy(
+            query_params=query_params, async_db=async_db
+        )
+        body = await service.get_book_list(
+            query_params=query_params,
+            async_db=async_db,
+            strategy=strategy,
+            partitions=partitions,
+        )
+        await book_list_cache.set(cache_key, body)
+        return body, strategy.value
+
+    # identical requests arriving while the page is computed wait for it
+    body, strategy = await book_list_flights.do(cache_key, compute_page)
+    return Response(
+        body,
+        media_type="application/json",
+        headers={
+            CACHE_HEADER: "MISS",
+            SEARCH_STRATEGY_HEADER: strategy,
+            "ETag": etag,
+        },
+    )
+
+
+@router.get(
+    "/suggest",
+    status_code=status.HTTP_200_OK,
+    summary="Complete a typed title or author prefix",
+    description=(
+        "Most frequent titles or authors starting with `q`, from an in-memory prefix index "
+        "(no database round trip). Answers 503 while the index is being built at startup."
+    ),
+    response_model=BookSuggestResponse,
+)
+async def suggest_books(
+    query_params: BookSuggestQueryParams = Depends(),
+    book_suggestions: BookSuggestions = Depends(get_book_suggestions),
+) -> BookSuggestResponse:
+    if not book_suggestions.ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Suggestions are loading",
+            headers={"Retry-After": "5"},
+        )
+    return BookSuggestResponse(
+        results=book_suggestions.suggest(
+            query_params.q, field=query_params.field, limit=query_params.limit
+        )
+    )
+
+
+@router.get(
+    "/export",
+    status_code=status.HTTP_200_OK,
+    summary="Stream the whole catalog as NDJSON or CSV",
+    description=(
+        "Books ordered by `id` ascending, streamed from a server-side cursor. "
+        "An interrupted export resumes with `afterId` set to the last `id` received."
+    ),
+)
+async def export_books(
+    query_params: BookExportQueryParams = Depends(),
+    file_format: BookBulkFormat = Query(
+        BookBulkFormat.NDJSON, alias="format", description="Body format"
+    ),
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_read_sessionmaker),
+) -> StreamingResponse:
+    return StreamingResponse(
+        export.stream_books_export(
+            query_params=query_params,
+            file_format=file_format,
+            session_factory=session_factory,
+        ),
+        media_type=export.EXPORT_MEDIA_TYPES[file_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="books.{file_format.value}"'
+        },
+    )
+
+
+@router.get(
+    "/isbn/{isbn}",
+    status_code=status.HTTP_200_OK,
+    summary="Get a book by ISBN",
+    description="Exact ISBN-10 or ISBN-13 lookup (hyphens/spaces allowed), normalized to ISBN-13",
+    response_model=BookResponse,
+)
+async def get_book_by_isbn(
+    request: Request,
+    isbn: str,
     async_db: AsyncSession = Depends(get_async_db),
-) -> PaginatedListResponse[BookResponse]:
-    return await service.get_book_list(query_params=query_params, async_db=async_db)
+) -> Response:
+    book = await service.get_book_by_isbn(isbn=isbn, async_db=async_db)
+    # books are immutable once created, id and creation time identify the body
+    etag = make_etag(book.id, book.created_at.isoformat())
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    with timed("serialize"):
+        body = book.model_dump_json(by_alias=True)
+    return Response(body, media_type="application/json", headers={"ETag": etag})
+
+
+@router.post(
+    "/batch-get",
+    status_code=status.HTTP_200_OK,
+    summary="Get many books by id",
+    description=(
+        f"Up to {BOOK_BATCH_GET_MAX_IDS} ids read in one primary key lookup. Results follow "
+        "the request order (each id once), ids without a book are listed in `missing`."
+    ),
+    response_model=BookBatchGetResponse,
+)
+async def batch_get_books(
+    request_data: BookBatchGetRequest,
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_read_sessionmaker),
+) -> Response:
+    rows, missing = await service.get_books_by_id(
+        ids=request_data.ids, session_factory=session_factory
+    )
+    with timed("serialize"):
+        body = serialize_book_batch(rows=rows, missing=missing)
+    return Response(body, media_type="application/json")
+
+
+# after the fixed paths (`/suggest`, `/export`), which it would match otherwise
+@router.get(
+    "/{book_id}",
+    status_code=status.HTTP_200_OK,
+    summary="Get a book by id",
+    response_model=BookResponse,
+)
+async def get_book(
+    request: Request,
+    book_id: int = Path(..., ge=1, le=BOOK_ID_MAX),
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_read_sessionmaker),
+) -> Response:
+    rows, _ = await service.get_books_by_id(
+        ids=[book_id], session_factory=session_factory
+    )
+    if not rows:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Book not found",
+        )
+    # books are immutable once created, id and creation time identify the body
+    etag = make_etag(rows[0].id, rows[0].created_at.isoformat())
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    with timed("serialize"):
+        body = serialize_book(rows[0])
+    return Response(body, media_type="application/json", headers={"ETag": etag})
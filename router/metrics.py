@@ -0,0 +1,39 @@
+from fastapi import APIRouter
+from starlette import status
+from starlette.responses import PlainTextResponse
+
+from db.database import slow_request_log
+from helpers.metrics import render_metrics
+from schemas.metrics import SlowRequestResponse
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+)
+
+
+@router.get(
+    "",
+    status_code=status.HTTP_200_OK,
+    summary="Prometheus metrics",
+    response_class=PlainTextResponse,
+)
+async def get_metrics() -> PlainTextResponse:
+    return PlainTextResponse(render_metrics())
+
+
+@router.get(
+    "/slow_requests",
+    status_code=status.HTTP_200_OK,
+    summary="Sampled slow requests",
+    description=(
+        "Newest first, with the stage timings and the plan of the slowest statement. "
+        "See `SLOW_REQUEST_THRESHOLD_MS` and `SLOW_REQUEST_SAMPLE_RATE`."
+    ),
+    response_model=list[SlowRequestResponse],
+)
+async def get_slow_requests() -> list[SlowRequestResponse]:
+    return [
+        SlowRequestResponse.model_validate(entry)
+        for entry in slow_request_log.entries()
+    ]
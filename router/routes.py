@@ -1,8 +1,10 @@
 from fastapi import APIRouter
 from router.openapi_swagger import api_router as openapi_swagger_router
-from router import books
+from router import authors, books, metrics
 
 api_router = APIRouter(prefix="/internal_api")
 api_router.include_router(openapi_swagger_router)
 
 api_router.include_router(books.router)
+api_router.include_router(authors.router)
+api_router.include_router(metrics.router)
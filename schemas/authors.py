@@ -0,0 +1,60 @@
+from enum import Enum
+from typing import Annotated
+
+from fastapi.params import Query
+from pydantic import Field
+
+from schemas.base import _BaseModel
+
+
+class AuthorTopField(str, Enum):
+    RATING = "rating"
+    COUNT = "count"
+
+
+class AuthorTopQueryParams(_BaseModel):
+    by: Annotated[
+        AuthorTopField,
+        Query(
+            AuthorTopField.RATING,
+            description="`rating` - highest average book rating first. `count` - most books first.",
+        ),
+    ]
+    limit: Annotated[int, Query(10, ge=1, le=100, description="Authors to return")]
+    min_books: Annotated[
+        int,
+        Query(
+            1,
+            ge=1,
+            description="Skip authors with fewer books, keeps single-book authors out of the rating ranking",
+            examples=[1, 5],
+        ),
+    ]
+
+
+class AuthorBooksQueryParams(_BaseModel):
+    limit: Annotated[
+        int,
+        Query(20, ge=1, le=500, description="Records to return", examples=[20, 50]),
+    ]
+    cursor_id: Annotated[
+        int | None,
+        Query(
+            None,
+            description="`id` of the last record from the previous page (used as the cursor start).",
+            examples=[12978052],
+        ),
+    ]
+
+
+class AuthorResponse(_BaseModel):
+    id: int
+    name: str = Field(..., description="Spelling of the author's first book")
+    book_count: int
+    average_rating: float | None = Field(
+        ..., description="Mean rating of the author's books"
+    )
+
+
+class AuthorTopResponse(_BaseModel):
+    results: list[AuthorResponse]
@@ -1,6 +1,10 @@
-from typing import Generic, TypeVar
+import base64
+import hashlib
+import hmac
+from enum import Enum
+from typing import Any, Generic, TypeVar
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 from pydantic.alias_generators import to_camel
 
 T = TypeVar("T")
@@ -13,17 +17,80 @@ class _BaseModel(BaseModel):
         populate_by_name = True
 
 
+class SortDirection(str, Enum):
+    ASC = "asc"
+    DESC = "desc"
+
+
+class KeysetCursor(_BaseModel):
+    """
+    Boundary row of a keyset page: the sort key value and `id` of the row, the
+    order it was issued for and whether it pages forward or backward.
+
+    Handed out as an opaque HMAC signed token so clients cannot forge positions.
+    """
+
+    sort: str
+    direction: SortDirection
+    value: Any = None
+    id: int
+    backward: bool = False
+
+    def encode(self, secret: bytes) -> str:
+        payload = self.model_dump_json().encode()
+        signature = hmac.new(secret, payload, hashlib.sha256).digest()
+        return f"{_b64encode(payload)}.{_b64encode(signature)}"
+
+    @classmethod
+    def decode(cls, token: str, secret: bytes) -> "KeysetCursor":
+        """
+        Raises `ValueError` for malformed tokens or a signature mismatch.
+        """
+        try:
+            payload_part, signature_part = token.split(".")
+            payload = _b64decode(payload_part)
+            signature = _b64decode(signature_part)
+        except ValueError as e:
+            raise ValueError("Malformed cursor") from e
+
+        expected = hmac.new(secret, payload, hashlib.sha256).digest()
+        if not hmac.compare_digest(signature, expected):
+            raise ValueError("Invalid cursor signature")
+        try:
+            return cls.model_validate_json(payload)
+        except ValidationError as e:
+            raise ValueError("Malformed cursor") from e
+
+
+def _b64encode(value: bytes) -> str:
+    return base64.urlsafe_b64encode(value).rstrip(b"=").decode()
+
+
+def _b64decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
 class PaginationCursor(_BaseModel):
     id: int = Field(
         ...,
         description="`id` of the last record from the previous page (used as the cursor start).",
         examples=[12978052],
     )
+    rank: float | None = Field(
+        None,
+        description="Relevance of the last record, set only for ranked (`fulltext`) searches.",
+        examples=[0.6079271],
+    )
+    token: str | None = Field(
+        None,
+        description="Opaque cursor for the `cursor` query param, works with every sort order and direction.",
+    )
 
 
 class PaginatedListResponse(_BaseModel, Generic[T]):
     results: list[T]
     next_cursor: PaginationCursor | None
+    prev_cursor: PaginationCursor | None = None
 
     class Config(_BaseModel.Config):
         arbitrary_types_allowed = True
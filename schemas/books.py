@@ -1,11 +1,37 @@
 import datetime
+from enum import Enum
 from typing import Annotated
 
+from annotated_types import Ge, Le
 from fastapi.params import Query
-from pydantic import Field, field_validator
+from pydantic import Field, field_validator, model_validator
 from stdnum import isbn  # type: ignore
 
-from schemas.base import _BaseModel
+from schemas.base import PaginatedListResponse, SortDirection, _BaseModel
+
+
+class BookSearchMode(str, Enum):
+    TRIGRAM = "trigram"
+    FULLTEXT = "fulltext"
+    PREFIX = "prefix"
+
+
+class BookSortField(str, Enum):
+    ID = "id"
+    CREATED_AT = "created_at"
+    RATING = "rating"
+    PAGES = "pages"
+    TITLE = "title"
+
+
+class BookSuggestField(str, Enum):
+    TITLE = "title"
+    AUTHOR = "author"
+
+
+class BookListInclude(str, Enum):
+    COUNT = "count"
+    FACETS = "facets"
 
 
 class BookListQueryParams(_BaseModel):
@@ -25,6 +51,126 @@ class BookListQueryParams(_BaseModel):
         str | None,
         Query(None, description="Filter value applied to both `title` and `author`."),
     ]
+    search_mode: Annotated[
+        BookSearchMode,
+        Query(
+            BookSearchMode.TRIGRAM,
+            description=(
+                "`trigram` - substring match (ILIKE), newest first. "
+                "`prefix` - `title`/`author` starting with `search`, newest first. "
+                "`fulltext` - all words must match, ordered by relevance (title weighs more than author)."
+            ),
+        ),
+    ]
+    cursor_rank: Annotated[
+        float | None,
+        Query(
+            None,
+            description="`rank` of the last record from the previous page, required with `cursor_id` in `fulltext` mode.",
+        ),
+    ]
+    cursor: Annotated[
+        str | None,
+        Query(
+            None,
+            description="`token` of `nextCursor`/`prevCursor` from the previous page, takes precedence over `cursor_id`.",
+        ),
+    ]
+    sort: Annotated[
+        BookSortField,
+        Query(
+            BookSortField.ID,
+            description="Sort key, ties are broken by `id`. `fulltext` search is always ordered by relevance.",
+        ),
+    ]
+    direction: Annotated[
+        SortDirection,
+        Query(SortDirection.DESC, description="Sort direction"),
+    ]
+
+    include: Annotated[
+        str | None,
+        Query(
+            None,
+            description="Comma separated extras: `count` (estimated unless `exact_count`), `facets`.",
+            examples=["count,facets"],
+        ),
+    ]
+    exact_count: Annotated[
+        bool,
+        Query(
+            False,
+            description="Count matches exactly, falls back to the estimate when it exceeds the time budget.",
+        ),
+    ]
+
+    @field_validator("include")
+    @classmethod
+    def validate_include(cls, v: str | None) -> str | None:
+        if v is not None:
+            for part in v.split(","):
+                BookListInclude(part.strip())
+        return v
+
+    @property
+    def includes(self) -> set[BookListInclude]:
+        if not self.include:
+            return set()
+        return {BookListInclude(part.strip()) for part in self.include.split(",")}
+
+    @property
+    def is_fulltext(self) -> bool:
+        return bool(self.search) and self.search_mode == BookSearchMode.FULLTEXT
+
+    @model_validator(mode="after")
+    def validate_fulltext_cursor(self) -> "BookListQueryParams":
+        if (
+            self.is_fulltext
+            and self.cursor_id
+            and not self.cursor
+            and self.cursor_rank is None
+        ):
+            raise ValueError("`cursor_rank` is required to paginate `fulltext` search")
+        return self
+
+    @model_validator(mode="after")
+    def validate_sort(self) -> "BookListQueryParams":
+        if self.is_fulltext and self.sort != BookSortField.ID:
+            raise ValueError("`fulltext` search is ordered by relevance")
+        if self.cursor_id and not self.cursor and self.sort != BookSortField.ID:
+            raise ValueError("`cursor_id` only pages the `id` order, use `cursor`")
+        return self
+
+
+class BookExportQueryParams(_BaseModel):
+    after_id: Annotated[
+        int | None,
+        Query(
+            None,
+            ge=0,
+            description="Resume an interrupted export after the last `id` received.",
+            examples=[12978052],
+        ),
+    ]
+    search: Annotated[
+        str | None,
+        Query(None, description="Filter value applied to both `title` and `author`."),
+    ]
+    search_mode: Annotated[
+        BookSearchMode,
+        Query(
+            BookSearchMode.TRIGRAM,
+            description="`trigram` - substring match (ILIKE). `prefix` - `title`/`author` starting with `search`.",
+        ),
+    ]
+
+    @model_validator(mode="after")
+    def validate_search_mode(self) -> "BookExportQueryParams":
+        if self.search and self.search_mode == BookSearchMode.FULLTEXT:
+            raise ValueError(
+                "`fulltext` search is ordered by relevance and cannot be exported by `id`"
+            )
+        return self
 
 
 class BookBaseModel(_BaseModel):
@@ -49,6 +195,29 @@ class BookResponse(BookBaseModel):
     created_at: datetime.datetime
 
 
+# `books.id` is an integer column
+BOOK_ID_MAX = 2**31 - 1
+BOOK_BATCH_GET_MAX_IDS = 5000
+
+
+class BookBatchGetRequest(_BaseModel):
+    ids: list[Annotated[int, Ge(1), Le(BOOK_ID_MAX)]] = Field(
+        ...,
+        description="Book ids, results follow their order",
+        min_length=1,
+        max_length=BOOK_BATCH_GET_MAX_IDS,
+    )
+
+
+class BookBatchGetResponse(_BaseModel):
+    results: list[BookResponse] = Field(
+        ..., description="Books found, in request order and each id once"
+    )
+    missing: list[int] = Field(
+        ..., description="Requested ids without a book, in request order"
+    )
+
+
 class BookCreateRequest(BookBaseModel):
     @field_validator("isbn", mode="after")
     @classmethod
@@ -59,3 +228,88 @@ class BookCreateRequest(BookBaseModel):
         https://arthurdejong.org/python-stdnum/doc/2.1/stdnum.isbn#module-stdnum.isbn
         """
         return isbn.validate(v)
+
+
+class BookSuggestQueryParams(_BaseModel):
+    q: Annotated[
+        str,
+        Query(
+            ...,
+            min_length=1,
+            max_length=200,
+            description="Typed prefix, case and whitespace insensitive",
+            examples=["tolk"],
+        ),
+    ]
+    field: Annotated[
+        BookSuggestField,
+        Query(BookSuggestField.TITLE, description="Values to complete"),
+    ]
+    limit: Annotated[int, Query(10, ge=1, le=20, description="Completions to return")]
+
+
+class BookSuggestion(_BaseModel):
+    text: str
+    books: int = Field(..., description="Books with this value, the ranking weight")
+
+
+class BookSuggestResponse(_BaseModel):
+    results: list[BookSuggestion]
+
+
+class BookCreateResponse(_BaseModel):
+    id: int = Field(..., description="Id of the created book")
+
+
+class BookCount(_BaseModel):
+    value: int = Field(..., description="Number of matching books")
+    exact: bool = Field(
+        ..., description="False for planner/sample estimates, true for `COUNT(*)`"
+    )
+
+
+class BookFacetBucket(_BaseModel):
+    bucket: int = Field(
+        ..., description="Rating, or the lower bound of a `pages` range"
+    )
+    count: int
+
+
+class BookFacets(_BaseModel):
+    rating: list[BookFacetBucket]
+    pages: list[BookFacetBucket] = Field(
+        ...,
+        description="Ranges of 100 pages by lower bound, the last one (1000) is open ended",
+    )
+    exact: bool = Field(
+        ..., description="False when scaled from a sample of a filtered search"
+    )
+    refreshed_at: datetime.datetime | None = Field(
+        None, description="When the catalog summary was last refreshed"
+    )
+
+
+class BookListResponse(PaginatedListResponse[BookResponse]):
+    count: BookCount | None = None
+    facets: BookFacets | None = None
+
+
+class BookBulkFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+class BookBulkRowError(_BaseModel):
+    line: int = Field(..., description="1-based line number in the uploaded body")
+    errors: list[str] = Field(..., description="Validation or insert errors")
+
+
+class BookBulkCreateResponse(_BaseModel):
+    created: int = Field(..., description="Number of inserted books")
+    failed: int = Field(..., description="Number of rejected rows")
+    errors: list[BookBulkRowError] = Field(
+        ..., description="Per-row error report (capped, see `errors_truncated`)"
+    )
+    errors_truncated: bool = Field(
+        ..., description="True when more rows failed than are listed in `errors`"
+    )
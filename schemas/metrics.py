@@ -0,0 +1,11 @@
+from schemas.base import _BaseModel
+
+
+class SlowRequestResponse(_BaseModel):
+    method: str
+    path: str
+    duration_ms: float
+    stages_ms: dict[str, float]
+    statement: str
+    statement_ms: float
+    plan: list[str]
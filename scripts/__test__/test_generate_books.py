@@ -0,0 +1,50 @@
+from pathlib import Path
+
+from sqlalchemy import create_engine, func, select
+from stdnum import isbn  # type: ignore
+
+from db.database import Base
+from db.model_books import Book
+from scripts.generate_books import generate_books, isbn13_for_index
+
+BOOK_COUNT = 250
+
+
+def _load(tmp_path: Path, name: str, workers: int) -> list[tuple]:
+    database_url = f"sqlite:///{tmp_path / name}"
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+
+    generate_books(
+        BOOK_COUNT,
+        batch_size=40,
+        workers=workers,
+        seed=7,
+        database_url=database_url,
+        author_pool_size=100,
+    )
+
+    with engine.connect() as connection:
+        assert connection.execute(select(func.count(Book.id))).scalar() == BOOK_COUNT
+        rows = connection.execute(
+            select(
+                Book.title, Book.author, Book.isbn, Book.pages, Book.rating
+            ).order_by(Book.isbn)
+        ).all()
+    engine.dispose()
+    return [tuple(row) for row in rows]
+
+
+class TestGenerateBooks:
+    def test_output_does_not_depend_on_workers(self, tmp_path: Path) -> None:
+        single = _load(tmp_path, "single.db", workers=1)
+        parallel = _load(tmp_path, "parallel.db", workers=2)
+
+        assert single == parallel
+        assert len({row[2] for row in single}) == BOOK_COUNT
+
+    def test_isbns_are_unique_and_valid(self) -> None:
+        isbns = [isbn13_for_index(index, seed=3) for index in range(100_000)]
+
+        assert len(set(isbns)) == len(isbns)
+        assert all(isbn.is_valid(value) for value in isbns[:1_000])
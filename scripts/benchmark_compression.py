@@ -0,0 +1,111 @@
+"""
+Bytes on the wire and CPU cost of compressing book list pages, per encoding and
+level, against the identity body.
+
+    python3 scripts/benchmark_compression.py --page-sizes 20 100 500
+
+Pages are serialized exactly as `GET /internal_api/book` sends them. Brotli and
+zstd are measured when installed (see `helpers.compression`). Timings are one
+core's cost per page, a worker thread (`COMPRESSION_OFFLOAD_SIZE`) moves it off
+the event loop but does not remove it.
+"""
+import argparse
+import datetime
+import random
+import timeit
+from typing import Any
+
+from helpers.compression import (
+    BrotliCodec,
+    Codec,
+    GzipCodec,
+    ZstdCodec,
+    brotli,
+    zstandard,
+)
+from schemas.base import PaginationCursor
+from scripts.generate_books import BOOK_COLUMNS, build_pools, generate_rows
+from services.books.serializers import BOOK_RESPONSE_FIELDS, serialize_book_list_page
+
+
+def build_pages(page_sizes: list[int], seed: int) -> dict[int, bytes]:
+    rows = generate_rows(
+        rng=random.Random(seed),
+        pools=build_pools(seed, author_pool_size=1_000),
+        count=max(page_sizes),
+        created_at=datetime.datetime(2026, 1, 1),
+    )
+    books = [
+        tuple(
+            {"id": index + 1, **dict(zip(BOOK_COLUMNS, row))}[name]
+            for name in BOOK_RESPONSE_FIELDS
+        )
+        for index, row in enumerate(rows)
+    ]
+    return {
+        size: serialize_book_list_page(
+            rows=books[:size], next_cursor=PaginationCursor(id=size)
+        )
+        for size in page_sizes
+    }
+
+
+def build_codecs(levels: dict[str, list[int]]) -> list[Codec]:
+    codecs: list[Codec] = [GzipCodec(level=level) for level in levels["gzip"]]
+    if brotli is not None:
+        codecs += [BrotliCodec(level=level) for level in levels["br"]]
+    if zstandard is not None:
+        codecs += [ZstdCodec(level=level) for level in levels["zstd"]]
+    return codecs
+
+
+def measure(codec: Codec, body: bytes, number: int) -> float:
+    """
+    Best of 5 runs, in microseconds per page.
+    """
+    return (
+        min(timeit.repeat(lambda: codec.compress(body), number=number, repeat=5))
+        / number
+        * 1_000_000
+    )
+
+
+def run(
+    page_sizes: list[int], levels: dict[str, list[int]], number: int, seed: int
+) -> None:
+    pages = build_pages(page_sizes, seed)
+    codecs = build_codecs(levels)
+    print(
+        f"{'page':>6} {'encoding':<10} {'bytes':>9} {'ratio':>7} {'compress':>11} {'MB/s':>8}"
+    )
+    for size, body in pages.items():
+        print(f"{size:>6} {'identity':<10} {len(body):>9} {1:>7.2f} {'-':>11} {'-':>8}")
+        for codec in codecs:
+            compressed = codec.compress(body)
+            micros = measure(codec, body, number)
+            print(
+                f"{size:>6} {f'{codec.encoding}-{codec.level}':<10} {len(compressed):>9} "
+                f"{len(body) / len(compressed):>7.2f} {micros:>9.1f}us "
+                f"{len(body) / micros:>8.1f}"
+            )
+
+
+def parse_args(argv: list[str] | None = None) -> Any:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[20, 100, 500])
+    parser.add_argument("--gzip-levels", type=int, nargs="+", default=[1, 5, 9])
+    parser.add_argument("--brotli-levels", type=int, nargs="+", default=[1, 4, 11])
+    parser.add_argument("--zstd-levels", type=int, nargs="+", default=[1, 3, 19])
+    parser.add_argument("--number", type=int, default=50, help="calls per timing run")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(
+        args.page_sizes,
+        {"gzip": args.gzip_levels, "br": args.brotli_levels, "zstd": args.zstd_levels},
+        args.number,
+        args.seed,
+    )
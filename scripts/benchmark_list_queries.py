@@ -0,0 +1,166 @@
+"""
+Micro-benchmark of the book list query cost per request: a `Select` rebuilt with
+literal values for every request versus the cached statement of the list shape
+executed with bind params.
+
+    python3 scripts/benchmark_list_queries.py
+    python3 scripts/benchmark_list_queries.py --database-url postgresql+asyncpg://...
+
+Reports the CPU time of this process per request (statement construction,
+cache key, compilation and the driver) and the wall time.
+"""
+import argparse
+import asyncio
+import datetime
+import random
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from sqlalchemy import Select, insert, literal, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from db.database import Base
+from db.model_books import Book
+from schemas.base import SortDirection
+from schemas.books import BookSearchMode, BookSortField
+from scripts.generate_books import BOOK_COLUMNS, build_pools, generate_rows
+from services.books.queries import (
+    BOOK_RESPONSE_COLUMNS,
+    BOOK_SORT_COLUMNS,
+    prepare_book_list_query,
+)
+
+LIMIT = 20
+
+
+def rebuilt_book_list_query(
+    *,
+    limit: int,
+    cursor_id: int | None,
+    search: str | None,
+    sort: BookSortField,
+    cursor_value: Any,
+) -> Select:
+    """
+    The previous path: a new construct with the values inlined as literals.
+    """
+    q = select(*BOOK_RESPONSE_COLUMNS)
+    if search:
+        pattern = f"%{search}%"
+        q = q.where(Book.title.ilike(pattern) | Book.author.ilike(pattern))
+    sort_key = BOOK_SORT_COLUMNS[sort]
+    keys = (Book.id,) if sort_key is None else (sort_key, Book.id)
+    if cursor_id:
+        if sort_key is None:
+            q = q.where(Book.id < literal(cursor_id))
+        else:
+            q = q.where(
+                tuple_(*keys)
+                < tuple_(literal(cursor_value, sort_key.type), literal(cursor_id))
+            )
+    return q.order_by(*(key.desc() for key in keys)).limit(limit + 1)
+
+
+def shapes(max_id: int, term: str) -> dict[str, dict[str, Any]]:
+    cursor_id = max_id // 2
+    return {
+        "first page": dict(cursor_id=None, search=None, sort=BookSortField.ID),
+        "cursor": dict(cursor_id=cursor_id, search=None, sort=BookSortField.ID),
+        "search": dict(cursor_id=None, search=term, sort=BookSortField.ID),
+        "search+cursor": dict(cursor_id=cursor_id, search=term, sort=BookSortField.ID),
+        "rating+cursor": dict(
+            cursor_id=cursor_id, search=None, sort=BookSortField.RATING, cursor_value=3
+        ),
+    }
+
+
+async def measure(
+    func: Callable[[], Awaitable[Any]], number: int
+) -> tuple[float, float]:
+    """
+    Best of 5 runs of (CPU, wall) time, in microseconds per call.
+    """
+    best_cpu = best_wall = float("inf")
+    for _ in range(5):
+        cpu, wall = time.process_time(), time.perf_counter()
+        for _ in range(number):
+            await func()
+        best_cpu = min(best_cpu, (time.process_time() - cpu) / number * 1_000_000)
+        best_wall = min(best_wall, (time.perf_counter() - wall) / number * 1_000_000)
+    return best_cpu, best_wall
+
+
+async def run(database_url: str, rows: int, number: int, seed: int) -> None:
+    # a single connection keeps the in-memory SQLite database alive
+    engine = create_async_engine(
+        database_url,
+        **({"poolclass": StaticPool} if database_url.startswith("sqlite") else {}),
+    )
+    dialect_name = engine.dialect.name
+    async with engine.begin() as connection:
+        if dialect_name == "sqlite":
+            await connection.run_sync(Base.metadata.create_all)
+            data = generate_rows(
+                rng=random.Random(seed),
+                pools=build_pools(seed, author_pool_size=1_000),
+                count=rows,
+                created_at=datetime.datetime(2026, 1, 1),
+            )
+            await connection.execute(
+                insert(Book), [dict(zip(BOOK_COLUMNS, row)) for row in data]
+            )
+        max_id, term = (
+            await connection.execute(
+                select(Book.id, Book.title).order_by(Book.id.desc()).limit(1)
+            )
+        ).one()
+    term = term.split()[0].lower()
+
+    print(
+        f"{'shape':<15} {'rebuilt cpu':>12} {'cached cpu':>12} {'rebuilt wall':>13} {'cached wall':>12}"
+    )
+    async with AsyncSession(engine) as session:
+        for name, shape in shapes(max_id, term).items():
+            kwargs = {"cursor_value": None, **shape}
+
+            async def rebuilt() -> list:
+                query = rebuilt_book_list_query(limit=LIMIT, **kwargs)
+                return (await session.execute(query)).all()
+
+            async def cached() -> list:
+                query, params = prepare_book_list_query(
+                    limit=LIMIT,
+                    search_mode=BookSearchMode.TRIGRAM,
+                    direction=SortDirection.DESC,
+                    dialect_name=dialect_name,
+                    **kwargs,
+                )
+                return (await session.execute(query, params)).all()
+
+            assert await rebuilt() == await cached()
+            rebuilt_cpu, rebuilt_wall = await measure(rebuilt, number)
+            cached_cpu, cached_wall = await measure(cached, number)
+            print(
+                f"{name:<15} {rebuilt_cpu:>10.1f}us {cached_cpu:>10.1f}us {rebuilt_wall:>11.1f}us {cached_wall:>10.1f}us"
+            )
+    await engine.dispose()
+
+
+def parse_args(argv: list[str] | None = None) -> Any:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--database-url",
+        default="sqlite+aiosqlite://",
+        help="async SQLAlchemy URL; in-memory SQLite is seeded, other databases are used as is",
+    )
+    parser.add_argument("--rows", type=int, default=10_000, help="SQLite rows")
+    parser.add_argument("--number", type=int, default=200, help="calls per timing run")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    asyncio.run(run(args.database_url, args.rows, args.number, args.seed))
@@ -0,0 +1,336 @@
+"""
+Benchmark of `books` range partitioned on `id` (migration 0008) against the plain
+table: index size, insert throughput and first-page search latency.
+
+    python3 scripts/benchmark_partitioning.py --rows 1000000 --partition-size 100000
+
+Two scratch tables with the columns and indexes of `books` are loaded with the
+same generated rows: `bench_books_plain` and `bench_books_partitioned`. Searches
+run the list query of the `bitmap` strategy (trigram indexes when pg_trgm can be
+installed) newest first, on each table and partition by partition with early
+termination (`BookPartitions.page_ranges`). PostgreSQL only.
+"""
+import argparse
+import csv
+import datetime
+import io
+import random
+import statistics
+import time
+from collections import Counter
+from collections.abc import Callable
+from typing import Any
+
+from sqlalchemy import Connection, Engine, create_engine, text
+from sqlalchemy.exc import DBAPIError
+
+from scripts.generate_books import BOOK_COLUMNS, build_pools, generate_rows
+from settings import get_config
+
+PLAIN = "bench_books_plain"
+PARTITIONED = "bench_books_partitioned"
+LIMIT = 20
+LOAD_BATCH_SIZE = 10_000
+
+COLUMNS = """
+    id bigint NOT NULL,
+    title varchar NOT NULL,
+    author varchar NOT NULL,
+    isbn varchar NOT NULL,
+    isbn13 varchar(13) NOT NULL,
+    pages integer NOT NULL,
+    rating integer NOT NULL,
+    created_at timestamp NOT NULL
+"""
+
+# `books` indexes as of `db.model_books`, `{unique}` dropped when partitioned
+INDEXES = (
+    "CREATE {unique} INDEX {table}_isbn13 ON {table} (isbn13)",
+    "CREATE INDEX {table}_created_at_id ON {table} (created_at, id)",
+    "CREATE INDEX {table}_rating_id ON {table} (rating, id)",
+    "CREATE INDEX {table}_pages_id ON {table} (pages, id)",
+    "CREATE INDEX {table}_title_id ON {table} (title, id)",
+)
+TRGM_INDEXES = (
+    "CREATE INDEX {table}_title_trgm ON {table} USING gin (title gin_trgm_ops)",
+    "CREATE INDEX {table}_author_trgm ON {table} USING gin (author gin_trgm_ops)",
+)
+
+
+def create_tables(
+    connection: Connection, *, partition_size: int, max_id: int, trgm: bool
+) -> list[tuple[int, int]]:
+    """
+    Create both tables, the partitioned one covering ids up to `max_id`, and
+    return its partition ranges.
+    """
+    for table in (PLAIN, PARTITIONED):
+        connection.execute(text(f"DROP TABLE IF EXISTS {table}"))
+    connection.execute(text(f"CREATE TABLE {PLAIN} ({COLUMNS}, PRIMARY KEY (id))"))
+    connection.execute(
+        text(
+            f"CREATE TABLE {PARTITIONED} ({COLUMNS}, PRIMARY KEY (id)) "
+            "PARTITION BY RANGE (id)"
+        )
+    )
+    ranges = [
+        (lower, lower + partition_size)
+        for lower in range(0, max_id + 1, partition_size)
+    ]
+    for lower, upper in ranges:
+        connection.execute(
+            text(
+                f"CREATE TABLE {PARTITIONED}_p{lower // partition_size} "
+                f"PARTITION OF {PARTITIONED} FOR VALUES FROM ({lower}) TO ({upper})"
+            )
+        )
+    for table, unique in ((PLAIN, "UNIQUE"), (PARTITIONED, "")):
+        for statement in INDEXES + (TRGM_INDEXES if trgm else ()):
+            connection.execute(text(statement.format(table=table, unique=unique)))
+    return ranges
+
+
+def install_trgm(engine: Engine) -> bool:
+    try:
+        with engine.begin() as connection:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except DBAPIError as e:
+        print(f"pg_trgm unavailable, searches scan the tables ({e.orig})")
+        return False
+    return True
+
+
+def copy_rows(engine: Engine, table: str, rows: list[tuple]) -> None:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    raw_connection = engine.raw_connection()
+    try:
+        with raw_connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {table} (id, {', '.join(BOOK_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+        raw_connection.commit()
+    finally:
+        raw_connection.close()
+
+
+def load(
+    engine: Engine, batches: list[list[tuple]], *, single_rows: list[tuple]
+) -> dict[str, tuple[float, float]]:
+    """
+    `(COPY rows/s, single row inserts/s)` per table, both with all indexes in place.
+    """
+    throughput = {}
+    for table in (PLAIN, PARTITIONED):
+        started = time.perf_counter()
+        for batch in batches:
+            copy_rows(engine, table, batch)
+        copied = sum(len(batch) for batch in batches)
+        copy_rate = copied / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        for row in single_rows:
+            with engine.begin() as connection:
+                connection.execute(
+                    text(
+                        f"INSERT INTO {table} (id, {', '.join(BOOK_COLUMNS)}) VALUES "
+                        f"(:id, {', '.join(f':{name}' for name in BOOK_COLUMNS)})"
+                    ),
+                    dict(zip(("id", *BOOK_COLUMNS), row)),
+                )
+        insert_rate = len(single_rows) / (time.perf_counter() - started)
+        throughput[table] = (copy_rate, insert_rate)
+    with engine.begin() as connection:
+        for table in (PLAIN, PARTITIONED):
+            connection.execute(text(f"ANALYZE {table}"))
+    return throughput
+
+
+def index_sizes(engine: Engine) -> dict[str, int]:
+    with engine.connect() as connection:
+        plain = connection.execute(
+            text("SELECT pg_indexes_size(CAST(:table AS regclass))"), {"table": PLAIN}
+        ).scalar()
+        # the indexes of a partitioned table are those of its partitions
+        partitioned = connection.execute(
+            text(
+                "SELECT sum(pg_indexes_size(relid)) FROM pg_partition_tree(:table) "
+                "WHERE isleaf"
+            ),
+            {"table": PARTITIONED},
+        ).scalar()
+    return {PLAIN: plain, PARTITIONED: partitioned}
+
+
+def first_page(
+    connection: Connection, table: str, pattern: str, *, bounds: tuple[int, int] | None
+) -> list[int]:
+    where = "(title ILIKE :pattern OR author ILIKE :pattern)"
+    if bounds is not None:
+        where += " AND id >= :lower AND id < :upper"
+    return list(
+        connection.execute(
+            text(f"SELECT id FROM {table} WHERE {where} ORDER BY id DESC LIMIT :limit"),
+            {
+                "pattern": pattern,
+                "limit": LIMIT + 1,
+                **({"lower": bounds[0], "upper": bounds[1]} if bounds else {}),
+            },
+        ).scalars()
+    )
+
+
+def fan_out(
+    connection: Connection, pattern: str, ranges: list[tuple[int, int]]
+) -> list[int]:
+    ids: list[int] = []
+    for bounds in reversed(ranges):
+        ids += first_page(connection, PARTITIONED, pattern, bounds=bounds)[
+            : LIMIT + 1 - len(ids)
+        ]
+        if len(ids) > LIMIT:
+            break
+    return ids
+
+
+def median_ms(func: Callable[[], list[int]], repeat: int) -> tuple[float, list[int]]:
+    timings, result = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), result
+
+
+def search_latency(
+    engine: Engine,
+    terms: list[str],
+    ranges: list[tuple[int, int]],
+    *,
+    trgm: bool,
+    repeat: int,
+) -> None:
+    print(
+        f"\n{'term':<16} {'matches':>8} {'plain':>10} {'partitioned':>12} {'fan-out':>10}"
+    )
+    with engine.connect() as connection:
+        if trgm:
+            # the `bitmap` strategy's settings, see `services.books.service`
+            connection.execute(text("SET enable_seqscan = OFF"))
+            connection.execute(text("SET enable_indexscan = OFF"))
+        for term in terms:
+            pattern = f"%{term}%"
+            matches = connection.execute(
+                text(
+                    f"SELECT count(*) FROM {PLAIN} "
+                    "WHERE title ILIKE :pattern OR author ILIKE :pattern"
+                ),
+                {"pattern": pattern},
+            ).scalar()
+            plain_ms, expected = median_ms(
+                lambda: first_page(connection, PLAIN, pattern, bounds=None), repeat
+            )
+            partitioned_ms, native = median_ms(
+                lambda: first_page(connection, PARTITIONED, pattern, bounds=None),
+                repeat,
+            )
+            fan_out_ms, fanned = median_ms(
+                lambda: fan_out(connection, pattern, ranges), repeat
+            )
+            assert expected == native == fanned, term
+            print(
+                f"{term:<16} {matches:>8} {plain_ms:>8.2f}ms {partitioned_ms:>10.2f}ms {fan_out_ms:>8.2f}ms"
+            )
+
+
+def run(
+    database_url: str,
+    *,
+    rows: int,
+    partition_size: int,
+    inserts: int,
+    repeat: int,
+    seed: int,
+    keep: bool,
+) -> None:
+    engine = create_engine(database_url)
+    trgm = install_trgm(engine)
+    with engine.begin() as connection:
+        ranges = create_tables(
+            connection,
+            partition_size=partition_size,
+            max_id=rows + inserts,
+            trgm=trgm,
+        )
+
+    pools = build_pools(seed, author_pool_size=10_000)
+    created_at = datetime.datetime(2026, 1, 1)
+    generated = generate_rows(
+        rng=random.Random(seed),
+        pools=pools,
+        count=rows + inserts,
+        created_at=created_at,
+        seed=seed,
+    )
+    numbered = [(index + 1, *row) for index, row in enumerate(generated)]
+    batches = [
+        numbered[start : min(start + LOAD_BATCH_SIZE, rows)]
+        for start in range(0, rows, LOAD_BATCH_SIZE)
+    ]
+    try:
+        throughput = load(engine, batches, single_rows=numbered[rows:])
+        sizes = index_sizes(engine)
+        print(f"{rows} rows, {len(ranges)} partitions of {partition_size} ids")
+        print(f"{'table':<24} {'index size':>12} {'COPY rows/s':>12} {'inserts/s':>10}")
+        for table in (PLAIN, PARTITIONED):
+            copy_rate, insert_rate = throughput[table]
+            print(
+                f"{table:<24} {sizes[table] / 2**20:>10.1f}MB {copy_rate:>12,.0f} {insert_rate:>10,.0f}"
+            )
+
+        # the most and least common title words, and one matching nothing
+        counts = Counter(row[1].split()[0].lower() for row in numbered)
+        ranked = counts.most_common()
+        terms = [ranked[0][0], ranked[-1][0], "zzzz"]
+        search_latency(engine, terms, ranges, trgm=trgm, repeat=repeat)
+    finally:
+        if not keep:
+            with engine.begin() as connection:
+                for table in (PLAIN, PARTITIONED):
+                    connection.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        engine.dispose()
+
+
+def parse_args(argv: list[str] | None = None) -> Any:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--database-url",
+        default=None,
+        help="Synchronous SQLAlchemy URL, defaults to the configured PostgreSQL database",
+    )
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--partition-size", type=int, default=50_000)
+    parser.add_argument(
+        "--inserts", type=int, default=2_000, help="single row inserts per table"
+    )
+    parser.add_argument("--repeat", type=int, default=20, help="runs per search")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--keep", action="store_true", help="keep the scratch tables afterwards"
+    )
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(
+        args.database_url or get_config().sync_database_url,
+        rows=args.rows,
+        partition_size=args.partition_size,
+        inserts=args.inserts,
+        repeat=args.repeat,
+        seed=args.seed,
+        keep=args.keep,
+    )
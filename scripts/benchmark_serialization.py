@@ -0,0 +1,119 @@
+"""
+Micro-benchmark of the book list page cost: ORM entities re-validated through
+`BookResponse` versus response columns encoded straight from row tuples.
+
+    python3 scripts/benchmark_serialization.py --page-sizes 20 100 500
+"""
+import argparse
+import datetime
+import random
+import timeit
+from typing import Any, Callable
+
+from sqlalchemy import Engine, create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from db.database import Base
+from db.model_books import Book
+from schemas.base import PaginatedListResponse, PaginationCursor
+from schemas.books import BookResponse
+from scripts.generate_books import BOOK_COLUMNS, build_pools, generate_rows
+from services.books.queries import BOOK_RESPONSE_COLUMNS
+from services.books.serializers import serialize_book_list_page
+
+
+def setup_database(rows: int, seed: int) -> Engine:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    data = generate_rows(
+        rng=random.Random(seed),
+        pools=build_pools(seed, author_pool_size=1_000),
+        count=rows,
+        created_at=datetime.datetime(2026, 1, 1),
+    )
+    with engine.begin() as connection:
+        connection.execute(insert(Book), [dict(zip(BOOK_COLUMNS, row)) for row in data])
+    return engine
+
+
+def orm_page(session: Session, limit: int) -> bytes:
+    """
+    The previous path: hydrate `Book` entities and validate each into `BookResponse`.
+    """
+    session.expunge_all()
+    books = session.scalars(select(Book).order_by(Book.id.desc()).limit(limit)).all()
+    page = PaginatedListResponse[BookResponse](
+        results=[BookResponse(**book.__dict__) for book in books],
+        next_cursor=PaginationCursor(id=books[-1].id),
+    )
+    return page.model_dump_json(by_alias=True).encode()
+
+
+def row_page(session: Session, limit: int) -> bytes:
+    rows = session.execute(
+        select(*BOOK_RESPONSE_COLUMNS).order_by(Book.id.desc()).limit(limit)
+    ).all()
+    return serialize_book_list_page(
+        rows=rows, next_cursor=PaginationCursor(id=rows[-1].id)
+    )
+
+
+def measure(func: Callable[[], Any], number: int) -> float:
+    """
+    Best of 5 runs, in microseconds per call.
+    """
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1_000_000
+
+
+def run(page_sizes: list[int], number: int, seed: int) -> None:
+    engine = setup_database(max(page_sizes), seed)
+    with Session(engine) as session:
+        print(
+            f"{'page':>6} {'stage':<15} {'orm+pydantic':>14} {'rows+encoder':>14} {'speedup':>8}"
+        )
+        for limit in page_sizes:
+            assert orm_page(session, limit) == row_page(session, limit)
+
+            # serialization only, on already fetched data
+            session.expunge_all()
+            books = session.scalars(
+                select(Book).order_by(Book.id.desc()).limit(limit)
+            ).all()
+            rows = session.execute(
+                select(*BOOK_RESPONSE_COLUMNS).order_by(Book.id.desc()).limit(limit)
+            ).all()
+            cursor = PaginationCursor(id=rows[-1].id)
+            before = measure(
+                lambda: PaginatedListResponse[BookResponse](
+                    results=[BookResponse(**book.__dict__) for book in books],
+                    next_cursor=cursor,
+                ).model_dump_json(by_alias=True),
+                number,
+            )
+            after = measure(
+                lambda: serialize_book_list_page(rows=rows, next_cursor=cursor),
+                number,
+            )
+            print(
+                f"{limit:>6} {'serialize':<15} {before:>12.1f}us {after:>12.1f}us {before / after:>7.1f}x"
+            )
+
+            # fetch + serialize
+            before = measure(lambda: orm_page(session, limit), number)
+            after = measure(lambda: row_page(session, limit), number)
+            print(
+                f"{limit:>6} {'fetch+serialize':<15} {before:>12.1f}us {after:>12.1f}us {before / after:>7.1f}x"
+            )
+
+
+def parse_args(argv: list[str] | None = None) -> Any:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[20, 100, 500])
+    parser.add_argument("--number", type=int, default=50, help="calls per timing run")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.page_sizes, args.number, args.seed)
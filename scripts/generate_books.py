@@ -1,37 +1,229 @@
-import random
 import argparse
+import csv
+import datetime
+import io
+import random
+import time
+from multiprocessing import Pool
+from typing import Any
+
 from faker import Faker
-from sqlalchemy import insert
+from sqlalchemy import Engine, create_engine, insert, text
 from tqdm import tqdm  # type: ignore
 
 from db.model_books import Book
-from db.database import SessionLocal
+from settings import get_config
 
-fake = Faker()
+BOOK_COLUMNS = ("title", "author", "isbn", "isbn13", "pages", "rating", "created_at")
+# Trigram GIN indexes are the expensive ones to maintain row by row during a load
+REBUILT_INDEXES = ("idx_title_trgm", "idx_author_trgm")
 
+WORD_POOL_SIZE = 5_000
+AUTHOR_POOL_SIZE = 50_000
+# 9 free ISBN-13 digits after the 978 prefix, and a multiplier coprime to their count
+ISBN_SPACE = 10**9
+ISBN_MULTIPLIER = 387_420_489
 
-def generate_books(n: int = 10_000_000, batch_size: int = 10_000) -> None:
-    with SessionLocal() as session:
-        for _ in tqdm(range(0, n, batch_size), desc="Inserting books"):
-            batch = []
-            for _ in range(batch_size):
-                batch.append(
-                    {
-                        "title": fake.sentence(nb_words=random.randint(1, 5)).rstrip(
-                            "."
-                        ),
-                        "author": fake.name(),
-                        "isbn": fake.isbn13(separator="-"),
-                        "pages": random.randint(100, 1000),
-                        "rating": random.randint(1, 5),
-                    }
-                )
+BookRow = tuple[str, str, str, str, int, int, datetime.datetime]
+# seed, batch index, index of the first row, row count, creation time
+BatchTask = tuple[int, int, int, int, datetime.datetime]
 
-            session.execute(insert(Book), batch)
-            session.commit()
+# Per-process state set up once by `_init_worker`
+_worker_engine: Engine | None = None
+_worker_pools: dict[str, list[str]] = {}
 
 
-if __name__ == "__main__":
+def build_pools(
+    seed: int, author_pool_size: int = AUTHOR_POOL_SIZE
+) -> dict[str, list[str]]:
+    """
+    Pre-generate the Faker vocabulary once, rows are later sampled from it.
+    """
+    fake = Faker()
+    fake.seed_instance(seed)
+    return {
+        "words": sorted(set(fake.words(nb=WORD_POOL_SIZE))),
+        "authors": [fake.name() for _ in range(author_pool_size)],
+    }
+
+
+def isbn13_for_index(index: int, seed: int) -> str:
+    """
+    ISBN-13 of the `index`-th generated row, unique for every index below `ISBN_SPACE`.
+
+    `index * ISBN_MULTIPLIER + offset` is a permutation of `range(ISBN_SPACE)`,
+    random sampling would collide ~50k times over 10M rows.
+    """
+    offset = random.Random(seed).randrange(ISBN_SPACE)
+    digits = f"978{(index * ISBN_MULTIPLIER + offset) % ISBN_SPACE:09d}"
+    total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(digits))
+    return f"{digits}{(10 - total % 10) % 10}"
+
+
+def generate_rows(
+    *,
+    rng: random.Random,
+    pools: dict[str, list[str]],
+    count: int,
+    created_at: datetime.datetime,
+    first_index: int = 0,
+    seed: int = 0,
+) -> list[BookRow]:
+    """
+    Build `count` rows by sampling the pre-generated pools in bulk instead of calling Faker per row.
+
+    `first_index` is the position of the first row in the whole load, it keeps the
+    ISBNs unique across batches (see `isbn13_for_index`).
+    """
+    lengths = rng.choices(range(1, 6), k=count)
+    words = rng.choices(pools["words"], k=sum(lengths))
+    authors = rng.choices(pools["authors"], k=count)
+    pages = rng.choices(range(100, 1001), k=count)
+    ratings = rng.choices(range(1, 6), k=count)
+
+    rows: list[BookRow] = []
+    offset = 0
+    for index, length in enumerate(lengths):
+        title = " ".join(words[offset : offset + length])
+        offset += length
+        isbn = isbn13_for_index(first_index + index, seed)
+        rows.append(
+            (
+                title[0].upper() + title[1:],
+                authors[index],
+                isbn,
+                isbn,
+                pages[index],
+                ratings[index],
+                created_at,
+            )
+        )
+    return rows
+
+
+def copy_rows(engine: Engine, rows: list[BookRow]) -> None:
+    """
+    Stream rows with `COPY FROM STDIN` on PostgreSQL, executemany insert otherwise.
+    """
+    if engine.dialect.name != "postgresql":
+        with engine.begin() as connection:
+            connection.execute(
+                insert(Book), [dict(zip(BOOK_COLUMNS, row)) for row in rows]
+            )
+        return
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+
+    raw_connection = engine.raw_connection()
+    try:
+        with raw_connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {Book.__tablename__} ({', '.join(BOOK_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+        raw_connection.commit()
+    finally:
+        raw_connection.close()
+
+
+def _init_worker(database_url: str, pools: dict[str, list[str]]) -> None:
+    global _worker_engine, _worker_pools
+    _worker_engine = create_engine(database_url)
+    _worker_pools = pools
+
+
+def batch_tasks(
+    n: int, batch_size: int, *, seed: int, created_at: datetime.datetime
+) -> list[BatchTask]:
+    return [
+        (seed, batch_index, start, min(batch_size, n - start), created_at)
+        for batch_index, start in enumerate(range(0, n, batch_size))
+    ]
+
+
+def generate_batch(task: BatchTask, pools: dict[str, list[str]]) -> list[BookRow]:
+    """
+    Rows of one batch, from an RNG derived from the seed and the batch index only.
+    """
+    seed, batch_index, first_index, count, created_at = task
+    return generate_rows(
+        rng=random.Random(f"{seed}:{batch_index}"),
+        pools=pools,
+        count=count,
+        created_at=created_at,
+        first_index=first_index,
+        seed=seed,
+    )
+
+
+def _load_batch(task: BatchTask) -> int:
+    assert _worker_engine is not None
+    copy_rows(_worker_engine, generate_batch(task, _worker_pools))
+    return task[3]
+
+
+def drop_indexes(engine: Engine) -> None:
+    with engine.begin() as connection:
+        for name in REBUILT_INDEXES:
+            connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def rebuild_indexes(engine: Engine) -> None:
+    indexes = {index.name: index for index in Book.__table__.indexes}
+    with engine.begin() as connection:
+        for name in REBUILT_INDEXES:
+            indexes[name].create(connection, checkfirst=True)
+
+
+def generate_books(
+    n: int = 10_000_000,
+    batch_size: int = 10_000,
+    *,
+    workers: int = 1,
+    seed: int = 0,
+    database_url: str | None = None,
+    rebuild: bool = False,
+    author_pool_size: int = AUTHOR_POOL_SIZE,
+) -> float:
+    """
+    Insert `n` fake books and return the achieved rows/sec.
+
+    Batches are generated and loaded by a pool of `workers` processes. Every batch
+    uses its own RNG derived from `seed`, so the output does not depend on the
+    number of workers or on scheduling order.
+    """
+    database_url = database_url or get_config().sync_database_url
+    engine = create_engine(database_url)
+    pools = build_pools(seed, author_pool_size=author_pool_size)
+    created_at = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    tasks = batch_tasks(n, batch_size, seed=seed, created_at=created_at)
+
+    if rebuild and engine.dialect.name == "postgresql":
+        drop_indexes(engine)
+
+    started = time.perf_counter()
+    with Pool(
+        workers, initializer=_init_worker, initargs=(database_url, pools)
+    ) as pool:
+        with tqdm(total=n, desc="Inserting books", unit="rows") as progress:
+            for count in pool.imap_unordered(_load_batch, tasks):
+                progress.update(count)
+    load_seconds = time.perf_counter() - started
+
+    if rebuild and engine.dialect.name == "postgresql":
+        index_started = time.perf_counter()
+        rebuild_indexes(engine)
+        print(f"Rebuilt indexes in {time.perf_counter() - index_started:.1f}s")
+
+    rows_per_second = n / load_seconds if load_seconds else float("inf")
+    print(f"Inserted {n} rows in {load_seconds:.1f}s ({rows_per_second:,.0f} rows/sec)")
+    engine.dispose()
+    return rows_per_second
+
+
+def parse_args(argv: list[str] | None = None) -> Any:
     parser = argparse.ArgumentParser(description="Generate fake books.")
     parser.add_argument(
         "--count",
@@ -39,6 +231,39 @@ if __name__ == "__main__":
         type=int,
         default=10_000_000,
     )
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=1,
+        help="Number of generator/loader processes",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed for deterministic output"
+    )
+    parser.add_argument(
+        "--database-url",
+        default=None,
+        help="Synchronous SQLAlchemy URL, defaults to the configured PostgreSQL database",
+    )
+    parser.add_argument(
+        "--rebuild-indexes",
+        action="store_true",
+        help=f"Drop {', '.join(REBUILT_INDEXES)} before the load and rebuild them afterwards (PostgreSQL only)",
+    )
+    parser.add_argument("--author-pool-size", type=int, default=AUTHOR_POOL_SIZE)
+    return parser.parse_args(argv)
 
-    args = parser.parse_args()
-    generate_books(n=args.count)
+
+if __name__ == "__main__":
+    args = parse_args()
+    generate_books(
+        n=args.count,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        seed=args.seed,
+        database_url=args.database_url,
+        rebuild=args.rebuild_indexes,
+        author_pool_size=args.author_pool_size,
+    )
@@ -0,0 +1,20 @@
+#!/usr/bin/env sh
+# Production server: several worker processes on uvloop/httptools, no reload.
+# Every worker has its own connection pool, the database must allow
+# WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections.
+set -eu
+
+cd "$(dirname $0)/.."
+
+# read by settings.py too, several workers need a shared CURSOR_SECRET
+export WEB_CONCURRENCY="${WEB_CONCURRENCY:-4}"
+
+exec uvicorn main:app \
+    --host "${HOST:-0.0.0.0}" \
+    --port "${PORT:-8000}" \
+    --workers "$WEB_CONCURRENCY" \
+    --loop uvloop \
+    --http httptools \
+    --timeout-keep-alive "${KEEP_ALIVE_TIMEOUT:-5}" \
+    --proxy-headers \
+    --no-access-log
@@ -0,0 +1,134 @@
+import json
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+from starlette.testclient import TestClient
+
+from conftest import create_fake_book_data
+from db.model_authors import Author, normalize_author_name
+from db.model_books import Book
+
+pytestmark = pytest.mark.asyncio
+
+
+def create_book(test_client: TestClient, *, author: str, rating: int) -> int:
+    response = test_client.post(
+        "/internal_api/book/create",
+        json={**create_fake_book_data(), "author": author, "rating": rating},
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    return response.json()["id"]
+
+
+async def author_id_of(async_db_session: AsyncSession, name: str) -> int:
+    return (
+        await async_db_session.execute(
+            select(Author.id).where(
+                Author.name_normalized == normalize_author_name(name)
+            )
+        )
+    ).scalar_one()
+
+
+def top_authors(test_client: TestClient, **params: str) -> list[tuple[str, int, float]]:
+    response = test_client.get("/internal_api/author/top", params=params)
+    assert response.status_code == status.HTTP_200_OK
+    return [
+        (author["name"], author["bookCount"], author["averageRating"])
+        for author in response.json()["results"]
+    ]
+
+
+class TestAuthors:
+    async def test_books_share_normalized_author(
+        self, async_db_session: AsyncSession, test_client: TestClient
+    ) -> None:
+        first = create_book(test_client, author="Ursula K. Le Guin", rating=5)
+        second = create_book(test_client, author="  ursula k.   LE GUIN ", rating=3)
+        other = create_book(test_client, author="Iain M. Banks", rating=4)
+
+        books = {
+            book.id: book.author_id
+            for book in (await async_db_session.execute(select(Book))).scalars()
+        }
+        assert books[first] == books[second] != books[other]
+
+        authors = (await async_db_session.execute(select(Author))).scalars().all()
+        assert sorted(
+            (author.name, author.book_count, author.rating_sum) for author in authors
+        ) == [("Iain M. Banks", 1, 4), ("Ursula K. Le Guin", 2, 8)]
+
+    async def test_bulk_rows_counted(
+        self, async_db_session: AsyncSession, test_client: TestClient
+    ) -> None:
+        rows = [
+            {**create_fake_book_data(), "author": "Octavia E. Butler", "rating": rating}
+            for rating in (2, 3, 5)
+        ]
+        response = test_client.post(
+            "/internal_api/book/bulk",
+            content="\n".join(json.dumps(row) for row in rows),
+            headers={"content-type": "application/x-ndjson"},
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["created"] == 3
+
+        assert top_authors(test_client) == [("Octavia E. Butler", 3, 10 / 3)]
+
+    async def test_top_authors(self, test_client: TestClient) -> None:
+        for author, ratings in {
+            "Prolific": (3, 3, 3, 4),
+            "Acclaimed": (5, 4),
+            "One Hit": (5,),
+        }.items():
+            for rating in ratings:
+                create_book(test_client, author=author, rating=rating)
+
+        assert top_authors(test_client, by="rating") == [
+            ("One Hit", 1, 5.0),
+            ("Acclaimed", 2, 4.5),
+            ("Prolific", 4, 3.25),
+        ]
+        assert top_authors(test_client, by="rating", minBooks="2", limit="1") == [
+            ("Acclaimed", 2, 4.5)
+        ]
+        assert [name for name, _, _ in top_authors(test_client, by="count")] == [
+            "Prolific",
+            "Acclaimed",
+            "One Hit",
+        ]
+
+        response = test_client.get("/internal_api/author/top", params={"by": "pages"})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    async def test_author_books_pages(
+        self, async_db_session: AsyncSession, test_client: TestClient
+    ) -> None:
+        ids = [create_book(test_client, author="Stanisław Lem", rating=4)]
+        create_book(test_client, author="Someone Else", rating=4)
+        ids += [
+            create_book(test_client, author="Stanisław Lem", rating=4) for _ in range(4)
+        ]
+        author_id = await author_id_of(async_db_session, "Stanisław Lem")
+
+        seen = []
+        params: dict[str, int] = {"limit": 2}
+        while True:
+            response = test_client.get(
+                f"/internal_api/author/{author_id}/books", params=params
+            )
+            assert response.status_code == status.HTTP_200_OK
+            page = response.json()
+            seen += [book["id"] for book in page["results"]]
+            assert all(book["author"] == "Stanisław Lem" for book in page["results"])
+            if page["nextCursor"] is None:
+                break
+            params["cursorId"] = page["nextCursor"]["id"]
+
+        assert seen == sorted(ids, reverse=True)
+
+    async def test_unknown_author(self, test_client: TestClient) -> None:
+        response = test_client.get("/internal_api/author/12345/books")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
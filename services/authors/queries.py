@@ -0,0 +1,52 @@
+from sqlalchemy import Select, select
+
+from db.model_authors import Author
+from db.model_books import Book
+from schemas.authors import AuthorTopField
+from services.books.queries import BOOK_RESPONSE_COLUMNS
+
+# ranking column of each `by` option, maintained on insert (see `db.model_books`)
+AUTHOR_TOP_COLUMNS = {
+    AuthorTopField.RATING: Author.rating_avg,
+    AuthorTopField.COUNT: Author.book_count,
+}
+
+AUTHOR_RESPONSE_COLUMNS = (
+    Author.id,
+    Author.name,
+    Author.book_count,
+    Author.rating_avg.label("average_rating"),
+)
+
+
+def build_top_authors_query(
+    *, by: AuthorTopField, limit: int, min_books: int
+) -> Select:
+    """
+    A backward scan of `idx_authors_<column>_id` read until `limit` authors pass
+    the `min_books` filter.
+    """
+    column = AUTHOR_TOP_COLUMNS[by]
+    return (
+        select(*AUTHOR_RESPONSE_COLUMNS)
+        .where(column.is_not(None), Author.book_count >= min_books)
+        .order_by(column.desc(), Author.id.desc())
+        .limit(limit)
+    )
+
+
+def build_author_books_query(
+    *, author_id: int, limit: int, cursor_id: int | None
+) -> Select:
+    """
+    Newest first keyset page over `idx_books_author_id_id`, one extra row tells
+    whether there is a next page.
+    """
+    q = select(*BOOK_RESPONSE_COLUMNS).where(Book.author_id == author_id)
+    if cursor_id:
+        q = q.where(Book.id < cursor_id)
+    return q.order_by(Book.id.desc()).limit(limit + 1)
+
+
+def build_author_exists_query(*, author_id: int) -> Select:
+    return select(Author.id).where(Author.id == author_id)
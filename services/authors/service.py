@@ -0,0 +1,72 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+from starlette.exceptions import HTTPException
+
+from helpers.timing import timed
+from schemas.authors import (
+    AuthorBooksQueryParams,
+    AuthorResponse,
+    AuthorTopQueryParams,
+    AuthorTopResponse,
+)
+from schemas.base import PaginatedListResponse, PaginationCursor
+from schemas.books import BookResponse
+from services.authors.queries import (
+    build_author_books_query,
+    build_author_exists_query,
+    build_top_authors_query,
+)
+
+
+async def get_top_authors(
+    *, query_params: AuthorTopQueryParams, async_db: AsyncSession
+) -> AuthorTopResponse:
+    """
+    Authors ranked by their stored aggregates, no books are read.
+    """
+    result = await async_db.execute(
+        build_top_authors_query(
+            by=query_params.by,
+            limit=query_params.limit,
+            min_books=query_params.min_books,
+        )
+    )
+    with timed("hydrate"):
+        rows = result.all()
+    return AuthorTopResponse(
+        results=[AuthorResponse.model_validate(row) for row in rows]
+    )
+
+
+async def get_author_books(
+    *, author_id: int, query_params: AuthorBooksQueryParams, async_db: AsyncSession
+) -> PaginatedListResponse[BookResponse]:
+    """
+    Books of an author, newest first. Unknown authors are 404, an author whose
+    pages ran out gets an empty page.
+    """
+    result = await async_db.execute(
+        build_author_books_query(
+            author_id=author_id,
+            limit=query_params.limit,
+            cursor_id=query_params.cursor_id,
+        )
+    )
+    with timed("hydrate"):
+        rows = result.all()
+
+    # only an empty page pays for the existence check
+    if not rows:
+        exists = await async_db.execute(build_author_exists_query(author_id=author_id))
+        if exists.scalar() is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Author not found",
+            )
+
+    has_next = len(rows) > query_params.limit
+    results = [BookResponse.model_validate(row) for row in rows[: query_params.limit]]
+    return PaginatedListResponse[BookResponse](
+        results=results,
+        next_cursor=PaginationCursor(id=results[-1].id) if has_next else None,
+    )
@@ -1,12 +1,105 @@
+import asyncio
+import base64
+import random
+import csv
+import io
+import json
+import zlib
+from collections import Counter
+from collections.abc import AsyncIterator, Callable
+
+import httpx
 import pytest
-from sqlalchemy.ext.asyncio import AsyncSession
+import pytest_asyncio
+from pydantic import SecretStr, ValidationError
+from sqlalchemy import create_engine, false, func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool, QueuePool
 from starlette import status
+from starlette.exceptions import HTTPException
+from starlette.responses import StreamingResponse
 from starlette.testclient import TestClient
+from starlette.datastructures import Headers
+from starlette.types import Message, Receive, Scope, Send
 
-from conftest import SORTED_BOOKS_COUNT, bulk_create_books, create_fake_book_data
+from conftest import (
+    SORTED_BOOKS_COUNT,
+    TestAsyncSessionLocal,
+    bulk_create_books,
+    create_fake_book_data,
+    test_async_engine,
+)
+from db.database import (
+    Base,
+    get_read_db,
+    get_read_sessionmaker,
+    get_replica_router,
+    slow_request_log,
+)
+from db.replicas import READ_YOUR_WRITES_COOKIE, ReplicaRouter, ReplicaSelection
 from db.model_books import Book
-from schemas.books import BookListQueryParams
+from schemas.base import KeysetCursor, PaginationCursor
+from schemas.books import (
+    BOOK_BATCH_GET_MAX_IDS,
+    BookBatchGetResponse,
+    BookBulkFormat,
+    BookCreateRequest,
+    BookExportQueryParams,
+    BookListQueryParams,
+    BookListResponse,
+    BookResponse,
+)
 from schemas.for_tests import BookTESTBulkCreateUpdateField
+from helpers.admission import (
+    AdmissionRejected,
+    ConcurrencyLimiter,
+    InMemoryRateLimitBackend,
+    admission_requests_total,
+)
+from helpers.cache import (
+    CacheBackend,
+    InMemoryCacheBackend,
+    cache_evictions_total,
+    cache_requests_total,
+)
+from helpers.pool import db_pool_capacity, db_pool_connections, watch_pool
+from helpers.compression import (
+    BrotliCodec,
+    brotli,
+    zstandard,
+    CompressionMiddleware,
+    GzipCodec,
+    ZstdCodec,
+    available_codecs,
+    choose_codec,
+)
+from helpers.queries import capture_explain
+from helpers.singleflight import SingleFlight, singleflight_requests_total
+from helpers.timing import SERVER_TIMING_HEADER
+from main import app
+from services.books import service
+from services.books.admission import book_rate_limiter, expensive_book_requests
+from services.books.service import book_list_partitions_scanned
+from services.books.bulk import ingest_books
+from services.books.cache import CACHE_HEADER, book_list_cache, book_list_flights
+from services.books.export import stream_books_export
+from services.books.partitions import BookPartitions, get_book_partitions
+from services.books.queries import build_book_list_query, prepare_book_list_query
+from services.books.search_strategy import SEARCH_STRATEGY_HEADER, SearchStrategy
+from services.books import bulk, suggest, write_behind
+from services.books.suggest import (
+    BookSuggestions,
+    PrefixIndex,
+    get_book_suggestions,
+    normalize_suggestion,
+)
+from services.books.write_behind import (
+    BookCreateQueue,
+    book_create_batch_size,
+    get_book_create_queue,
+)
+from settings import Config
 
 pytestmark = pytest.mark.asyncio
 
@@ -217,6 +310,667 @@ class TestBookList:
         assert response_json["nextCursor"] is not None
         assert updated_field_value in response_json["results"][0]["title"]
 
+    async def test_fast_serialization_matches_response_model(
+        self, test_client: TestClient, sorted_books: list[Book]
+    ) -> None:
+        limit = SORTED_BOOKS_COUNT - 1
+        response = test_client.get(f"/internal_api/book?limit={limit}")
+        assert response.status_code == status.HTTP_200_OK
+
+        page = BookListResponse(
+            results=[BookResponse(**book.__dict__) for book in sorted_books[:limit]],
+            next_cursor=PaginationCursor(
+                id=sorted_books[limit - 1].id,
+                token=response.json()["nextCursor"]["token"],
+            ),
+        )
+        assert response.content == page.model_dump_json(by_alias=True).encode()
+
+
+class TestBookListSort:
+    @staticmethod
+    def _collect(
+        test_client: TestClient, url: str, cursor_key: str = "nextCursor"
+    ) -> list[list[int]]:
+        pages: list[list[int]] = []
+        seen_cursors: set[str] = set()
+        next_url = url
+        while next_url:
+            assert len(pages) <= SORTED_BOOKS_COUNT, "pagination does not terminate"
+            response = test_client.get(next_url)
+            assert response.status_code == status.HTTP_200_OK
+            response_json = response.json()
+            pages.append([result["id"] for result in response_json["results"]])
+            cursor = response_json[cursor_key]
+            if cursor:
+                assert cursor["token"] not in seen_cursors
+                seen_cursors.add(cursor["token"])
+            next_url = f"{url}&cursor={cursor['token']}" if cursor else ""
+        return pages
+
+    @pytest.mark.parametrize("sort", ["id", "created_at", "rating", "pages", "title"])
+    @pytest.mark.parametrize("direction", ["asc", "desc"])
+    async def test_pages_through_every_order(
+        self,
+        test_client: TestClient,
+        sorted_books: list[Book],
+        sort: str,
+        direction: str,
+    ) -> None:
+        pages = self._collect(
+            test_client, f"/internal_api/book?limit=3&sort={sort}&direction={direction}"
+        )
+
+        expected = sorted(
+            sorted_books,
+            key=lambda book: (getattr(book, sort), book.id),
+            reverse=direction == "desc",
+        )
+        assert [book_id for page in pages for book_id in page] == [
+            book.id for book in expected
+        ]
+        assert all(len(page) == 3 for page in pages[:-1])
+
+    async def test_prev_cursor_returns_previous_page(
+        self, test_client: TestClient, sorted_books: list[Book]
+    ) -> None:
+        url = "/internal_api/book?limit=3&sort=rating"
+        first = test_client.get(url).json()
+        assert first["prevCursor"] is None
+
+        second = test_client.get(f"{url}&cursor={first['nextCursor']['token']}").json()
+        third = test_client.get(f"{url}&cursor={second['nextCursor']['token']}").json()
+
+        back = test_client.get(f"{url}&cursor={third['prevCursor']['token']}").json()
+        assert back["results"] == second["results"]
+        assert back["nextCursor"]["id"] == second["nextCursor"]["id"]
+
+        back = test_client.get(f"{url}&cursor={back['prevCursor']['token']}").json()
+        assert back["results"] == first["results"]
+        assert back["prevCursor"] is None
+        assert back["nextCursor"] is not None
+
+    async def test_legacy_cursor_id_still_pages_by_id(
+        self, test_client: TestClient, sorted_books: list[Book]
+    ) -> None:
+        response = test_client.get(
+            f"/internal_api/book?limit=2&cursorId={sorted_books[1].id}"
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert [result["id"] for result in response.json()["results"]] == [
+            book.id for book in sorted_books[2:4]
+        ]
+
+    @pytest.mark.parametrize(
+        "query",
+        [
+            pytest.param("sort=rating&cursorId=10", id="cursor_id with sort"),
+            pytest.param("sort=title&search=hobbit&searchMode=fulltext", id="fulltext"),
+        ],
+    )
+    async def test_invalid_sort_params(
+        self, test_client: TestClient, query: str
+    ) -> None:
+        response = test_client.get(f"/internal_api/book?{query}")
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    async def test_rejects_tampered_or_foreign_cursor(
+        self, test_client: TestClient, sorted_books: list[Book]
+    ) -> None:
+        token = test_client.get("/internal_api/book?limit=3&sort=pages").json()[
+            "nextCursor"
+        ]["token"]
+        payload, signature = token.split(".")
+        forged = KeysetCursor.model_validate_json(
+            base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+        ).model_copy(update={"id": 1})
+        forged_token = f"{base64.urlsafe_b64encode(forged.model_dump_json().encode()).decode().rstrip('=')}.{signature}"
+
+        for url in (
+            f"/internal_api/book?limit=3&sort=pages&cursor={forged_token}",
+            "/internal_api/book?limit=3&sort=pages&cursor=garbage",
+            f"/internal_api/book?limit=3&sort=rating&cursor={token}",
+            f"/internal_api/book?limit=3&sort=pages&direction=asc&cursor={token}",
+        ):
+            response = test_client.get(url)
+            assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+class TestBookSearchModes:
+    async def test_fulltext_multi_term_ranked(
+        self,
+        async_db_session: AsyncSession,
+        test_client: TestClient,
+        sorted_books: list[Book],
+    ) -> None:
+        books = await bulk_create_books(
+            async_db_session=async_db_session,
+            book_count=4,
+            update_field_list=[
+                BookTESTBulkCreateUpdateField(title="Ring Tales", author="Tolkien"),
+                BookTESTBulkCreateUpdateField(title="The Tolkien Ring"),
+                BookTESTBulkCreateUpdateField(title="Ring only"),
+                BookTESTBulkCreateUpdateField(title="Tolkien only"),
+            ],
+        )
+        title_match = next(book for book in books if book.title == "The Tolkien Ring")
+        author_match = next(book for book in books if book.title == "Ring Tales")
+
+        response = test_client.get(
+            "/internal_api/book?searchMode=fulltext&search=tolkien ring"
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+        results = response.json()["results"]
+        assert [result["id"] for result in results] == [title_match.id, author_match.id]
+
+    async def test_fulltext_pagination(
+        self, async_db_session: AsyncSession, test_client: TestClient
+    ) -> None:
+        books = await bulk_create_books(
+            async_db_session=async_db_session,
+            book_count=5,
+            update_field_list=[
+                BookTESTBulkCreateUpdateField(title=f"Hobbit part {index}")
+                for index in range(5)
+            ],
+        )
+
+        seen_ids: list[int] = []
+        seen_cursors: set[tuple[int, float]] = set()
+        url = "/internal_api/book?searchMode=fulltext&search=hobbit&limit=2"
+        next_url = url
+        for _ in range(len(books) + 1):
+            if not next_url:
+                break
+            response = test_client.get(next_url)
+            assert response.status_code == status.HTTP_200_OK
+            response_json = response.json()
+            seen_ids.extend(result["id"] for result in response_json["results"])
+            cursor = response_json["nextCursor"]
+            if cursor:
+                assert (cursor["id"], cursor["rank"]) not in seen_cursors
+                seen_cursors.add((cursor["id"], cursor["rank"]))
+            next_url = (
+                f"{url}&cursorId={cursor['id']}&cursorRank={cursor['rank']}"
+                if cursor
+                else ""
+            )
+        else:
+            pytest.fail("pagination does not terminate")
+
+        assert sorted(seen_ids, reverse=True) == [book.id for book in books]
+        assert len(set(seen_ids)) == len(seen_ids)
+
+    async def test_fulltext_cursor_requires_rank(self, test_client: TestClient) -> None:
+        response = test_client.get(
+            "/internal_api/book?searchMode=fulltext&search=hobbit&cursorId=10"
+        )
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    async def test_prefix(
+        self, async_db_session: AsyncSession, test_client: TestClient
+    ) -> None:
+        await bulk_create_books(
+            async_db_session=async_db_session,
+            book_count=2,
+            update_field_list=[
+                BookTESTBulkCreateUpdateField(title="Hobbit"),
+                BookTESTBulkCreateUpdateField(title="The Hobbit"),
+            ],
+        )
+        response = test_client.get("/internal_api/book?searchMode=prefix&search=hobb")
+        assert response.status_code == status.HTTP_200_OK
+        assert [result["title"] for result in response.json()["results"]] == ["Hobbit"]
+
+
+class TestSearchStrategy:
+    @pytest.mark.parametrize(
+        "query,expected_strategy",
+        [
+            pytest.param("", SearchStrategy.NONE, id="no-search"),
+            pytest.param(
+                "&searchMode=fulltext&search=common",
+                SearchStrategy.FULLTEXT,
+                id="fulltext",
+            ),
+            pytest.param("&search=co", SearchStrategy.INDEX_WALK, id="short-term"),
+            pytest.param("&search=common", SearchStrategy.INDEX_WALK, id="common-term"),
+            pytest.param("&search=rare-term", SearchStrategy.BITMAP, id="rare-term"),
+            pytest.param("&search=missing", SearchStrategy.BITMAP, id="no-match"),
+        ],
+    )
+    async def test_strategy_header(
+        self,
+        async_db_session: AsyncSession,
+        test_client: TestClient,
+        query: str,
+        expected_strategy: SearchStrategy,
+    ) -> None:
+        await bulk_create_books(
+            async_db_session=async_db_session,
+            book_count=SORTED_BOOKS_COUNT,
+            update_field_list=[
+                BookTESTBulkCreateUpdateField(
+                    title="rare-term" if index == 0 else f"common title {index}"
+                )
+                for index in range(SORTED_BOOKS_COUNT)
+            ],
+        )
+
+        response = test_client.get(f"/internal_api/book?limit=1{query}")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers[SEARCH_STRATEGY_HEADER] == expected_strategy.value
+
+        metrics = test_client.get("/internal_api/metrics").text
+        assert (
+            f'book_search_strategy_total{{strategy="{expected_strategy.value}"}}'
+            in metrics
+        )
+
+    async def test_too_short_search_rejected(self, test_client: TestClient) -> None:
+        response = test_client.get("/internal_api/book?search=a")
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    async def test_index_walk_plan_ordered_by_primary_key(
+        self, async_db_session: AsyncSession, sorted_books: list[Book]
+    ) -> None:
+        plan = await capture_explain(
+            build_book_list_query(limit=20, cursor_id=sorted_books[5].id, search="co"),
+            async_db_session,
+        )
+        assert plan
+        assert not any("TEMP B-TREE" in line for line in plan)
+
+    async def test_list_statement_cached_per_shape(
+        self, async_db_session: AsyncSession, sorted_books: list[Book]
+    ) -> None:
+        first, first_params = prepare_book_list_query(
+            limit=2, cursor_id=sorted_books[0].id, search=None, dialect_name="sqlite"
+        )
+        second, second_params = prepare_book_list_query(
+            limit=2, cursor_id=sorted_books[2].id, search=None, dialect_name="sqlite"
+        )
+        searched, _ = prepare_book_list_query(
+            limit=2, cursor_id=sorted_books[2].id, search="co", dialect_name="sqlite"
+        )
+
+        assert first is second
+        assert searched is not first
+        rows = (await async_db_session.execute(second, second_params)).all()
+        assert [row.id for row in rows] == [book.id for book in sorted_books[3:6]]
+
+
+def paged_ids(test_client: TestClient, query: str) -> list[list[int]]:
+    """
+    Ids of every page of a list, following the next cursors.
+    """
+    pages: list[list[int]] = []
+    seen_cursors: set[str] = set()
+    params = ""
+    while True:
+        assert len(pages) <= SORTED_BOOKS_COUNT, "pagination does not terminate"
+        response = test_client.get(f"/internal_api/book?{query}{params}")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers[SEARCH_STRATEGY_HEADER] == SearchStrategy.BITMAP.value
+        page = response.json()
+        pages.append([book["id"] for book in page["results"]])
+        if page["nextCursor"] is None:
+            return pages
+        token = page["nextCursor"]["token"]
+        assert token not in seen_cursors
+        seen_cursors.add(token)
+        params = f"&cursor={token}"
+
+
+class TestBookListPartitions:
+    async def test_page_ranges(self) -> None:
+        partitions = BookPartitions()
+        partitions.ranges = [(0, 10), (10, 20), (20, 30)]
+
+        assert partitions.page_ranges(cursor_id=None, descending=True) == [
+            (20, 30),
+            (10, 20),
+            (0, 10),
+        ]
+        assert partitions.page_ranges(cursor_id=10, descending=True) == [(0, 10)]
+        assert partitions.page_ranges(cursor_id=19, descending=False) == [(20, 30)]
+        assert partitions.page_ranges(cursor_id=18, descending=False) == [
+            (10, 20),
+            (20, 30),
+        ]
+
+    async def test_search_fans_out_newest_first(
+        self, async_db_session: AsyncSession, test_client: TestClient
+    ) -> None:
+        books = await bulk_create_books(
+            async_db_session=async_db_session,
+            update_field_list=[
+                BookTESTBulkCreateUpdateField(
+                    title="rare-term" if index % 4 == 0 else f"common title {index}"
+                )
+                for index in range(SORTED_BOOKS_COUNT)
+            ],
+        )
+        query = "limit=2&search=rare-term"
+        expected = paged_ids(test_client, query)
+
+        ids = sorted(book.id for book in books)
+        partitions = BookPartitions()
+        partitions.ranges = [
+            (ids[start], ids[start] + 5) for start in range(0, len(ids), 5)
+        ]
+        app.dependency_overrides[get_book_partitions] = lambda: partitions
+        await book_list_cache.invalidate()
+        book_list_partitions_scanned.clear()
+
+        assert paged_ids(test_client, query) == expected
+        # matches 17 | 13 | 9 | 5, 1 by partition: the first page has its 3 rows
+        # after three of the four partitions, the second one starts at its cursor's
+        # and the last reads a single partition with the plain query
+        assert expected == [[17, 13], [9, 5], [1]]
+        assert book_list_partitions_scanned.count() == 2
+        metrics = test_client.get("/internal_api/metrics").text
+        assert "book_list_partitions_scanned_sum 6.0" in metrics
+
+
+class FakeSharedCacheBackend(CacheBackend):
+    """
+    Stands in for a shared store, entries survive `InMemoryCacheBackend` limits.
+    """
+
+    def __init__(self) -> None:
+        self.entries: dict[str, bytes] = {}
+        self.counters: dict[str, int] = {}
+
+    async def get(self, key: str) -> bytes | None:
+        return self.entries.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        self.entries[key] = value
+
+    async def get_counter(self, key: str) -> int:
+        return self.counters.get(key, 0)
+
+    async def incr(self, key: str) -> int:
+        self.counters[key] = self.counters.get(key, 0) + 1
+        return self.counters[key]
+
+    async def clear(self) -> None:
+        self.entries.clear()
+        self.counters.clear()
+
+
+class TestBookListCache:
+    async def test_hit_and_invalidation_on_create(
+        self, test_client: TestClient, sorted_books: list[Book]
+    ) -> None:
+        first = test_client.get("/internal_api/book?limit=5")
+        assert first.headers[CACHE_HEADER] == "MISS"
+
+        second = test_client.get("/internal_api/book?limit=5")
+        assert second.headers[CACHE_HEADER] == "HIT"
+        assert second.content == first.content
+
+        other_params = test_client.get("/internal_api/book?limit=6")
+        assert other_params.headers[CACHE_HEADER] == "MISS"
+
+        response = test_client.post(
+            "/internal_api/book/create", json=create_fake_book_data()
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+
+        third = test_client.get("/internal_api/book?limit=5")
+        assert third.headers[CACHE_HEADER] == "MISS"
+        assert third.json()["results"][0]["id"] == sorted_books[0].id + 1
+
+        metrics = test_client.get("/internal_api/metrics").text
+        assert 'cache_requests_total{cache="book_list",result="hit"}' in metrics
+
+    async def test_shared_backend(
+        self, test_client: TestClient, sorted_books: list[Book]
+    ) -> None:
+        backend = FakeSharedCacheBackend()
+        original_backend = book_list_cache.backend
+        book_list_cache.backend = backend
+        try:
+            test_client.get("/internal_api/book")
+            assert len(backend.entries) == 1
+
+            response = test_client.get("/internal_api/book")
+            assert response.headers[CACHE_HEADER] == "HIT"
+
+            await book_list_cache.invalidate()
+            response = test_client.get("/internal_api/book")
+            assert response.headers[CACHE_HEADER] == "MISS"
+            assert len(backend.entries) == 2
+        finally:
+            book_list_cache.backend = original_backend
+
+    async def test_in_memory_backend_evicts_and_expires(self) -> None:
+        backend = InMemoryCacheBackend(name="test", maxsize=2, ttl=60)
+        evictions = cache_evictions_total.value(cache="test")
+
+        for key in ("a", "b", "c"):
+            await backend.set(key, key.encode())
+        assert await backend.get("a") is None
+        assert await backend.get("c") == b"c"
+        assert cache_evictions_total.value(cache="test") == evictions + 1
+
+        await backend.set("expired", b"x", ttl=-1)
+        assert await backend.get("expired") is None
+
+
+async def wait_until(condition: Callable[[], bool]) -> None:
+    async def poll() -> None:
+        while not condition():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(poll(), timeout=10)
+
+
+class TestBookListCoalescing:
+    async def test_identical_requests_share_one_query(
+        self,
+        monkeypatch: pytest.MonkeyPatch,
+        test_client: TestClient,
+        sorted_books: list[Book],
+    ) -> None:
+        released = asyncio.Event()
+        executed: list[int] = []
+        cache_lookups: list[str] = []
+        get_book_list = service.get_book_list
+
+        async def held_get_book_list(**kwargs) -> bytes:
+            executed.append(kwargs["query_params"].limit)
+            await released.wait()
+            return await get_book_list(**kwargs)
+
+        async def cache_miss(key: str) -> None:
+            cache_lookups.append(key)
+
+        monkeypatch.setattr(service, "get_book_list", held_get_book_list)
+        monkeypatch.setattr(book_list_cache, "get", cache_miss)
+        shared = singleflight_requests_total.value(flight="book_list", role="shared")
+        paths = ["/internal_api/book?limit=5"] * 4 + ["/internal_api/book?limit=6"]
+
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            requests = [asyncio.create_task(client.get(path)) for path in paths]
+            # past the cache lookup every request has joined or started a flight
+            await wait_until(lambda: len(cache_lookups) == len(paths))
+            released.set()
+            responses = await asyncio.wait_for(asyncio.gather(*requests), timeout=10)
+
+        assert sorted(executed) == [5, 6]
+        assert [response.status_code for response in responses] == [200] * 5
+        assert len({response.content for response in responses[:4]}) == 1
+        assert [len(response.json()["results"]) for response in responses] == [
+            5
+        ] * 4 + [6]
+        assert singleflight_requests_total.value(flight="book_list", role="shared") == (
+            shared + 3
+        )
+        assert len(book_list_flights) == 0
+
+    async def test_error_reaches_every_waiter_and_is_not_kept(self) -> None:
+        flights: SingleFlight[str, int] = SingleFlight(name="test")
+        released = asyncio.Event()
+        calls = 0
+
+        async def failing() -> int:
+            nonlocal calls
+            calls += 1
+            await released.wait()
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        tasks = [asyncio.create_task(flights.do("key", failing)) for _ in range(3)]
+        await asyncio.sleep(0)
+        released.set()
+        results = await asyncio.wait_for(
+            asyncio.gather(*tasks, return_exceptions=True), timeout=10
+        )
+        assert calls == 1
+        assert all(isinstance(result, HTTPException) for result in results)
+
+        async def succeeding() -> int:
+            return 1
+
+        assert await flights.do("key", succeeding) == 1
+        assert len(flights) == 0
+
+    async def test_cancelled_leader_hands_over_to_a_waiter(self) -> None:
+        flights: SingleFlight[str, str] = SingleFlight(name="test")
+        released = asyncio.Event()
+
+        async def compute(name: str) -> str:
+            await released.wait()
+            return name
+
+        leader = asyncio.create_task(flights.do("key", lambda: compute("leader")))
+        await asyncio.sleep(0)
+        waiters = [
+            asyncio.create_task(flights.do("key", lambda name=name: compute(name)))
+            for name in ("first", "second")
+        ]
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        # the first waiter retried as the new leader, the second one joined it
+        await asyncio.sleep(0)
+        assert len(flights) == 1
+        released.set()
+        results = await asyncio.wait_for(asyncio.gather(*waiters), timeout=10)
+        assert results == ["first", "first"]
+
+    async def test_cancelled_waiter_leaves_the_flight(self) -> None:
+        flights: SingleFlight[str, int] = SingleFlight(name="test")
+        released = asyncio.Event()
+
+        async def compute() -> int:
+            await released.wait()
+            return 1
+
+        leader = asyncio.create_task(flights.do("key", compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flights.do("key", compute))
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        released.set()
+        assert await asyncio.wait_for(leader, timeout=10) == 1
+
+
+class TestBookListETag:
+    async def test_conditional_get(
+        self,
+        async_db_session: AsyncSession,
+        test_client: TestClient,
+        sorted_books: list[Book],
+    ) -> None:
+        response = test_client.get("/internal_api/book?limit=5")
+        etag = response.headers["ETag"]
+        # weak when the client accepts a compressed representation
+        opaque = etag.removeprefix("W/")
+
+        for if_none_match in (opaque, f"W/{opaque}", f'"other", {opaque}', "*"):
+            response = test_client.get(
+                "/internal_api/book?limit=5",
+                headers={"If-None-Match": if_none_match},
+            )
+            assert response.status_code == status.HTTP_304_NOT_MODIFIED
+            assert response.headers["ETag"] == etag
+            assert response.content == b""
+
+        # another worker's cache version must not change the tag of the same page
+        await book_list_cache.invalidate()
+        response = test_client.get("/internal_api/book?limit=5")
+        assert response.headers["ETag"] == etag
+
+        response = test_client.get(
+            "/internal_api/book?limit=6", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["ETag"] != etag
+
+        # a write made behind the cache's back still changes the watermark
+        async_db_session.add(Book(**create_fake_book_data()))
+        await async_db_session.commit()
+
+        response = test_client.get(
+            "/internal_api/book?limit=5", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["ETag"] != etag
+        assert response.json()["results"][0]["id"] == sorted_books[0].id + 1
+
+    async def test_etag_does_not_depend_on_cursor_secret(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        query_params = BookListQueryParams(limit=5)
+        etag = service.get_book_list_etag(query_params=query_params, watermark=7)
+
+        monkeypatch.setattr(service.config, "cursor_secret", SecretStr("other"))
+        assert (
+            service.get_book_list_etag(query_params=query_params, watermark=7) == etag
+        )
+        assert (
+            service.get_book_list_etag(query_params=query_params, watermark=8) != etag
+        )
+
+    @pytest.mark.parametrize(
+        ("debug", "web_concurrency"), [(False, 1), (True, 2), (False, 4)]
+    )
+    async def test_several_workers_require_cursor_secret(
+        self, debug: bool, web_concurrency: int
+    ) -> None:
+        with pytest.raises(ValidationError, match="CURSOR_SECRET"):
+            Config(debug=debug, web_concurrency=web_concurrency, cursor_secret=None)
+
+        config = Config(debug=True, web_concurrency=1, cursor_secret=None)
+        assert config.cursor_secret is not None
+        config = Config(
+            debug=debug, web_concurrency=web_concurrency, cursor_secret="shared"
+        )
+        assert config.cursor_secret.get_secret_value() == "shared"
+
+    async def test_conditional_get_by_isbn(
+        self, test_client: TestClient, sorted_books: list[Book]
+    ) -> None:
+        url = f"/internal_api/book/isbn/{sorted_books[0].isbn}"
+        response = test_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+
+        response = test_client.get(
+            url, headers={"If-None-Match": response.headers["ETag"]}
+        )
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
 
 class TestCreateBook:
     @pytest.mark.parametrize(
@@ -247,6 +1001,9 @@ class TestCreateBook:
             },
         )
         assert response.status_code == status.HTTP_201_CREATED
+        book_id = response.json()["id"]
+        response = test_client.get(f"/internal_api/book/isbn/{isbn}")
+        assert response.json()["id"] == book_id
 
     @pytest.mark.parametrize(
         "field,value",
@@ -266,3 +1023,1080 @@ class TestCreateBook:
             "/internal_api/book/create", json={**create_fake_book_data(), field: value}
         )
         assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    async def test_create_book_duplicate_isbn(self, test_client: TestClient) -> None:
+        response = test_client.post(
+            "/internal_api/book/create",
+            json={**create_fake_book_data(), "isbn": "978-8375780635"},
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+
+        # same book given as ISBN-10
+        response = test_client.post(
+            "/internal_api/book/create",
+            json={**create_fake_book_data(), "isbn": "8375780634"},
+        )
+        assert response.status_code == status.HTTP_409_CONFLICT
+
+    async def test_create_book_duplicate_isbn_race(
+        self, test_client: TestClient, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        response = test_client.post(
+            "/internal_api/book/create",
+            json={**create_fake_book_data(), "isbn": "978-8375780635"},
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+
+        # a concurrent request that passed the existence check before the first commit
+        monkeypatch.setattr(
+            service,
+            "build_existing_isbn13_query",
+            lambda isbn13_list: select(Book.isbn13).where(false()),
+        )
+        response = test_client.post(
+            "/internal_api/book/create",
+            json={**create_fake_book_data(), "isbn": "8375780634"},
+        )
+        assert response.status_code == status.HTTP_409_CONFLICT
+
+
+def create_queue(max_batch_size: int = 10) -> BookCreateQueue:
+    return BookCreateQueue(
+        session_factory=TestAsyncSessionLocal,
+        max_batch_size=max_batch_size,
+        max_delay=0.05,
+    )
+
+
+async def create_concurrently(
+    queue: BookCreateQueue, books: list[dict]
+) -> list[int | HTTPException]:
+    # bounded, a stuck worker fails the test instead of hanging it
+    results = await asyncio.wait_for(
+        asyncio.gather(
+            *(queue.create(BookCreateRequest(**book)) for book in books),
+            return_exceptions=True,
+        ),
+        timeout=10,
+    )
+    return [
+        result if isinstance(result, HTTPException) else result.id for result in results
+    ]
+
+
+class TestCreateBookWriteBehind:
+    async def test_concurrent_creates_commit_in_one_batch(
+        self, async_db_session: AsyncSession
+    ) -> None:
+        queue = create_queue()
+        batches = book_create_batch_size.count()
+        books = [create_fake_book_data() for _ in range(4)]
+        # repeats the first ISBN within the same batch
+        books.append({**create_fake_book_data(), "isbn": books[0]["isbn"]})
+
+        results = await create_concurrently(queue, books)
+        await queue.close()
+
+        ids = results[:4]
+        assert len(set(ids)) == 4
+        assert results[4].status_code == status.HTTP_409_CONFLICT
+        assert book_create_batch_size.count() == batches + 1
+        stored = await async_db_session.execute(select(Book.id, Book.title))
+        assert sorted(stored) == sorted(zip(ids, (book["title"] for book in books[:4])))
+
+    async def test_batch_size_is_capped(self, async_db_session: AsyncSession) -> None:
+        queue = create_queue(max_batch_size=2)
+        batches = book_create_batch_size.count()
+
+        results = await create_concurrently(
+            queue, [create_fake_book_data() for _ in range(5)]
+        )
+        await queue.close()
+
+        assert len(set(results)) == 5
+        assert book_create_batch_size.count() == batches + 3
+
+    async def test_unique_violation_retries_rows(
+        self, async_db_session: AsyncSession, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        (book,) = await bulk_create_books(
+            async_db_session=async_db_session, book_count=1
+        )
+        # a concurrent create on another worker that passed the existence check
+        monkeypatch.setattr(
+            write_behind,
+            "build_existing_isbn13_query",
+            lambda isbn13_list: select(Book.isbn13).where(false()),
+        )
+        queue = create_queue()
+
+        duplicate, created = await create_concurrently(
+            queue,
+            [{**create_fake_book_data(), "isbn": book.isbn}, create_fake_book_data()],
+        )
+        await queue.close()
+
+        assert duplicate.status_code == status.HTTP_409_CONFLICT
+        assert created == book.id + 1
+
+    async def test_create_endpoint(self, test_client: TestClient) -> None:
+        queue = create_queue()
+        app.dependency_overrides[get_book_create_queue] = lambda: queue
+        book_data = create_fake_book_data()
+
+        response = test_client.post("/internal_api/book/create", json=book_data)
+        assert response.status_code == status.HTTP_201_CREATED
+        book_id = response.json()["id"]
+        response = test_client.post("/internal_api/book/create", json=book_data)
+        assert response.status_code == status.HTTP_409_CONFLICT
+        # the worker runs in the event loop of the test client
+        test_client.portal.call(queue.close)
+
+        response = test_client.get(f"/internal_api/book/isbn/{book_data['isbn']}")
+        assert response.json()["id"] == book_id
+        assert (
+            "book_create_batch_size_count"
+            in test_client.get("/internal_api/metrics").text
+        )
+
+
+SUGGEST_TITLES = [
+    "The Hobbit",
+    "The Hobbit",
+    "the  hobbit",
+    "The Road",
+    "Theory of Everything",
+    "Dune",
+]
+
+
+@pytest_asyncio.fixture
+async def book_suggestions(async_db_session: AsyncSession) -> BookSuggestions:
+    await bulk_create_books(
+        async_db_session=async_db_session,
+        book_count=len(SUGGEST_TITLES),
+        update_field_list=[
+            BookTESTBulkCreateUpdateField(
+                title=title,
+                author="Frank Herbert" if title == "Dune" else "J. R. R. Tolkien",
+            )
+            for title in SUGGEST_TITLES
+        ],
+    )
+    suggestions = BookSuggestions(max_entries=100)
+    await suggestions.load(async_db=async_db_session)
+    app.dependency_overrides[get_book_suggestions] = lambda: suggestions
+    return suggestions
+
+
+def suggested(test_client: TestClient, q: str, **params: str) -> list[tuple[str, int]]:
+    response = test_client.get("/internal_api/book/suggest", params={"q": q, **params})
+    assert response.status_code == status.HTTP_200_OK
+    return [(result["text"], result["books"]) for result in response.json()["results"]]
+
+
+class TestBookSuggest:
+    async def test_completions_ranked_by_books(
+        self, test_client: TestClient, book_suggestions: BookSuggestions
+    ) -> None:
+        assert suggested(test_client, "the") == [
+            ("The Hobbit", 3),
+            ("The Road", 1),
+            ("Theory of Everything", 1),
+        ]
+        assert suggested(test_client, "THE ") == [("The Hobbit", 3), ("The Road", 1)]
+        assert suggested(test_client, "the  h") == [("The Hobbit", 3)]
+        assert suggested(test_client, "the", limit="1") == [("The Hobbit", 3)]
+        assert suggested(test_client, "x") == []
+        assert suggested(test_client, "j. r", field="author") == [
+            ("J. R. R. Tolkien", 5)
+        ]
+
+    async def test_create_updates_index(
+        self, test_client: TestClient, book_suggestions: BookSuggestions
+    ) -> None:
+        for _ in range(4):
+            response = test_client.post(
+                "/internal_api/book/create",
+                json={**create_fake_book_data(), "title": "The Road"},
+            )
+            assert response.status_code == status.HTTP_201_CREATED
+
+        assert suggested(test_client, "the r") == [("The Road", 5)]
+        assert suggested(test_client, "the")[0] == ("The Road", 5)
+
+    async def test_loading(self, test_client: TestClient) -> None:
+        app.dependency_overrides[get_book_suggestions] = lambda: BookSuggestions(
+            max_entries=100
+        )
+        response = test_client.get("/internal_api/book/suggest", params={"q": "the"})
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers["Retry-After"] == "5"
+
+    async def test_top_lists_match_a_scan(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        # precompute top lists for every prefix matching more than 3 values
+        monkeypatch.setattr(suggest, "SUGGEST_SCAN_LIMIT", 3)
+        rng = random.Random(0)
+        words = ["ab", "abc", "abd", "b", "ba", "bab", "c"]
+        values = [
+            (
+                "".join(rng.choice(words) for _ in range(rng.randint(1, 3))),
+                rng.randint(1, 9),
+            )
+            for _ in range(200)
+        ]
+        index = PrefixIndex.build(values, max_entries=1_000)
+        totals: Counter[str] = Counter()
+        for text, count in values:
+            totals[text] += count
+        for _ in range(300):
+            text = "".join(rng.choice(words) for _ in range(rng.randint(1, 3)))
+            index.add(text)
+            totals[text] += 1
+
+        for prefix in {text[:length] for text in totals for length in range(1, 4)}:
+            expected = sorted(
+                (count for text, count in totals.items() if text.startswith(prefix)),
+                reverse=True,
+            )[:5]
+            assert [
+                suggestion.books for suggestion in index.suggest(prefix, limit=5)
+            ] == expected
+
+    async def test_bounded_entries(self) -> None:
+        index = PrefixIndex.build(
+            [("Dune", 3), ("DUNE", 1), ("Emma", 2), ("Ulysses", 1)], max_entries=2
+        )
+        assert index_counts(index) == {"dune": 4, "emma": 2}
+        assert index.suggest("d", limit=5)[0].text == "Dune"
+        nbytes = index.nbytes
+
+        index.add("Ulysses")
+        index.add("emma")
+        assert index_counts(index) == {"dune": 4, "emma": 3}
+        assert index.nbytes == nbytes
+
+
+def index_counts(index: PrefixIndex) -> dict[str, int]:
+    return {
+        normalize_suggestion(suggestion.text): suggestion.books
+        for suggestion in index.suggest("", limit=10_000)
+    }
+
+
+class TestBookByIsbn:
+    @pytest.mark.parametrize(
+        "lookup_isbn",
+        [
+            pytest.param("9788375780635", id="ISBN-13"),
+            pytest.param("978-83-7578-063-5", id="ISBN-13-hyphenated"),
+            pytest.param("8375780634", id="ISBN-10"),
+        ],
+    )
+    async def test_get_book_by_isbn(
+        self, test_client: TestClient, sorted_books: list[Book], lookup_isbn: str
+    ) -> None:
+        response = test_client.post(
+            "/internal_api/book/create",
+            json={**create_fake_book_data(), "isbn": "83-7578-063-4"},
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+
+        response = test_client.get(f"/internal_api/book/isbn/{lookup_isbn}")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["isbn"] == "8375780634"
+
+    async def test_get_book_by_isbn_not_found(
+        self, test_client: TestClient, sorted_books: list[Book]
+    ) -> None:
+        response = test_client.get("/internal_api/book/isbn/9780471117094")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    async def test_get_book_by_isbn_invalid(self, test_client: TestClient) -> None:
+        response = test_client.get("/internal_api/book/isbn/invalid-isbn")
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+class TestBookById:
+    async def test_get_book(
+        self, test_client: TestClient, sorted_books: list[Book]
+    ) -> None:
+        book = sorted_books[3]
+        response = test_client.get(f"/internal_api/book/{book.id}")
+        assert response.status_code == status.HTTP_200_OK
+        assert (
+            response.content
+            == BookResponse.model_validate(book).model_dump_json(by_alias=True).encode()
+        )
+
+        response = test_client.get(
+            f"/internal_api/book/{book.id}",
+            headers={"If-None-Match": response.headers["ETag"]},
+        )
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        response = test_client.get(f"/internal_api/book/{sorted_books[0].id + 1}")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        response = test_client.get("/internal_api/book/0")
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    # body parsing must not warn about field metadata it ignores
+    @pytest.mark.filterwarnings("error::UserWarning")
+    async def test_batch_get_in_request_order_with_missing_ids(
+        self,
+        monkeypatch: pytest.MonkeyPatch,
+        test_client: TestClient,
+        sorted_books: list[Book],
+    ) -> None:
+        # several statements on SQLite
+        monkeypatch.setattr(service, "SQLITE_MAX_BOUND_IDS", 2)
+        unknown = sorted_books[0].id + 100
+        books = [sorted_books[4], sorted_books[0], sorted_books[2]]
+        ids = [books[0].id, unknown, books[1].id, books[0].id, books[2].id]
+
+        response = test_client.post("/internal_api/book/batch-get", json={"ids": ids})
+        assert response.status_code == status.HTTP_200_OK
+        assert (
+            response.content
+            == BookBatchGetResponse(
+                results=[BookResponse.model_validate(book) for book in books],
+                missing=[unknown],
+            )
+            .model_dump_json(by_alias=True)
+            .encode()
+        )
+
+    async def test_hot_ids_served_without_database(
+        self, test_client: TestClient, sorted_books: list[Book]
+    ) -> None:
+        ids = [book.id for book in sorted_books[:3]]
+        first = test_client.post("/internal_api/book/batch-get", json={"ids": ids})
+        assert first.status_code == status.HTTP_200_OK
+        hits = cache_requests_total.value(cache="book_row", result="hit")
+
+        def no_session() -> AsyncSession:
+            raise AssertionError("cached ids must not open a session")
+
+        app.dependency_overrides[get_read_sessionmaker] = lambda: no_session
+        second = test_client.post("/internal_api/book/batch-get", json={"ids": ids})
+        assert second.content == first.content
+        assert test_client.get(f"/internal_api/book/{ids[0]}").status_code == 200
+        assert cache_requests_total.value(cache="book_row", result="hit") == hits + 4
+
+    @pytest.mark.parametrize(
+        "ids",
+        [
+            pytest.param([], id="empty"),
+            pytest.param([0], id="not-positive"),
+            pytest.param([2**31], id="out-of-range"),
+            pytest.param(list(range(1, BOOK_BATCH_GET_MAX_IDS + 2)), id="too-many"),
+        ],
+    )
+    async def test_batch_get_invalid(
+        self, test_client: TestClient, ids: list[int]
+    ) -> None:
+        response = test_client.post("/internal_api/book/batch-get", json={"ids": ids})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+class TestBulkCreateBooks:
+    async def test_bulk_ndjson_reports_invalid_rows(
+        self, async_db_session: AsyncSession, test_client: TestClient
+    ) -> None:
+        rows = [
+            json.dumps(create_fake_book_data()),
+            json.dumps({**create_fake_book_data(), "isbn": "invalid-isbn"}),
+            "not-json",
+            "",
+            json.dumps({**create_fake_book_data(), "rating": 6}),
+            json.dumps(create_fake_book_data()),
+        ]
+        response = test_client.post(
+            "/internal_api/book/bulk",
+            content="\n".join(rows),
+            headers={"content-type": "application/x-ndjson"},
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+        response_json = response.json()
+        assert response_json["created"] == 2
+        assert response_json["failed"] == 3
+        assert response_json["errorsTruncated"] is False
+        assert [error["line"] for error in response_json["errors"]] == [2, 3, 5]
+        assert response_json["errors"][0]["errors"][0].startswith("isbn:")
+
+        count = (await async_db_session.execute(select(func.count(Book.id)))).scalar()
+        assert count == 2
+
+    async def test_bulk_reports_invalid_utf8_line(
+        self, async_db_session: AsyncSession, test_client: TestClient
+    ) -> None:
+        body = b"\n".join(
+            [
+                json.dumps(create_fake_book_data()).encode(),
+                b"\xff\xfe",
+                json.dumps({**create_fake_book_data(), "title": "Zażółć"}).encode(),
+            ]
+        )
+        response = test_client.post("/internal_api/book/bulk", content=body)
+        assert response.status_code == status.HTTP_200_OK
+
+        response_json = response.json()
+        assert response_json["created"] == 2
+        assert response_json["errors"] == [
+            {"line": 2, "errors": ["row: invalid UTF-8"]}
+        ]
+
+    async def test_bulk_concurrent_duplicate_rejects_only_its_row(
+        self,
+        monkeypatch: pytest.MonkeyPatch,
+        async_db_session: AsyncSession,
+        test_client: TestClient,
+    ) -> None:
+        stored = create_fake_book_data()
+        assert (
+            test_client.post("/internal_api/book/create", json=stored).status_code
+            == 201
+        )
+        # as if `stored` was inserted after the chunk's duplicate check
+        monkeypatch.setattr(
+            bulk,
+            "build_existing_isbn13_query",
+            lambda isbn13_list: select(Book.isbn13).where(false()),
+        )
+        valid = create_fake_book_data()
+        rows = [stored, valid, {**create_fake_book_data(), "isbn": valid["isbn"]}]
+        response = test_client.post(
+            "/internal_api/book/bulk",
+            content="\n".join(json.dumps(row) for row in rows),
+            headers={"content-type": "application/x-ndjson"},
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+        response_json = response.json()
+        assert response_json["created"] == 1
+        assert response_json["failed"] == 2
+        assert sorted(error["line"] for error in response_json["errors"]) == [1, 3]
+        assert all(
+            error["errors"] == ["isbn: Book with this ISBN already exists"]
+            for error in response_json["errors"]
+        )
+        count = (await async_db_session.execute(select(func.count(Book.id)))).scalar()
+        assert count == 2
+
+    async def test_bulk_failed_chunk_reports_each_row_once(
+        self, monkeypatch: pytest.MonkeyPatch, test_client: TestClient
+    ) -> None:
+        async def failing_insert(**kwargs) -> None:
+            raise OperationalError("INSERT", None, Exception("connection lost"))
+
+        monkeypatch.setattr(bulk, "insert_book_rows", failing_insert)
+        book = create_fake_book_data()
+        rows = [
+            book,
+            create_fake_book_data(),
+            {**create_fake_book_data(), "isbn": book["isbn"]},
+        ]
+        response = test_client.post(
+            "/internal_api/book/bulk",
+            content="\n".join(json.dumps(row) for row in rows),
+            headers={"content-type": "application/x-ndjson"},
+        )
+
+        response_json = response.json()
+        assert response_json["created"] == 0
+        assert response_json["failed"] == 3
+        assert [error["line"] for error in response_json["errors"]] == [3, 1, 2]
+        assert response_json["errors"][0]["errors"][0].startswith("isbn:")
+        assert response_json["errors"][1]["errors"] == [
+            "row: failed to insert chunk (OperationalError)"
+        ]
+
+    async def test_bulk_csv(
+        self, async_db_session: AsyncSession, test_client: TestClient
+    ) -> None:
+        lines = ["title,author,isbn,pages,rating"]
+        for _ in range(3):
+            book_data = create_fake_book_data()
+            lines.append(
+                f'"{book_data["title"]}",{book_data["author"]},{book_data["isbn"]},{book_data["pages"]},{book_data["rating"]}'
+            )
+        lines.append("only,two")
+
+        response = test_client.post(
+            "/internal_api/book/bulk",
+            content="\r\n".join(lines),
+            headers={"content-type": "text/csv"},
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+        response_json = response.json()
+        assert response_json["created"] == 3
+        assert response_json["failed"] == 1
+        assert response_json["errors"][0]["line"] == 5
+
+    async def test_bulk_commits_in_chunks(self, async_db_session: AsyncSession) -> None:
+        async def lines() -> AsyncIterator[str]:
+            for _ in range(5):
+                yield json.dumps(create_fake_book_data())
+
+        result = await ingest_books(
+            lines=lines(),
+            file_format=BookBulkFormat.NDJSON,
+            async_db=async_db_session,
+            chunk_size=2,
+        )
+        assert result.created == 5
+        assert result.failed == 0
+
+        count = (await async_db_session.execute(select(func.count(Book.id)))).scalar()
+        assert count == 5
+
+    async def test_bulk_reports_duplicate_isbn(
+        self, async_db_session: AsyncSession, test_client: TestClient
+    ) -> None:
+        await bulk_create_books(async_db_session=async_db_session, book_count=1)
+        stored = (await async_db_session.execute(select(Book.isbn))).scalar()
+
+        rows = [
+            json.dumps({**create_fake_book_data(), "isbn": stored}),
+            json.dumps({**create_fake_book_data(), "isbn": "8375780634"}),
+            json.dumps({**create_fake_book_data(), "isbn": "978-8375780635"}),
+        ]
+        response = test_client.post("/internal_api/book/bulk", content="\n".join(rows))
+        assert response.status_code == status.HTTP_200_OK
+
+        response_json = response.json()
+        assert response_json["created"] == 1
+        assert [error["line"] for error in response_json["errors"]] == [1, 3]
+
+
+class TestBookExport:
+    async def test_export_ndjson(
+        self, test_client: TestClient, sorted_books: list[Book]
+    ) -> None:
+        response = test_client.get("/internal_api/book/export")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"] == "application/x-ndjson"
+
+        lines = response.content.splitlines()
+        assert lines == [
+            BookResponse(**book.__dict__).model_dump_json(by_alias=True).encode()
+            for book in reversed(sorted_books)
+        ]
+
+    async def test_export_csv(
+        self, test_client: TestClient, sorted_books: list[Book]
+    ) -> None:
+        response = test_client.get("/internal_api/book/export?format=csv")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/csv")
+
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert [int(row["id"]) for row in rows] == [
+            book.id for book in reversed(sorted_books)
+        ]
+        assert rows[0]["createdAt"] == sorted_books[-1].created_at.isoformat()
+
+    async def test_export_resumes_after_id(
+        self, test_client: TestClient, sorted_books: list[Book]
+    ) -> None:
+        after_id = sorted_books[5].id
+        response = test_client.get(f"/internal_api/book/export?afterId={after_id}")
+        assert response.status_code == status.HTTP_200_OK
+
+        ids = [json.loads(line)["id"] for line in response.content.splitlines()]
+        assert ids == [book.id for book in reversed(sorted_books[:5])]
+
+    async def test_export_with_search(
+        self, async_db_session: AsyncSession, test_client: TestClient
+    ) -> None:
+        await bulk_create_books(
+            async_db_session=async_db_session,
+            book_count=3,
+            update_field_list=[
+                BookTESTBulkCreateUpdateField(title="Exported Title"),
+                BookTESTBulkCreateUpdateField(title="Something Else"),
+                BookTESTBulkCreateUpdateField(title="Another exported one"),
+            ],
+        )
+        response = test_client.get("/internal_api/book/export?search=exported")
+        assert response.status_code == status.HTTP_200_OK
+
+        titles = [json.loads(line)["title"] for line in response.content.splitlines()]
+        assert titles == ["Exported Title", "Another exported one"]
+
+    async def test_export_rejects_fulltext(self, test_client: TestClient) -> None:
+        response = test_client.get(
+            "/internal_api/book/export?search=title&searchMode=fulltext"
+        )
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    async def test_export_stops_fetching_when_closed(
+        self, async_db_session: AsyncSession, sorted_books: list[Book]
+    ) -> None:
+        sessions: list[AsyncSession] = []
+
+        def session_factory() -> AsyncSession:
+            session = TestAsyncSessionLocal()
+            sessions.append(session)
+            return session
+
+        chunks = stream_books_export(
+            query_params=BookExportQueryParams(),
+            file_format=BookBulkFormat.NDJSON,
+            session_factory=session_factory,  # type: ignore
+            fetch_size=2,
+        )
+        first = await anext(chunks)
+        assert len(first.splitlines()) == 2
+        assert sessions[0].in_transaction()
+
+        # what a client disconnect does to the response body iterator
+        await chunks.aclose()
+        assert not sessions[0].in_transaction()
+
+
+class TestBookListAggregates:
+    async def test_count_and_facets(
+        self, test_client: TestClient, sorted_books: list[Book]
+    ) -> None:
+        response = test_client.get("/internal_api/book?limit=2&include=count,facets")
+        assert response.status_code == status.HTTP_200_OK
+
+        response_json = response.json()
+        assert len(response_json["results"]) == 2
+        assert response_json["count"] == {"value": len(sorted_books), "exact": True}
+
+        facets = response_json["facets"]
+        assert facets["exact"] is True
+        ratings = Counter(book.rating for book in sorted_books)
+        assert facets["rating"] == [
+            {"bucket": rating, "count": ratings[rating]} for rating in sorted(ratings)
+        ]
+        assert sum(bucket["count"] for bucket in facets["pages"]) == len(sorted_books)
+        assert all(bucket["bucket"] % 100 == 0 for bucket in facets["pages"])
+
+    async def test_search_count_is_estimated_unless_exact(
+        self, async_db_session: AsyncSession, test_client: TestClient
+    ) -> None:
+        books = await bulk_create_books(
+            async_db_session=async_db_session,
+            book_count=3,
+            update_field_list=[
+                BookTESTBulkCreateUpdateField(title="Counted one"),
+                BookTESTBulkCreateUpdateField(title="Counted two"),
+                BookTESTBulkCreateUpdateField(title="Something Else"),
+            ],
+        )
+        ratings = Counter(book.rating for book in books if "Counted" in book.title)
+        url = "/internal_api/book?limit=1&search=counted&include=count,facets"
+
+        response_json = test_client.get(url).json()
+        assert response_json["count"] == {"value": 2, "exact": False}
+        assert response_json["facets"]["exact"] is False
+        assert response_json["facets"]["rating"] == [
+            {"bucket": rating, "count": ratings[rating]} for rating in sorted(ratings)
+        ]
+
+        response_json = test_client.get(f"{url}&exactCount=true").json()
+        assert response_json["count"] == {"value": 2, "exact": True}
+
+    async def test_not_included_by_default(self, test_client: TestClient) -> None:
+        response_json = test_client.get("/internal_api/book").json()
+        assert response_json["count"] is None
+        assert response_json["facets"] is None
+
+    async def test_invalid_include(self, test_client: TestClient) -> None:
+        response = test_client.get("/internal_api/book?include=count,unknown")
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+class TestRequestTimings:
+    async def test_server_timing_stages(
+        self, test_client: TestClient, sorted_books: list[Book]
+    ) -> None:
+        response = test_client.get("/internal_api/book?limit=5")
+        assert response.status_code == status.HTTP_200_OK
+
+        stages = {
+            metric.split(";")[0]: metric
+            for metric in response.headers[SERVER_TIMING_HEADER].split(", ")
+        }
+        assert {"db", "hydrate", "serialize", "queries", "total"} <= stages.keys()
+        assert stages["db"].startswith("db;dur=")
+
+    async def test_request_histograms(
+        self, test_client: TestClient, sorted_books: list[Book]
+    ) -> None:
+        test_client.get("/internal_api/book?limit=5")
+
+        metrics = test_client.get("/internal_api/metrics").text
+        assert (
+            'http_request_duration_seconds_bucket{method="GET",route="/internal_api/book",status="200",le="+Inf"}'
+            in metrics
+        )
+        assert (
+            'http_request_stage_duration_seconds_count{route="/internal_api/book",stage="serialize"}'
+            in metrics
+        )
+
+    async def test_slow_request_plan_captured(
+        self,
+        monkeypatch: pytest.MonkeyPatch,
+        test_client: TestClient,
+        sorted_books: list[Book],
+    ) -> None:
+        slow_request_log.clear()
+        monkeypatch.setattr(slow_request_log, "threshold", 0)
+        monkeypatch.setattr(slow_request_log, "sample_rate", 1)
+
+        test_client.get("/internal_api/book?limit=5&search=a title")
+
+        response = test_client.get("/internal_api/metrics/slow_requests")
+        assert response.status_code == status.HTTP_200_OK
+        entry = response.json()[0]
+        assert entry["path"] == "/internal_api/book"
+        assert "books" in entry["statement"]
+        assert entry["plan"]
+        assert "db" in entry["stagesMs"]
+
+
+class TestAdmissionControl:
+    async def test_token_bucket(self) -> None:
+        now = [0.0]
+        backend = InMemoryRateLimitBackend(maxsize=10, clock=lambda: now[0])
+
+        taken = [await backend.take("a", rate=2, burst=3) for _ in range(4)]
+        assert taken[:3] == [0, 0, 0]
+        assert taken[3] == pytest.approx(0.5)
+        # other clients have their own bucket
+        assert await backend.take("b", rate=2, burst=3) == 0
+
+        now[0] = 0.5
+        assert await backend.take("a", rate=2, burst=3) == 0
+        assert await backend.take("a", rate=2, burst=3) > 0
+
+    async def test_rate_limited_with_retry_after(
+        self, monkeypatch: pytest.MonkeyPatch, test_client: TestClient
+    ) -> None:
+        monkeypatch.setattr(book_rate_limiter, "rate", 0.1)
+        monkeypatch.setattr(book_rate_limiter, "burst", 2)
+        monkeypatch.setattr(
+            book_rate_limiter, "backend", InMemoryRateLimitBackend(maxsize=10)
+        )
+
+        statuses = [test_client.get("/internal_api/book").status_code for _ in range(3)]
+        assert statuses == [200, 200, 429]
+        response = test_client.get("/internal_api/book")
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert 1 <= int(response.headers["Retry-After"]) <= 10
+
+        metrics = test_client.get("/internal_api/metrics")
+        assert metrics.status_code == status.HTTP_200_OK
+        assert 'admission_requests_total{limiter="rate",result="rejected"}' in (
+            metrics.text
+        )
+
+    async def test_expensive_requests_rejected_when_saturated(
+        self, monkeypatch: pytest.MonkeyPatch, test_client: TestClient
+    ) -> None:
+        monkeypatch.setattr(expensive_book_requests, "limit", 0)
+        monkeypatch.setattr(expensive_book_requests, "max_queue", 0)
+
+        for path in (
+            "/internal_api/book?search=tolkien",
+            "/internal_api/book?limit=500",
+            "/internal_api/book?exactCount=true",
+            "/internal_api/book/export",
+        ):
+            response = test_client.get(path)
+            assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE, path
+            assert response.headers["Retry-After"]
+        # cheap requests are not affected
+        assert test_client.get("/internal_api/book?limit=20").status_code == 200
+        assert test_client.get("/internal_api/author/top").status_code == 200
+
+    async def test_concurrency_limiter_queue(self) -> None:
+        limiter = ConcurrencyLimiter(name="test", limit=1, max_queue=2, timeout=5)
+        await limiter.acquire()
+
+        queued = asyncio.create_task(limiter.acquire())
+        cancelled = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        # the queue is full
+        with pytest.raises(AdmissionRejected) as rejected:
+            await limiter.acquire()
+        assert rejected.value.status_code == 503
+
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        # handed over to the first waiter, the cancelled one is skipped
+        limiter.release()
+        await asyncio.wait_for(queued, 1)
+        assert limiter.in_flight == 1
+        limiter.release()
+        assert limiter.in_flight == 0
+
+    async def test_concurrency_limiter_timeout(self) -> None:
+        limiter = ConcurrencyLimiter(name="test", limit=1, max_queue=1, timeout=0.01)
+        async with limiter.slot():
+            with pytest.raises(AdmissionRejected):
+                await asyncio.wait_for(limiter.acquire(), 1)
+            assert admission_requests_total.value(limiter="test", result="timed_out")
+        assert limiter.in_flight == 0
+        async with limiter.slot():
+            assert limiter.in_flight == 1
+
+
+async def chunked_app(scope: Scope, receive: Receive, send: Send) -> None:
+    await StreamingResponse(
+        (line.encode() for line in ("first\n", "second\n")),
+        media_type="application/x-ndjson",
+    )(scope, receive, send)
+
+
+class TestResponseCompression:
+    @pytest.mark.parametrize(
+        "accept_encoding, expected",
+        [
+            pytest.param("gzip, deflate", "gzip", id="gzip"),
+            pytest.param("gzip;q=0.5, br", "br", id="higher-q"),
+            pytest.param("br, gzip, zstd", "zstd", id="server-order"),
+            pytest.param("*", "zstd", id="any"),
+            pytest.param("*;q=0.5, zstd;q=0", "br", id="refused"),
+            pytest.param("identity", None, id="identity"),
+            pytest.param("", None, id="none"),
+        ],
+    )
+    async def test_negotiation(
+        self, accept_encoding: str, expected: str | None
+    ) -> None:
+        codecs = [ZstdCodec(level=3), BrotliCodec(level=4), GzipCodec(level=5)]
+        codec = choose_codec(accept_encoding, codecs)
+        assert (codec and codec.encoding) == expected
+
+    async def test_list_page_compressed(
+        self, test_client: TestClient, sorted_books: list[Book]
+    ) -> None:
+        path = f"/internal_api/book?limit={SORTED_BOOKS_COUNT}"
+        identity = test_client.get(path, headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in identity.headers
+        assert identity.headers["Vary"] == "Accept-Encoding"
+
+        # decoded by the client
+        response = test_client.get(path, headers={"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert int(response.headers["Content-Length"]) < len(identity.content)
+        assert response.content == identity.content
+        etag = response.headers["ETag"]
+        assert etag == f"W/{identity.headers['ETag']}"
+        response = test_client.get(
+            path, headers={"Accept-Encoding": "gzip", "If-None-Match": etag}
+        )
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.headers["ETag"] == etag
+
+        # below the minimum size, tagged like its 304
+        path = f"/internal_api/book/{sorted_books[0].id}"
+        response = test_client.get(path, headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+        etag = response.headers["ETag"]
+        assert etag.startswith("W/")
+        response = test_client.get(
+            path, headers={"Accept-Encoding": "gzip", "If-None-Match": etag}
+        )
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.headers["ETag"] == etag
+
+    async def test_export_compressed_as_streamed(
+        self, test_client: TestClient, sorted_books: list[Book]
+    ) -> None:
+        identity = test_client.get(
+            "/internal_api/book/export", headers={"Accept-Encoding": "identity"}
+        )
+        response = test_client.get(
+            "/internal_api/book/export", headers={"Accept-Encoding": "gzip"}
+        )
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        assert response.content == identity.content
+
+    @pytest.mark.parametrize("codec_name", ["gzip", "br", "zstd"])
+    async def test_chunks_flushed_and_offloaded(self, codec_name: str) -> None:
+        codecs = available_codecs(gzip_level=5, brotli_level=4, zstd_level=3)
+        codec = next((codec for codec in codecs if codec.encoding == codec_name), None)
+        if codec is None:
+            pytest.skip(f"{codec_name} is not installed")
+        # every chunk compressed in a worker thread
+        app = CompressionMiddleware(
+            chunked_app, codecs=[codec], minimum_size=1, offload_size=1
+        )
+        messages: list[Message] = []
+
+        requested = False
+
+        async def receive() -> Message:
+            nonlocal requested
+            if requested:
+                # the client stays connected until the response is complete
+                await asyncio.Event().wait()
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message: Message) -> None:
+            messages.append(message)
+
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/",
+            "headers": [(b"accept-encoding", codec_name.encode())],
+        }
+        await asyncio.wait_for(app(scope, receive, send), timeout=10)
+
+        headers = Headers(raw=messages[0]["headers"])
+        assert headers["Content-Encoding"] == codec_name
+        assert "content-length" not in headers
+        chunks = [message["body"] for message in messages[1:]]
+        assert len(chunks) == 3
+        decompressor = {
+            "gzip": lambda: zlib.decompressobj(31),
+            "br": lambda: brotli.Decompressor(),
+            "zstd": lambda: zstandard.ZstdDecompressor().decompressobj(),
+        }[codec_name]()
+        decompress = getattr(decompressor, "process", None) or decompressor.decompress
+        # each chunk is flushed, the client decodes it before the next one
+        assert decompress(chunks[0]) == b"first\n"
+        assert decompress(chunks[1]) == b"second\n"
+        assert decompress(chunks[2]) == b""
+
+
+class TestConnectionPoolMetrics:
+    async def test_pool_gauges(self) -> None:
+        engine = create_engine("sqlite://", poolclass=QueuePool, pool_size=2)
+        watch_pool(engine.pool, name="test", capacity=3)
+
+        with engine.connect():
+            assert db_pool_connections.value(engine="test", state="checked_out") == 1
+        assert db_pool_connections.value(engine="test", state="checked_out") == 0
+        assert db_pool_connections.value(engine="test", state="checked_in") == 1
+        assert db_pool_capacity.value(engine="test") == 3
+        engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def replica_engines(tmp_path) -> AsyncIterator[list[AsyncEngine]]:
+    """
+    Two SQLite files standing in for replicas, with one and two books.
+    """
+    engines = []
+    for index, titles in enumerate((["Replica zero"], ["Replica one", "Replica two"])):
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / f'replica{index}.db'}", poolclass=NullPool
+        )
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        async with AsyncSession(engine) as session:
+            session.add_all(
+                Book(**{**create_fake_book_data(), "title": title}) for title in titles
+            )
+            await session.commit()
+        engines.append(engine)
+    yield engines
+    for engine in engines:
+        await engine.dispose()
+
+
+def route_reads(
+    *replicas: AsyncEngine,
+    selection: ReplicaSelection = ReplicaSelection.ROUND_ROBIN,
+) -> ReplicaRouter:
+    router = ReplicaRouter(
+        primary=test_async_engine, replicas=replicas, selection=selection
+    )
+    del app.dependency_overrides[get_read_db]
+    del app.dependency_overrides[get_read_sessionmaker]
+    app.dependency_overrides[get_replica_router] = lambda: router
+    return router
+
+
+def listed_titles(test_client: TestClient) -> list[str]:
+    response = test_client.get("/internal_api/book")
+    assert response.status_code == status.HTTP_200_OK
+    return [book["title"] for book in response.json()["results"]]
+
+
+class TestReadReplicas:
+    async def test_round_robin(
+        self, test_client: TestClient, replica_engines: list[AsyncEngine]
+    ) -> None:
+        route_reads(*replica_engines)
+
+        assert [len(listed_titles(test_client)) for _ in range(4)] == [1, 2, 1, 2]
+
+        response = test_client.get("/internal_api/book/export")
+        assert [json.loads(line)["title"] for line in response.text.splitlines()] == [
+            "Replica zero"
+        ]
+
+    async def test_least_connections(
+        self, test_client: TestClient, replica_engines: list[AsyncEngine]
+    ) -> None:
+        router = route_reads(
+            *replica_engines, selection=ReplicaSelection.LEAST_CONNECTIONS
+        )
+
+        async with replica_engines[0].connect():
+            assert router.in_use[replica_engines[0]] == 1
+            assert listed_titles(test_client) == ["Replica two", "Replica one"]
+        assert router.in_use[replica_engines[0]] == 0
+        assert listed_titles(test_client) == ["Replica zero"]
+
+    async def test_unreachable_replica_falls_back_to_primary(
+        self,
+        test_client: TestClient,
+        async_db_session: AsyncSession,
+        replica_engines: list[AsyncEngine],
+        tmp_path,
+    ) -> None:
+        await bulk_create_books(
+            async_db_session=async_db_session,
+            book_count=1,
+            update_field_list=[BookTESTBulkCreateUpdateField(title="Primary")],
+        )
+        unreachable = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'missing' / 'replica.db'}",
+            poolclass=NullPool,
+        )
+        router = route_reads(unreachable, replica_engines[1])
+
+        assert listed_titles(test_client) == ["Primary"]
+        assert router.healthy_replicas() == [replica_engines[1]]
+        assert listed_titles(test_client) == ["Replica two", "Replica one"]
+
+        router.mark_unhealthy(replica_engines[1])
+        await router.check_health()
+        assert router.healthy_replicas() == [replica_engines[1]]
+        await unreachable.dispose()
+
+    async def test_reads_stick_to_primary_after_create(
+        self, test_client: TestClient, replica_engines: list[AsyncEngine]
+    ) -> None:
+        route_reads(replica_engines[1])
+        book_data = create_fake_book_data()
+
+        response = test_client.post("/internal_api/book/create", json=book_data)
+        assert response.status_code == status.HTTP_201_CREATED
+        assert READ_YOUR_WRITES_COOKIE in response.cookies
+        assert listed_titles(test_client) == [book_data["title"]]
+
+        test_client.cookies.clear()
+        assert listed_titles(test_client) == ["Replica two", "Replica one"]
+
+        # a deadline beyond the window is not trusted
+        test_client.cookies.set(READ_YOUR_WRITES_COOKIE, "99999999999")
+        assert listed_titles(test_client) == ["Replica two", "Replica one"]
@@ -0,0 +1,47 @@
+from starlette.datastructures import QueryParams
+from starlette.types import Scope
+
+from helpers.admission import (
+    ConcurrencyLimiter,
+    InMemoryRateLimitBackend,
+    RateLimiter,
+)
+from settings import get_config
+
+config = get_config()
+
+BOOK_LIST_PATH = "/internal_api/book"
+BOOK_EXPORT_PATH = "/internal_api/book/export"
+
+
+def is_expensive_book_request(scope: Scope) -> bool:
+    """
+    Requests holding a connection long or reading many rows: list pages with a
+    search, a `limit` of `expensive_list_limit` or more or an exact count, and
+    exports (a scan of the whole catalog).
+    """
+    path = scope["path"].rstrip("/")
+    if path == BOOK_EXPORT_PATH:
+        return True
+    if path != BOOK_LIST_PATH:
+        return False
+    params = QueryParams(scope.get("query_string", b""))
+    limit = params.get("limit", "")
+    return (
+        bool(params.get("search"))
+        or (limit.isdigit() and int(limit) >= config.expensive_list_limit)
+        or params.get("exactCount", "").lower() in ("true", "1")
+    )
+
+
+book_rate_limiter = RateLimiter(
+    backend=InMemoryRateLimitBackend(maxsize=config.rate_limit_max_clients),
+    rate=config.rate_limit_per_second,
+    burst=config.rate_limit_burst,
+)
+expensive_book_requests = ConcurrencyLimiter(
+    name="expensive",
+    limit=config.expensive_request_concurrency,
+    max_queue=config.expensive_request_max_queue,
+    timeout=config.expensive_request_queue_timeout,
+)
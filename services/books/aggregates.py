@@ -0,0 +1,218 @@
+import asyncio
+import datetime
+import logging
+from collections import defaultdict
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from schemas.books import BookCount, BookFacetBucket, BookFacets, BookListQueryParams
+from services.books.queries import (
+    BOOK_FACETS_VIEW,
+    build_book_count_query,
+    build_book_facets_query,
+    build_search_facets_sample_query,
+)
+from services.books.search_strategy import (
+    estimate_selectivity,
+    estimate_table_rows,
+    search_sample_percent,
+)
+from settings import get_config
+
+config = get_config()
+
+logger = logging.getLogger(__name__)
+
+# `pg_try_advisory_xact_lock` key serializing the refreshes of all workers
+BOOK_FACETS_REFRESH_LOCK = 7_311_005
+
+
+async def count_books_exact(
+    *, query_params: BookListQueryParams, async_db: AsyncSession
+) -> int | None:
+    """
+    `COUNT(*)` of the matches, None when it does not finish within `book_count_budget_ms`.
+
+    On PostgreSQL the count runs in a savepoint under a local `statement_timeout`,
+    a cancelled count rolls back only the savepoint (and the timeout with it).
+    """
+    dialect_name = async_db.bind.dialect.name
+    query = build_book_count_query(
+        search=query_params.search,
+        search_mode=query_params.search_mode,
+        dialect_name=dialect_name,
+    )
+    if dialect_name != "postgresql":
+        return (await async_db.execute(query)).scalar() or 0
+
+    previous = (await async_db.execute(text("SHOW statement_timeout"))).scalar()
+    try:
+        async with async_db.begin_nested():
+            await async_db.execute(
+                text("SELECT set_config('statement_timeout', :timeout, true)"),
+                {"timeout": f"{config.book_count_budget_ms}ms"},
+            )
+            count = (await async_db.execute(query)).scalar() or 0
+            await async_db.execute(
+                text("SELECT set_config('statement_timeout', :timeout, true)"),
+                {"timeout": previous},
+            )
+            return count
+    except DBAPIError as e:
+        if getattr(e.orig, "sqlstate", None) == "57014":  # query_canceled
+            return None
+        raise
+
+
+async def get_book_count(
+    *, query_params: BookListQueryParams, async_db: AsyncSession
+) -> BookCount:
+    """
+    Number of matches: exact when asked for (and within budget), otherwise the
+    table size estimate for unfiltered lists or the sampled selectivity times the
+    table size for searches.
+    """
+    if query_params.exact_count:
+        count = await count_books_exact(query_params=query_params, async_db=async_db)
+        if count is not None:
+            return BookCount(value=count, exact=True)
+
+    if not query_params.search:
+        rows, exact = await estimate_table_rows(async_db=async_db)
+        return BookCount(value=round(rows), exact=exact)
+
+    # fulltext searches are estimated with the substring filter
+    selectivity, total = await estimate_selectivity(
+        search=query_params.search,
+        search_mode=query_params.search_mode,
+        async_db=async_db,
+    )
+    return BookCount(value=round(selectivity * total), exact=False)
+
+
+async def get_book_facets(
+    *, query_params: BookListQueryParams, async_db: AsyncSession
+) -> BookFacets:
+    """
+    Rating histogram and page ranges.
+
+    Unfiltered lists read the catalog summary, searches scale the hit histogram
+    of the selectivity sample up to the estimated number of matches.
+    """
+    buckets: dict[str, list[BookFacetBucket]] = defaultdict(list)
+    if not query_params.search:
+        rows = (
+            await async_db.execute(
+                build_book_facets_query(dialect_name=async_db.bind.dialect.name)
+            )
+        ).all()
+        for row in rows:
+            buckets[row.facet].append(
+                BookFacetBucket(bucket=row.bucket, count=row.count)
+            )
+        return _book_facets(
+            buckets, exact=True, refreshed_at=rows[0].refreshed_at if rows else None
+        )
+
+    selectivity, total = await estimate_selectivity(
+        search=query_params.search,
+        search_mode=query_params.search_mode,
+        async_db=async_db,
+    )
+    table_rows, _ = await estimate_table_rows(async_db=async_db)
+    rows = (
+        await async_db.execute(
+            build_search_facets_sample_query(
+                search=query_params.search,
+                search_mode=query_params.search_mode,
+                sample_rows=config.search_sample_rows,
+                sample_percent=search_sample_percent(
+                    total=table_rows, async_db=async_db
+                ),
+            )
+        )
+    ).all()
+    hits: dict[str, int] = defaultdict(int)
+    for row in rows:
+        hits[row.facet] += row.count
+    matches = selectivity * total
+    for row in rows:
+        if row.count:
+            buckets[row.facet].append(
+                BookFacetBucket(
+                    bucket=row.bucket,
+                    count=round(row.count * matches / hits[row.facet]),
+                )
+            )
+    return _book_facets(buckets, exact=False, refreshed_at=None)
+
+
+def _book_facets(
+    buckets: dict[str, list[BookFacetBucket]],
+    *,
+    exact: bool,
+    refreshed_at: datetime.datetime | None,
+) -> BookFacets:
+    return BookFacets(
+        rating=sorted(buckets["rating"], key=lambda bucket: bucket.bucket),
+        pages=sorted(buckets["pages"], key=lambda bucket: bucket.bucket),
+        exact=exact,
+        refreshed_at=refreshed_at,
+    )
+
+
+async def refresh_book_facets(
+    *, async_db: AsyncSession, max_age: float | None = None
+) -> bool:
+    """
+    Recompute the catalog summary without blocking its readers (PostgreSQL only),
+    returns whether it did.
+
+    Every worker process runs the refresh task, a transaction level advisory lock
+    lets one of them refresh at a time and a summary younger than `max_age`
+    seconds (refreshed by another worker) is kept.
+    """
+    if async_db.bind.dialect.name != "postgresql":
+        return False
+    locked = (
+        await async_db.execute(
+            text("SELECT pg_try_advisory_xact_lock(:key)"),
+            {"key": BOOK_FACETS_REFRESH_LOCK},
+        )
+    ).scalar()
+    if locked and max_age is not None:
+        age = (
+            await async_db.execute(
+                text(
+                    f"SELECT extract(epoch FROM now() - max(refreshed_at)) FROM {BOOK_FACETS_VIEW}"
+                )
+            )
+        ).scalar()
+        locked = age is None or age >= max_age
+    if not locked:
+        await async_db.rollback()
+        return False
+    await async_db.execute(
+        text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {BOOK_FACETS_VIEW}")
+    )
+    await async_db.commit()
+    return True
+
+
+async def refresh_book_facets_periodically(
+    *, session_factory: async_sessionmaker[AsyncSession], interval: float
+) -> None:
+    """
+    Refresh the summary every `interval` seconds until cancelled, the migration
+    creating the view already populated it.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with session_factory() as async_db:
+                # another worker's refresh within the last half interval counts
+                await refresh_book_facets(async_db=async_db, max_age=interval / 2)
+        except SQLAlchemyError:
+            logger.exception("Failed to refresh %s", BOOK_FACETS_VIEW)
@@ -0,0 +1,256 @@
+import csv
+import datetime
+import json
+from collections.abc import AsyncIterator
+from typing import Any
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError, IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.model_books import Book
+from helpers.isbn import to_isbn13_digits
+from schemas.books import (
+    BookBulkCreateResponse,
+    BookBulkFormat,
+    BookBulkRowError,
+    BookCreateRequest,
+)
+from services.books.cache import book_list_cache
+from services.books.queries import build_existing_isbn13_query
+
+BULK_CHUNK_SIZE = 5_000
+BULK_MAX_REPORTED_ERRORS = 1_000
+
+BOOK_COPY_COLUMNS = (
+    "title",
+    "author",
+    "isbn",
+    "isbn13",
+    "pages",
+    "rating",
+    "created_at",
+)
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    Split a streamed request body into decoded lines without buffering the whole body.
+
+    Invalid UTF-8 bytes are kept as lone surrogates (`surrogateescape`) so the
+    affected line can be reported by `_iter_raw_rows` instead of failing the upload.
+    """
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r").decode("utf-8", "surrogateescape")
+    if pending:
+        yield pending.rstrip(b"\r").decode("utf-8", "surrogateescape")
+
+
+def _format_validation_errors(e: ValidationError) -> list[str]:
+    return [
+        f"{'.'.join(str(loc) for loc in error['loc']) or 'row'}: {error['msg']}"
+        for error in e.errors(include_url=False)
+    ]
+
+
+async def _iter_raw_rows(
+    lines: AsyncIterator[str], file_format: BookBulkFormat
+) -> AsyncIterator[tuple[int, dict[str, Any] | None, list[str]]]:
+    """
+    Yield `(line_number, raw_row, parse_errors)` for every non-empty data line.
+    """
+    header: list[str] | None = None
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            line.encode("utf-8")
+        except UnicodeEncodeError:
+            yield line_number, None, ["row: invalid UTF-8"]
+            continue
+
+        if file_format == BookBulkFormat.CSV:
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [value.strip() for value in values]
+                continue
+            if len(values) != len(header):
+                yield line_number, None, [
+                    f"row: expected {len(header)} columns, got {len(values)}"
+                ]
+                continue
+            yield line_number, dict(zip(header, values)), []
+            continue
+
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, None, [f"row: invalid JSON ({e.msg})"]
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, ["row: expected a JSON object"]
+            continue
+        yield line_number, row, []
+
+
+async def insert_book_rows(
+    *, rows: list[dict[str, Any]], async_db: AsyncSession
+) -> None:
+    """
+    Insert already validated rows in a single round trip.
+
+    PostgreSQL uses the binary COPY protocol (asyncpg `copy_records_to_table`),
+    other dialects (SQLite in tests) fall back to an executemany insert.
+    """
+    if async_db.bind.dialect.name == "postgresql":
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        connection = await async_db.connection()
+        raw_connection = await connection.get_raw_connection()
+        try:
+            await raw_connection.driver_connection.copy_records_to_table(
+                Book.__tablename__,
+                records=[
+                    (
+                        row["title"],
+                        row["author"],
+                        row["isbn"],
+                        row["isbn13"],
+                        row["pages"],
+                        row["rating"],
+                        now,
+                    )
+                    for row in rows
+                ],
+                columns=BOOK_COPY_COLUMNS,
+            )
+        except Exception as e:
+            # asyncpg errors raised by the raw driver bypass SQLAlchemy's wrapping,
+            # class 23 (unique violation...) maps to `IntegrityError` like it does
+            if getattr(e, "sqlstate", "").startswith("23"):
+                raise IntegrityError(statement="COPY books", params=None, orig=e) from e
+            raise DBAPIError(statement="COPY books", params=None, orig=e) from e
+    else:
+        await async_db.execute(insert(Book), rows)
+
+
+async def ingest_books(
+    *,
+    lines: AsyncIterator[str],
+    file_format: BookBulkFormat,
+    async_db: AsyncSession,
+    chunk_size: int = BULK_CHUNK_SIZE,
+) -> BookBulkCreateResponse:
+    """
+    Validate streamed rows with `BookCreateRequest` rules and insert them in chunks.
+
+    Every chunk is committed on its own, so invalid rows (or a failing chunk) are
+    reported without aborting the rest of the upload. ISBNs already stored (or
+    repeated within a chunk) are reported as duplicates. Memory stays bounded by
+    `chunk_size` and `BULK_MAX_REPORTED_ERRORS`.
+    """
+    created = 0
+    failed = 0
+    errors: list[BookBulkRowError] = []
+    chunk: list[dict[str, Any]] = []
+    chunk_lines: list[int] = []
+
+    def report(line_number: int, messages: list[str]) -> None:
+        nonlocal failed
+        failed += 1
+        if len(errors) < BULK_MAX_REPORTED_ERRORS:
+            errors.append(BookBulkRowError(line=line_number, errors=messages))
+
+    async def insert_one_by_one(attempted: list[tuple[int, dict[str, Any]]]) -> int:
+        inserted = 0
+        for line_number, row in attempted:
+            try:
+                await async_db.execute(insert(Book), row)
+                await async_db.commit()
+            except IntegrityError:
+                await async_db.rollback()
+                report(line_number, ["isbn: Book with this ISBN already exists"])
+            except SQLAlchemyError as e:
+                await async_db.rollback()
+                report(line_number, [f"row: failed to insert ({type(e).__name__})"])
+            else:
+                inserted += 1
+        return inserted
+
+    async def flush() -> None:
+        nonlocal created
+        if not chunk:
+            return
+        attempted = list(zip(chunk_lines, chunk))
+        inserted = 0
+        try:
+            existing = set(
+                (
+                    await async_db.execute(
+                        build_existing_isbn13_query(
+                            isbn13_list=[row["isbn13"] for row in chunk]
+                        )
+                    )
+                ).scalars()
+            )
+            unique = []
+            for line_number, row in attempted:
+                if row["isbn13"] in existing:
+                    report(line_number, ["isbn: Book with this ISBN already exists"])
+                    continue
+                existing.add(row["isbn13"])
+                unique.append((line_number, row))
+            attempted = unique
+
+            if attempted:
+                await insert_book_rows(
+                    rows=[row for _, row in attempted], async_db=async_db
+                )
+            await async_db.commit()
+            inserted = len(attempted)
+        except IntegrityError:
+            # an ISBN stored concurrently since the check, only its rows are rejected
+            await async_db.rollback()
+            inserted = await insert_one_by_one(attempted)
+        except SQLAlchemyError as e:
+            await async_db.rollback()
+            # rows rejected as duplicates above are already reported
+            for line_number, _ in attempted:
+                report(
+                    line_number, [f"row: failed to insert chunk ({type(e).__name__})"]
+                )
+        created += inserted
+        if inserted:
+            await book_list_cache.invalidate()
+        chunk.clear()
+        chunk_lines.clear()
+
+    async for line_number, raw_row, parse_errors in _iter_raw_rows(lines, file_format):
+        if parse_errors:
+            report(line_number, parse_errors)
+            continue
+        try:
+            book = BookCreateRequest.model_validate(raw_row)
+        except ValidationError as e:
+            report(line_number, _format_validation_errors(e))
+            continue
+
+        chunk.append({**book.model_dump(), "isbn13": to_isbn13_digits(book.isbn)})
+        chunk_lines.append(line_number)
+        if len(chunk) >= chunk_size:
+            await flush()
+
+    await flush()
+
+    return BookBulkCreateResponse(
+        created=created,
+        failed=failed,
+        errors=errors,
+        errors_truncated=failed > len(errors),
+    )
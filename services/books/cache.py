@@ -0,0 +1,136 @@
+import hashlib
+from collections.abc import Iterable
+from typing import Any
+
+from sqlalchemy import Row
+
+from helpers.cache import (
+    CacheBackend,
+    InMemoryCacheBackend,
+    LRUCache,
+    cache_evictions_total,
+    cache_requests_total,
+)
+from helpers.singleflight import SingleFlight
+from schemas.books import BookListQueryParams
+from settings import get_config
+
+config = get_config()
+
+CACHE_HEADER = "X-Cache"
+
+
+class BookListCache:
+    """
+    Serialized book list pages keyed by the normalized query params.
+
+    Keys embed a version counter which every write bumps (`invalidate`), so pages
+    cached before a write are never served again and simply age out of the backend.
+    """
+
+    name = "book_list"
+    version_key = "books:list:version"
+
+    def __init__(self, *, backend: CacheBackend, ttl: float, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+
+    @staticmethod
+    def params_digest(query_params: BookListQueryParams) -> str:
+        return hashlib.sha1(query_params.model_dump_json().encode()).hexdigest()
+
+    async def key(self, query_params: BookListQueryParams, watermark: object) -> str:
+        """
+        Resolve the versioned key once per request, a page computed while a write
+        bumps the version is then stored under the old version and never served.
+
+        `watermark` (the newest book id) also covers inserts made by processes that
+        do not share this cache's backend.
+        """
+        version = await self.backend.get_counter(self.version_key)
+        return f"books:list:{version}:{watermark}:{self.params_digest(query_params)}"
+
+    async def get(self, key: str) -> bytes | None:
+        if not self.enabled:
+            return None
+        body = await self.backend.get(key)
+        cache_requests_total.inc(
+            cache=self.name, result="miss" if body is None else "hit"
+        )
+        return body
+
+    async def set(self, key: str, body: bytes) -> None:
+        if self.enabled:
+            await self.backend.set(key, body, ttl=self.ttl)
+
+    async def invalidate(self) -> None:
+        await self.backend.incr(self.version_key)
+
+
+class BookRowCache:
+    """
+    `BOOK_RESPONSE_COLUMNS` rows by book id, in process.
+
+    Those columns never change once a book is created, so entries are not
+    invalidated by writes, they only expire (`ttl`) or get evicted. Missing ids
+    are not cached, a replica behind the primary may not have them yet.
+    """
+
+    name = "book_row"
+
+    def __init__(self, *, maxsize: int, ttl: float, enabled: bool = True):
+        self.enabled = enabled
+        self._rows: LRUCache[int, Row[Any]] = LRUCache(
+            maxsize=maxsize,
+            ttl=ttl,
+            on_evict=lambda: cache_evictions_total.inc(cache=self.name),
+        )
+
+    def get_many(self, ids: Iterable[int]) -> tuple[dict[int, Row[Any]], list[int]]:
+        """
+        The cached rows of `ids` by id and the ids not cached, in `ids` order.
+        """
+        if not self.enabled:
+            return {}, list(ids)
+        rows, uncached = {}, []
+        for book_id in ids:
+            row = self._rows.get(book_id)
+            if row is None:
+                uncached.append(book_id)
+            else:
+                rows[book_id] = row
+        if rows:
+            cache_requests_total.inc(len(rows), cache=self.name, result="hit")
+        if uncached:
+            cache_requests_total.inc(len(uncached), cache=self.name, result="miss")
+        return rows, uncached
+
+    def set(self, book_id: int, row: Row[Any]) -> None:
+        if self.enabled:
+            self._rows.set(book_id, row)
+
+    def clear(self) -> None:
+        self._rows.clear()
+
+
+book_list_cache = BookListCache(
+    backend=InMemoryCacheBackend(
+        name=BookListCache.name,
+        maxsize=config.book_list_cache_maxsize,
+        ttl=config.book_list_cache_ttl,
+    ),
+    ttl=config.book_list_cache_ttl,
+    enabled=config.book_list_cache_enabled,
+)
+book_row_cache = BookRowCache(
+    maxsize=config.book_row_cache_maxsize,
+    ttl=config.book_row_cache_ttl,
+    enabled=config.book_row_cache_enabled,
+)
+
+# keyed by `BookListCache.key`: a write (new version or watermark) starts a new
+# flight, so a shared page is never older than the query that computed it
+book_list_flights: SingleFlight[str, tuple[bytes, str]] = SingleFlight(
+    name=BookListCache.name, enabled=config.book_list_coalescing_enabled
+)
@@ -0,0 +1,71 @@
+import csv
+import datetime
+import io
+from collections.abc import AsyncIterator, Sequence
+from typing import Any
+
+from pydantic_core import to_json
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from schemas.books import BookBulkFormat, BookExportQueryParams
+from services.books.queries import build_book_export_query
+from services.books.serializers import BOOK_RESPONSE_ALIASES, book_row_to_dict
+from settings import get_config
+
+config = get_config()
+
+EXPORT_MEDIA_TYPES = {
+    BookBulkFormat.NDJSON: "application/x-ndjson",
+    BookBulkFormat.CSV: "text/csv",
+}
+
+
+def _csv_value(value: Any) -> Any:
+    # same representation as the JSON encoder
+    return value.isoformat() if isinstance(value, datetime.datetime) else value
+
+
+def encode_rows(rows: Sequence[Sequence[Any]], file_format: BookBulkFormat) -> bytes:
+    if file_format == BookBulkFormat.CSV:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        return buffer.getvalue().encode()
+    return b"".join(to_json(book_row_to_dict(row)) + b"\n" for row in rows)
+
+
+def encode_header(file_format: BookBulkFormat) -> bytes:
+    if file_format == BookBulkFormat.CSV:
+        return (",".join(BOOK_RESPONSE_ALIASES) + "\n").encode()
+    return b""
+
+
+async def stream_books_export(
+    *,
+    query_params: BookExportQueryParams,
+    file_format: BookBulkFormat,
+    session_factory: async_sessionmaker[AsyncSession],
+    fetch_size: int | None = None,
+) -> AsyncIterator[bytes]:
+    """
+    Yield the matching books as encoded chunks of at most `fetch_size` rows.
+
+    Rows are read through a server-side cursor (`yield_per`) in a session owned by
+    the generator, so memory stays flat regardless of the result size. When the
+    client disconnects the response task is cancelled and leaving the session
+    closes the cursor and returns the connection to the pool.
+    """
+    query = build_book_export_query(
+        after_id=query_params.after_id,
+        search=query_params.search,
+        search_mode=query_params.search_mode,
+    ).execution_options(yield_per=fetch_size or config.export_fetch_size)
+
+    header = encode_header(file_format)
+    if header:
+        yield header
+
+    async with session_factory() as session:
+        result = await session.stream(query)
+        async for rows in result.partitions():
+            yield encode_rows(rows, file_format)
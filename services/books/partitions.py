@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import re
+from collections.abc import Callable
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.model_books import Book
+from helpers.metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+_BOUNDS = re.compile(r"FROM \((\d+)\) TO \((\d+)\)")
+
+book_partition_count = Gauge("book_partitions", "Id range partitions of books")
+
+
+class BookPartitions:
+    """
+    Id ranges `[lower, upper)` of the `books` partitions (migration 0008), in
+    ascending order, empty while the table is not partitioned.
+
+    Pages sorted by id are served newest partition first by PostgreSQL itself
+    (an ordered append of the partitions' primary keys stops at the limit). A
+    trigram bitmap search however collects the matches of every partition before
+    sorting them, `page_ranges` lets it visit the partitions one at a time
+    instead, stopping once a page is full.
+    """
+
+    def __init__(self) -> None:
+        self.ranges: list[tuple[int, int]] = []
+
+    async def load(self, *, async_db: AsyncSession) -> None:
+        if async_db.bind.dialect.name != "postgresql":
+            return
+        bounds = (
+            await async_db.execute(
+                text(
+                    "SELECT pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits AS i "
+                    "JOIN pg_class AS c ON c.oid = i.inhrelid "
+                    "WHERE i.inhparent = to_regclass(:table)"
+                ),
+                {"table": Book.__tablename__},
+            )
+        ).scalars()
+        ranges = []
+        for bound in bounds:
+            match = _BOUNDS.search(bound)
+            if match:
+                ranges.append((int(match[1]), int(match[2])))
+        self.ranges = sorted(ranges)
+        book_partition_count.set(len(self.ranges))
+
+    async def extend(self, *, async_db: AsyncSession) -> None:
+        """
+        Create the partitions ahead of the id sequence (`books_extend_partitions`),
+        then reload the ranges. A trigger cannot do it for the inserts themselves.
+        """
+        await self.load(async_db=async_db)
+        if not self.ranges:
+            return
+        # creating a partition locks `books`, give up until the next round
+        # rather than queue inserts behind a long running query
+        await async_db.execute(text("SET LOCAL lock_timeout = '1s'"))
+        await async_db.execute(text("SELECT books_extend_partitions()"))
+        await async_db.commit()
+        await self.load(async_db=async_db)
+
+    async def extend_periodically(
+        self, *, session_factory: Callable[[], AsyncSession], interval: float
+    ) -> None:
+        """
+        `extend` now, then every `interval` seconds until cancelled. The partitions
+        ahead of the sequence must outlast the inserts of one interval.
+        """
+        while True:
+            try:
+                async with session_factory() as async_db:
+                    await self.extend(async_db=async_db)
+            except (SQLAlchemyError, OSError):
+                logger.exception("Failed to extend the book partitions")
+            await asyncio.sleep(interval)
+
+    def page_ranges(
+        self, *, cursor_id: int | None, descending: bool
+    ) -> list[tuple[int, int]]:
+        """
+        The ranges a page ordered by id reads, in page order: those before the
+        cursor (newest first when `descending`), all of them without a cursor.
+        """
+        if descending:
+            return [
+                (lower, upper)
+                for lower, upper in reversed(self.ranges)
+                if cursor_id is None or lower < cursor_id
+            ]
+        return [
+            (lower, upper)
+            for lower, upper in self.ranges
+            if cursor_id is None or upper > cursor_id + 1
+        ]
+
+
+book_partitions = BookPartitions()
+
+
+def get_book_partitions() -> BookPartitions:
+    return book_partitions
@@ -1,18 +1,471 @@
-from sqlalchemy import Select, select
+import re
+from functools import lru_cache
+from typing import Any
 
-from db.model_books import Book
+from sqlalchemy import (
+    CompoundSelect,
+    Float,
+    FromClause,
+    Integer,
+    Select,
+    String,
+    any_,
+    bindparam,
+    case,
+    column,
+    false,
+    func,
+    literal,
+    literal_column,
+    null,
+    select,
+    table,
+    tablesample,
+    tuple_,
+    union_all,
+)
+from sqlalchemy.sql import ColumnElement
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
 
+from db.model_books import BOOK_FTS_TABLE, BOOK_SEARCH_VECTOR_COLUMN, Book
+from schemas.base import SortDirection
+from schemas.books import BookResponse, BookSearchMode, BookSortField
 
-def build_book_list_query(
-    *, limit: int, cursor_id: int | None, search: str | None
+# columns of a `BookResponse`, in field order, selected instead of full ORM entities
+BOOK_RESPONSE_COLUMNS = tuple(getattr(Book, name) for name in BookResponse.model_fields)
+
+# sort key of each `sort` option, `id` alone when None
+BOOK_SORT_COLUMNS: dict[BookSortField, ColumnElement[Any] | None] = {
+    BookSortField.ID: None,
+    BookSortField.CREATED_AT: Book.created_at,
+    BookSortField.RATING: Book.rating,
+    BookSortField.PAGES: Book.pages,
+    BookSortField.TITLE: Book.title,
+}
+
+# `pages` facet: ranges of 100 pages, everything from 1000 up in one bucket
+BOOK_PAGES_BUCKET_SIZE = 100
+BOOK_PAGES_BUCKET_MAX = 1000
+BOOK_FACETS_VIEW = "book_facet_counts"
+
+FULLTEXT_CONFIG = "simple"
+# bm25 column weights for the SQLite FTS5 table, mirrors setweight A/B on PostgreSQL
+FTS5_WEIGHTS = (10.0, 1.0)
+
+
+def _fulltext_terms(search: str) -> list[str]:
+    return re.findall(r"\w+", search.lower())
+
+
+def _search_pattern(search: str, search_mode: BookSearchMode) -> str:
+    return f"{search}%" if search_mode == BookSearchMode.PREFIX else f"%{search}%"
+
+
+def build_search_condition(
+    *,
+    title: ColumnElement[str],
+    author: ColumnElement[str],
+    search: str,
+    search_mode: BookSearchMode,
+) -> ColumnElement[bool]:
+    """
+    ILIKE filter used by the `trigram` and `prefix` search modes.
+    """
+    pattern = _search_pattern(search, search_mode)
+    return title.ilike(pattern) | author.ilike(pattern)
+
+
+def _search_sample_source(
+    *, sample_rows: int, sample_percent: float | None
+) -> FromClause:
+    if sample_percent is not None:
+        return tablesample(
+            Book.__table__, func.system(sample_percent), name="sample", seed=literal(0)
+        )
+    return (
+        select(Book.title, Book.author, Book.rating, Book.pages)
+        .order_by(Book.id.desc())
+        .limit(sample_rows)
+        .subquery("sample")
+    )
+
+
+def build_search_sample_query(
+    *,
+    search: str,
+    search_mode: BookSearchMode,
+    sample_rows: int,
+    sample_percent: float | None = None,
+) -> Select:
+    """
+    Count `(sampled, hits)` for a search over a sample of the table.
+
+    With `sample_percent` (PostgreSQL) block-level `TABLESAMPLE SYSTEM` is used,
+    otherwise the newest `sample_rows` rows are sampled through the primary key.
+    """
+    source = _search_sample_source(
+        sample_rows=sample_rows, sample_percent=sample_percent
+    )
+
+    condition = build_search_condition(
+        title=source.c.title,
+        author=source.c.author,
+        search=search,
+        search_mode=search_mode,
+    )
+    return select(
+        func.count().label("sampled"),
+        func.count().filter(condition).label("hits"),
+    ).select_from(source)
+
+
+def _keyset_page(
+    q: Select,
+    *,
+    sort_key: ColumnElement[Any] | None,
+    direction: SortDirection,
+    backward: bool,
+    with_cursor: bool,
+) -> Select:
+    """
+    Order by `(sort_key, id)` and continue after the cursor row (the `cursor_value`
+    and `cursor_id` params) with a row value comparison, which a composite
+    `(sort_key, id)` index serves in either direction. Fetches the `limit` param rows.
+
+    Backward pages run in the reversed order, the caller flips the rows back.
+    """
+    descending = (direction == SortDirection.DESC) != backward
+    keys: tuple[ColumnElement[Any], ...] = (
+        (Book.id,) if sort_key is None else (sort_key, Book.id)
+    )
+
+    if with_cursor:
+        cursor_id = bindparam("cursor_id", type_=Integer)
+        position = keys[0] if sort_key is None else tuple_(*keys)
+        bound = (
+            cursor_id
+            if sort_key is None
+            else tuple_(bindparam("cursor_value", type_=sort_key.type), cursor_id)
+        )
+        q = q.where(position < bound if descending else position > bound)
+
+    return q.order_by(*(key.desc() if descending else key for key in keys)).limit(
+        bindparam("limit", type_=Integer)
+    )
+
+
+@lru_cache(maxsize=256)
+def _book_list_statement(
+    *,
+    search_mode: BookSearchMode | None,
+    with_cursor: bool,
+    sort: BookSortField,
+    direction: SortDirection,
+    backward: bool,
+    dialect_name: str,
+    partition_bounds: bool = False,
+) -> Select:
+    """
+    The statement of one list shape, built once. Values are bind params, so the
+    construct, its cache key and compiled SQL are reused, and on PostgreSQL every
+    pooled connection prepares each shape once (asyncpg statement cache).
+    """
+    if search_mode == BookSearchMode.FULLTEXT:
+        return _book_fulltext_statement(
+            with_cursor=with_cursor,
+            direction=direction,
+            backward=backward,
+            dialect_name=dialect_name,
+        )
+
+    q = select(*BOOK_RESPONSE_COLUMNS)
+    if search_mode is not None:
+        pattern = bindparam("search_pattern", type_=String)
+        q = q.where(Book.title.ilike(pattern) | Book.author.ilike(pattern))
+    if partition_bounds:
+        # one partition's ids, searches are planned with the values (custom plans)
+        # so only that partition is read
+        q = q.where(
+            Book.id >= bindparam("partition_lower", type_=Integer),
+            Book.id < bindparam("partition_upper", type_=Integer),
+        )
+
+    return _keyset_page(
+        q,
+        sort_key=BOOK_SORT_COLUMNS[sort],
+        direction=direction,
+        backward=backward,
+        with_cursor=with_cursor,
+    )
+
+
+def prepare_book_list_query(
+    *,
+    limit: int,
+    cursor_id: int | None,
+    search: str | None,
+    search_mode: BookSearchMode = BookSearchMode.TRIGRAM,
+    cursor_value: Any = None,
+    sort: BookSortField = BookSortField.ID,
+    direction: SortDirection = SortDirection.DESC,
+    backward: bool = False,
+    dialect_name: str = "postgresql",
+    partition: tuple[int, int] | None = None,
+) -> tuple[Select, dict[str, Any]]:
+    """
+    Keyset paginated book list as the cached statement of its shape and the
+    params to execute it with, `cursor_value` is the sort key (or rank) of the
+    cursor row. `partition` restricts a non fulltext page to the ids `[lower, upper)`,
+    see `BookPartitions.page_ranges`.
+    """
+    fulltext = bool(search) and search_mode == BookSearchMode.FULLTEXT
+    params: dict[str, Any] = {"limit": limit + 1}
+    if fulltext:
+        # relevance pages only continue from a rank
+        with_cursor = bool(cursor_id) and cursor_value is not None
+        assert search is not None
+        if dialect_name == "sqlite":
+            terms = _fulltext_terms(search)
+            # FTS5 rejects an empty query, match nothing instead
+            params["fts_query"] = (
+                " ".join(f'"{term}"' for term in terms) if terms else '""'
+            )
+        else:
+            params["search"] = search
+    else:
+        with_cursor = bool(cursor_id)
+        if search:
+            params["search_pattern"] = _search_pattern(search, search_mode)
+    if with_cursor:
+        params["cursor_id"] = cursor_id
+        if fulltext or sort != BookSortField.ID:
+            params["cursor_value"] = cursor_value
+    if partition is not None:
+        assert not fulltext
+        params["partition_lower"], params["partition_upper"] = partition
+
+    statement = _book_list_statement(
+        search_mode=search_mode if search else None,
+        with_cursor=with_cursor,
+        sort=sort,
+        direction=direction,
+        backward=backward,
+        dialect_name=dialect_name,
+        partition_bounds=partition is not None,
+    )
+    return statement, params
+
+
+def build_book_list_query(**kwargs: Any) -> Select:
+    """
+    `prepare_book_list_query` as a standalone statement with its values bound,
+    e.g. for `EXPLAIN` or as a subquery. Binding copies the statement, the list
+    endpoint executes the cached one with its params instead.
+    """
+    statement, params = prepare_book_list_query(**kwargs)
+    return statement.params(params)
+
+
+def build_book_export_query(
+    *,
+    after_id: int | None,
+    search: str | None,
+    search_mode: BookSearchMode = BookSearchMode.TRIGRAM,
 ) -> Select:
-    q = select(Book)
+    """
+    All matching books oldest first, so an interrupted export resumes with `id > after_id`.
+    """
+    q = select(*BOOK_RESPONSE_COLUMNS)
 
     if search:
-        pattern = f"%{search}%"
-        q = q.where((Book.title.ilike(pattern)) | (Book.author.ilike(pattern)))
+        q = q.where(
+            build_search_condition(
+                title=Book.title,
+                author=Book.author,
+                search=search,
+                search_mode=search_mode,
+            )
+        )
+
+    if after_id is not None:
+        q = q.where(Book.id > after_id)
+
+    return q.order_by(Book.id)
+
+
+def _book_fulltext_statement(
+    *,
+    with_cursor: bool,
+    dialect_name: str,
+    direction: SortDirection,
+    backward: bool,
+) -> Select:
+    """
+    Relevance ordered search returning `BOOK_RESPONSE_COLUMNS + (rank,)` rows,
+    keyset paginated over `(rank, id)`.
+
+    PostgreSQL matches the trigger maintained `search_vector` (GIN indexed) against
+    the `search` param and ranks with `ts_rank`, SQLite matches the `fts_query`
+    param on the `books_fts` FTS5 table and ranks with `bm25`.
+    """
+    if dialect_name == "sqlite":
+        fts_table = literal_column(BOOK_FTS_TABLE)
+        matches = (
+            select(
+                literal_column("rowid").label("id"),
+                (-func.bm25(fts_table, *FTS5_WEIGHTS)).label("rank"),
+            )
+            .select_from(table(BOOK_FTS_TABLE))
+            .where(fts_table.op("MATCH")(bindparam("fts_query", type_=String)))
+            .subquery()
+        )
+        rank = matches.c.rank
+        q = select(*BOOK_RESPONSE_COLUMNS, rank).join(matches, matches.c.id == Book.id)
+    else:
+        search_vector = literal_column(
+            f"{Book.__tablename__}.{BOOK_SEARCH_VECTOR_COLUMN}", TSVECTOR
+        )
+        ts_query = func.websearch_to_tsquery(
+            FULLTEXT_CONFIG, bindparam("search", type_=String)
+        )
+        rank = func.ts_rank(search_vector, ts_query, type_=Float)
+        q = select(*BOOK_RESPONSE_COLUMNS, rank.label("rank")).where(
+            search_vector.op("@@")(ts_query)
+        )
+
+    return _keyset_page(
+        q,
+        sort_key=rank,
+        direction=direction,
+        backward=backward,
+        with_cursor=with_cursor,
+    )
+
+
+def build_book_count_query(
+    *, search: str | None, search_mode: BookSearchMode, dialect_name: str
+) -> Select:
+    """
+    Exact number of the books a list with these search params pages through.
+    """
+    matches = (
+        build_book_list_query(
+            limit=0,
+            cursor_id=None,
+            search=search,
+            search_mode=search_mode,
+            dialect_name=dialect_name,
+        )
+        .order_by(None)
+        .limit(None)
+        .subquery()
+    )
+    return select(func.count()).select_from(matches)
+
+
+def book_facet_buckets(source: FromClause) -> dict[str, ColumnElement[int]]:
+    """
+    Facet name -> bucket expression over a books-like `source`, the same buckets
+    the `book_facet_counts` materialized view (migration 0006) groups by.
+    """
+    pages = source.c.pages
+    return {
+        "rating": source.c.rating,
+        "pages": case(
+            (pages >= BOOK_PAGES_BUCKET_MAX, BOOK_PAGES_BUCKET_MAX),
+            else_=pages // BOOK_PAGES_BUCKET_SIZE * BOOK_PAGES_BUCKET_SIZE,
+        ),
+    }
+
+
+def _facet_counts(source: FromClause, count: ColumnElement[int]) -> CompoundSelect:
+    return union_all(
+        *(
+            select(
+                literal(facet).label("facet"),
+                bucket.label("bucket"),
+                count.label("count"),
+            )
+            .select_from(source)
+            .group_by(bucket)
+            for facet, bucket in book_facet_buckets(source).items()
+        )
+    )
+
+
+def build_book_facets_query(*, dialect_name: str) -> Select:
+    """
+    `(facet, bucket, count, refreshed_at)` of the whole catalog.
+
+    PostgreSQL reads the periodically refreshed `book_facet_counts` materialized
+    view, other dialects aggregate the table directly.
+    """
+    if dialect_name == "postgresql":
+        summary = table(
+            BOOK_FACETS_VIEW,
+            column("facet"),
+            column("bucket"),
+            column("count"),
+            column("refreshed_at"),
+        )
+        return select(
+            summary.c.facet, summary.c.bucket, summary.c.count, summary.c.refreshed_at
+        )
+    counts = _facet_counts(Book.__table__, func.count()).subquery()
+    return select(
+        counts.c.facet,
+        counts.c.bucket,
+        counts.c.count,
+        null().label("refreshed_at"),
+    )
+
+
+def build_search_facets_sample_query(
+    *,
+    search: str,
+    search_mode: BookSearchMode,
+    sample_rows: int,
+    sample_percent: float | None = None,
+) -> CompoundSelect:
+    """
+    `(facet, bucket, hits)` of a search over the same sample as `build_search_sample_query`.
+    """
+    source = _search_sample_source(
+        sample_rows=sample_rows, sample_percent=sample_percent
+    )
+    condition = build_search_condition(
+        title=source.c.title,
+        author=source.c.author,
+        search=search,
+        search_mode=search_mode,
+    )
+    return _facet_counts(source, func.count().filter(condition))
+
+
+def build_book_by_isbn13_query(*, isbn13: str) -> Select:
+    return select(Book).where(Book.isbn13 == isbn13).order_by(Book.id).limit(1)
+
+
+def build_books_by_id_query(*, ids: list[int], dialect_name: str) -> Select:
+    """
+    `BOOK_RESPONSE_COLUMNS` rows of the books among `ids`, in no particular order.
+
+    PostgreSQL binds the ids as one array (`id = ANY(:ids)`), a single statement
+    whatever their number. Other dialects bind one parameter per id, callers keep
+    the list within SQLite's limit.
+    """
+    q = select(*BOOK_RESPONSE_COLUMNS)
+    if dialect_name == "postgresql":
+        return q.where(Book.id == any_(bindparam("ids", ids, type_=ARRAY(Integer))))
+    return q.where(Book.id.in_(ids))
+
+
+def build_existing_isbn13_query(*, isbn13_list: list[str]) -> Select:
+    return select(Book.isbn13).where(Book.isbn13.in_(isbn13_list))
 
-    if cursor_id:
-        q = q.where(Book.id < cursor_id)
 
-    return q.order_by(Book.id.desc()).limit(limit + 1)
+def build_book_watermark_query() -> Select:
+    """
+    Newest book id, an index-only lookup that changes with every insert.
+    """
+    return select(func.max(Book.id))
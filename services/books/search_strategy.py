@@ -0,0 +1,164 @@
+from enum import Enum
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+from starlette.exceptions import HTTPException
+
+from db.model_books import Book
+from helpers.cache import LRUCache
+from helpers.metrics import Counter
+from schemas.books import BookListQueryParams, BookSearchMode
+from services.books.queries import build_search_sample_query
+from settings import get_config
+
+config = get_config()
+
+SEARCH_STRATEGY_HEADER = "X-Search-Strategy"
+# pg_trgm needs at least one full trigram to narrow a GIN bitmap scan
+TRIGRAM_LENGTH = 3
+
+
+class SearchStrategy(str, Enum):
+    # no search, the primary key drives the page
+    NONE = "none"
+    # trigram GIN bitmap scan, then sort the matches by id
+    BITMAP = "bitmap"
+    # walk the primary key newest first, filter, stop at limit + 1
+    INDEX_WALK = "index_walk"
+    # tsvector/FTS5 match ordered by rank
+    FULLTEXT = "fulltext"
+    REJECTED = "rejected"
+
+
+search_strategy_total = Counter(
+    "book_search_strategy_total",
+    "Book list requests by chosen search strategy",
+    ("strategy",),
+)
+
+# (search_mode, normalized search) -> (selectivity, total rows)
+_selectivity_cache: LRUCache[tuple[str, str], tuple[float, float]] = LRUCache(
+    maxsize=10_000, ttl=config.search_estimate_ttl
+)
+
+
+def clear_selectivity_cache() -> None:
+    _selectivity_cache.clear()
+
+
+async def estimate_table_rows(*, async_db: AsyncSession) -> tuple[float, bool]:
+    """
+    `(rows, exact)` of the books table: `pg_class.reltuples` on PostgreSQL, an
+    exact count when the table was never analyzed (reltuples = -1) or on other dialects.
+    """
+    if async_db.bind.dialect.name == "postgresql":
+        reltuples = (
+            await async_db.execute(
+                text(
+                    "SELECT reltuples FROM pg_class WHERE oid = CAST(:table AS regclass)"
+                ),
+                {"table": Book.__tablename__},
+            )
+        ).scalar()
+        if reltuples is not None and reltuples >= 0:
+            return float(reltuples), False
+    return (
+        float((await async_db.execute(select(func.count(Book.id)))).scalar() or 0),
+        True,
+    )
+
+
+def search_sample_percent(*, total: float, async_db: AsyncSession) -> float | None:
+    """
+    `TABLESAMPLE` percentage reading about `search_sample_rows` rows, None when the
+    newest rows are sampled instead (small table or not PostgreSQL).
+    """
+    if async_db.bind.dialect.name == "postgresql" and total > config.search_sample_rows:
+        return config.search_sample_rows / total * 100
+    return None
+
+
+async def estimate_selectivity(
+    *, search: str, search_mode: BookSearchMode, async_db: AsyncSession
+) -> tuple[float, float]:
+    """
+    Estimate `(selectivity, total_rows)` of a search from a cached hit-count sample.
+
+    PostgreSQL samples `search_sample_rows` worth of blocks with `TABLESAMPLE` and
+    takes the table size from `pg_class.reltuples`, other dialects sample the newest rows.
+    """
+    key = (search_mode.value, search.lower())
+    cached = _selectivity_cache.get(key)
+    if cached is not None:
+        return cached
+
+    total, exact = await estimate_table_rows(async_db=async_db)
+    sample_percent = search_sample_percent(total=total, async_db=async_db)
+    if sample_percent is None and not exact:
+        # small table, sample it whole through the primary key
+        total = (await async_db.execute(select(func.count(Book.id)))).scalar() or 0
+
+    sampled, hits = (
+        await async_db.execute(
+            build_search_sample_query(
+                search=search,
+                search_mode=search_mode,
+                sample_rows=config.search_sample_rows,
+                sample_percent=sample_percent,
+            )
+        )
+    ).one()
+
+    estimate = (hits / sampled if sampled else 0.0, float(total))
+    _selectivity_cache.set(key, estimate)
+    return estimate
+
+
+async def choose_search_strategy(
+    *, query_params: BookListQueryParams, async_db: AsyncSession
+) -> SearchStrategy:
+    """
+    Pick how a book list page is executed based on the estimated term selectivity.
+
+    A bitmap scan reads every matching row before `ORDER BY id DESC LIMIT` can apply,
+    an index walk reads about `(limit + 1) / selectivity` rows newest first. Common
+    terms therefore walk the primary key, rare terms use the trigram bitmap plan and
+    terms shorter than `search_min_length` are rejected.
+    """
+    strategy = await _choose_search_strategy(
+        query_params=query_params, async_db=async_db
+    )
+    search_strategy_total.inc(strategy=strategy.value)
+    if strategy == SearchStrategy.REJECTED:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Search must be at least {config.search_min_length} characters long",
+        )
+    return strategy
+
+
+async def _choose_search_strategy(
+    *, query_params: BookListQueryParams, async_db: AsyncSession
+) -> SearchStrategy:
+    search = query_params.search
+    if not search:
+        return SearchStrategy.NONE
+    if query_params.search_mode == BookSearchMode.FULLTEXT:
+        return SearchStrategy.FULLTEXT
+    if len(search.strip()) < config.search_min_length:
+        return SearchStrategy.REJECTED
+    if len(search) < TRIGRAM_LENGTH:
+        return SearchStrategy.INDEX_WALK
+
+    selectivity, total = await estimate_selectivity(
+        search=search, search_mode=query_params.search_mode, async_db=async_db
+    )
+    if selectivity == 0:
+        return SearchStrategy.BITMAP
+
+    walked_rows = (query_params.limit + 1) / selectivity
+    matched_rows = selectivity * total
+    if walked_rows <= matched_rows * config.search_index_walk_factor:
+        return SearchStrategy.INDEX_WALK
+    return SearchStrategy.BITMAP
@@ -0,0 +1,81 @@
+from collections.abc import Sequence
+from typing import Any
+
+from pydantic_core import to_json
+
+from schemas.base import PaginationCursor, _BaseModel
+from schemas.books import (
+    BookBatchGetResponse,
+    BookCount,
+    BookFacets,
+    BookListResponse,
+    BookResponse,
+)
+
+# `BookResponse` field names in declaration (and therefore JSON) order, and their aliases
+BOOK_RESPONSE_FIELDS = tuple(BookResponse.model_fields)
+BOOK_RESPONSE_ALIASES = tuple(
+    field.alias or name for name, field in BookResponse.model_fields.items()
+)
+_PAGE_KEYS = {
+    name: field.alias or name for name, field in BookListResponse.model_fields.items()
+}
+_BATCH_KEYS = {
+    name: field.alias or name
+    for name, field in BookBatchGetResponse.model_fields.items()
+}
+
+
+def book_row_to_dict(row: Sequence[Any]) -> dict[str, Any]:
+    """
+    Map a row selected with `BOOK_RESPONSE_COLUMNS` to its camelCase `BookResponse` JSON object.
+    """
+    return dict(zip(BOOK_RESPONSE_ALIASES, row))
+
+
+def serialize_book_list_page(
+    *,
+    rows: Sequence[Sequence[Any]],
+    next_cursor: PaginationCursor | None,
+    prev_cursor: PaginationCursor | None = None,
+    count: BookCount | None = None,
+    facets: BookFacets | None = None,
+) -> bytes:
+    """
+    Serialize a `BookListResponse` page straight from row tuples.
+
+    Rows come from the database already typed, so ORM hydration and pydantic
+    validation are skipped and pydantic-core's encoder writes the JSON directly.
+    The output is byte for byte what `model_dump_json(by_alias=True)` produces.
+    """
+    return to_json(
+        {
+            _PAGE_KEYS["results"]: [book_row_to_dict(row) for row in rows],
+            _PAGE_KEYS["next_cursor"]: _dump(next_cursor),
+            _PAGE_KEYS["prev_cursor"]: _dump(prev_cursor),
+            _PAGE_KEYS["count"]: _dump(count),
+            _PAGE_KEYS["facets"]: _dump(facets),
+        }
+    )
+
+
+def serialize_book(row: Sequence[Any]) -> bytes:
+    return to_json(book_row_to_dict(row))
+
+
+def serialize_book_batch(
+    *, rows: Sequence[Sequence[Any]], missing: Sequence[int]
+) -> bytes:
+    """
+    Serialize a `BookBatchGetResponse` straight from row tuples, as `serialize_book_list_page`.
+    """
+    return to_json(
+        {
+            _BATCH_KEYS["results"]: [book_row_to_dict(row) for row in rows],
+            _BATCH_KEYS["missing"]: list(missing),
+        }
+    )
+
+
+def _dump(model: _BaseModel | None) -> dict[str, Any] | None:
+    return model.model_dump(by_alias=True) if model else None
@@ -1,21 +1,83 @@
-from sqlalchemy import text
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any
+
+from pydantic import TypeAdapter
+from sqlalchemy import Row, text
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from starlette import status
 from starlette.exceptions import HTTPException
 
 from db.model_books import Book
-from services.books.queries import build_book_list_query
-from schemas.base import PaginationCursor, PaginatedListResponse
-from schemas.books import BookCreateRequest, BookResponse, BookListQueryParams
+from helpers.etag import make_etag
+from helpers.isbn import to_isbn13_digits
+from helpers.metrics import Histogram
+from helpers.timing import timed
+from services.books.aggregates import get_book_count, get_book_facets
+from services.books.cache import book_list_cache, book_row_cache
+from services.books.partitions import BookPartitions
+from services.books.queries import (
+    build_book_by_isbn13_query,
+    build_books_by_id_query,
+    prepare_book_list_query,
+    build_book_watermark_query,
+    build_existing_isbn13_query,
+)
+from schemas.base import KeysetCursor, PaginationCursor, SortDirection
+from schemas.books import (
+    BookCreateRequest,
+    BookCreateResponse,
+    BookResponse,
+    BookListInclude,
+    BookListQueryParams,
+    BookSortField,
+)
+from services.books.search_strategy import SearchStrategy, choose_search_strategy
+from services.books.serializers import serialize_book_list_page
+from settings import get_config
+
+config = get_config()
+
+# `sort` of cursors for relevance ordered (`fulltext`) pages
+RANK_SORT = "rank"
+_SORT_VALUE_TYPES: dict[str, TypeAdapter] = {
+    RANK_SORT: TypeAdapter(float),
+    BookSortField.ID.value: TypeAdapter(None),
+    **{
+        sort.value: TypeAdapter(BookResponse.model_fields[sort.value].annotation)
+        for sort in BookSortField
+        if sort != BookSortField.ID
+    },
+}
+
+# ids bound per statement on SQLite, whose limit is 999 parameters before 3.32
+SQLITE_MAX_BOUND_IDS = 900
+
+book_list_partitions_scanned = Histogram(
+    "book_list_partitions_scanned",
+    "Partitions queried one at a time for a book list page",
+    buckets=(1, 2, 3, 5, 10, 20, 50),
+)
 
 
 async def create_book(
     *, request_data: BookCreateRequest, async_db: AsyncSession
-) -> None:
+) -> BookCreateResponse:
     """
     Add a new book to the database using provided data.
+
+    Books are unique by their canonical ISBN-13 (unique index), duplicates are
+    rejected with 409.
     """
+    isbn13 = to_isbn13_digits(request_data.isbn)
+    existing = (
+        await async_db.execute(build_existing_isbn13_query(isbn13_list=[isbn13]))
+    ).first()
+    if existing:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Book with this ISBN already exists",
+        )
+
     try:
         book = Book(
             title=request_data.title,
@@ -26,6 +88,15 @@ async def create_book(
         )
         async_db.add(book)
         await async_db.commit()
+        await book_list_cache.invalidate()
+        return BookCreateResponse(id=book.id)
+    except IntegrityError:
+        # a concurrent create of the same ISBN won the unique index
+        await async_db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Book with this ISBN already exists",
+        )
     except SQLAlchemyError:
         await async_db.rollback()
         raise HTTPException(
@@ -34,46 +105,289 @@ async def create_book(
         )
 
 
+async def get_book_list_watermark(*, async_db: AsyncSession) -> int:
+    """
+    Cheap change marker for list pages, see `BookListCache.key`.
+
+    Books are insert-only (there is no update or delete API) and every insert
+    raises the newest id, so no row count is added: an exact `count(*)` would
+    scan the whole primary key on every conditional request.
+    """
+    return (await async_db.execute(build_book_watermark_query())).scalar() or 0
+
+
+def get_book_list_etag(*, query_params: BookListQueryParams, watermark: int) -> str:
+    """
+    Strong ETag of a list page, the same on every worker.
+
+    A page is fully determined by the watermark and the query params, its cursor
+    tokens are signed with the `CURSOR_SECRET` every worker shares. The cache's
+    version counter is deliberately left out, with the in-memory backend it
+    differs between processes.
+    """
+    return make_etag(watermark, book_list_cache.params_digest(query_params))
+
+
 async def get_book_list(
-    *, query_params: BookListQueryParams, async_db: AsyncSession
-) -> PaginatedListResponse[BookResponse]:
+    *,
+    query_params: BookListQueryParams,
+    async_db: AsyncSession,
+    strategy: SearchStrategy | None = None,
+    partitions: BookPartitions | None = None,
+) -> bytes:
     """
-    Return a paginated list of books with optional search and cursor.
+    Return a paginated list of books with optional search and cursor, serialized
+    as `BookListResponse` JSON, with the count and facets when `include`d.
+
+    Only the response columns are selected and rows are encoded directly, see
+    `serialize_book_list_page`. `strategy` is chosen by `choose_search_strategy`
+    when not given.
+
+    Bitmap searches sorted by id on a partitioned table query the `partitions`
+    one at a time in page order, until `limit + 1` rows are found.
     """
-    if (
-        query_params.search and async_db.bind.dialect.name != "sqlite"
-    ):  # sqlite is used for tests
-        # Ensure PostgreSQL uses bitmap index scan for trigram searches.
-        # For ILIKE operations with trigram indexes on 10M records,
-        # we disable sequential scan to guarantee index usage.
-        # This provides consistent performance (60ms vs 10s+).
+    if strategy is None:
+        strategy = await choose_search_strategy(
+            query_params=query_params, async_db=async_db
+        )
+
+    # before the planner settings below, which only suit the page query
+    includes = query_params.includes
+    count = (
+        await get_book_count(query_params=query_params, async_db=async_db)
+        if BookListInclude.COUNT in includes
+        else None
+    )
+    facets = (
+        await get_book_facets(query_params=query_params, async_db=async_db)
+        if BookListInclude.FACETS in includes
+        else None
+    )
+
+    dialect_name = async_db.bind.dialect.name
+    ranked = strategy == SearchStrategy.FULLTEXT
+    if dialect_name != "sqlite":  # sqlite is used for tests
         # LOCAL ensures these settings only apply to this transaction.
-        a = 1
-        await async_db.execute(text("SET LOCAL enable_seqscan = OFF"))
-        await async_db.execute(text("SET LOCAL enable_indexscan = OFF"))
+        if query_params.search:
+            # The list statements are prepared once per connection, and after a few
+            # runs PostgreSQL may switch to a generic plan: one that ignores the
+            # term's selectivity and was planned under another strategy's settings.
+            await async_db.execute(
+                text("SET LOCAL plan_cache_mode = force_custom_plan")
+            )
+        if strategy == SearchStrategy.BITMAP:
+            # Rare terms: for ILIKE operations with trigram indexes on 10M records
+            # a bitmap index scan gives consistent performance (60ms vs 10s+),
+            # so sequential and plain index scans are disabled.
+            await async_db.execute(text("SET LOCAL enable_seqscan = OFF"))
+            await async_db.execute(text("SET LOCAL enable_indexscan = OFF"))
+        elif strategy == SearchStrategy.INDEX_WALK:
+            # Common terms: walking the primary key newest first stops after
+            # `limit + 1` matches instead of fetching every match.
+            await async_db.execute(text("SET LOCAL enable_seqscan = OFF"))
+            await async_db.execute(text("SET LOCAL enable_bitmapscan = OFF"))
 
-    query = build_book_list_query(
-        limit=query_params.limit,
-        cursor_id=query_params.cursor_id,
+    cursor = resolve_list_cursor(query_params)
+    backward = cursor.backward if cursor else False
+
+    page_kwargs: dict[str, Any] = dict(
         search=query_params.search,
+        search_mode=query_params.search_mode,
+        cursor_value=cursor.value if cursor else None,
+        sort=query_params.sort,
+        direction=query_params.direction,
+        backward=backward,
+        dialect_name=dialect_name,
+    )
+    page_ranges = (
+        partitions.page_ranges(
+            cursor_id=cursor.id if cursor else None,
+            descending=(query_params.direction == SortDirection.DESC) != backward,
+        )
+        if partitions is not None
+        and strategy == SearchStrategy.BITMAP
+        and query_params.sort == BookSortField.ID
+        else []
     )
 
-    # await print_explain_analyze(query, async_db)
-
-    rows = (await async_db.execute(query)).scalars().all()
+    if len(page_ranges) > 1:
+        rows = []
+        scanned = 0
+        for partition in page_ranges:
+            query, params = prepare_book_list_query(
+                limit=query_params.limit - len(rows),
+                cursor_id=cursor.id if cursor else None,
+                partition=partition,
+                **page_kwargs,
+            )
+            result = await async_db.execute(query, params)
+            scanned += 1
+            with timed("hydrate"):
+                rows += result.all()
+            if len(rows) > query_params.limit:
+                break
+        book_list_partitions_scanned.observe(scanned)
+    else:
+        query, params = prepare_book_list_query(
+            limit=query_params.limit,
+            cursor_id=cursor.id if cursor else None,
+            **page_kwargs,
+        )
+        result = await async_db.execute(query, params)
+        with timed("hydrate"):
+            rows = result.all()
 
     has_more = len(rows) == query_params.limit + 1
     items = rows[: query_params.limit]
+    if backward:
+        # fetched in the reversed order
+        items.reverse()
+
+    # a cursor means rows exist on the side the client came from
+    has_next = bool(cursor) if backward else has_more
+    has_prev = has_more if backward else bool(cursor)
 
     next_cursor = (
-        PaginationCursor(
-            id=items[-1].id,
-        )
-        if has_more
+        _page_cursor(items[-1], query_params=query_params, ranked=ranked)
+        if items and has_next
         else None
     )
-
-    return PaginatedListResponse(
-        results=[BookResponse(**item.__dict__) for item in items],
-        next_cursor=next_cursor,
+    prev_cursor = (
+        _page_cursor(items[0], query_params=query_params, ranked=ranked, backward=True)
+        if items and has_prev
+        else None
     )
+
+    with timed("serialize"):
+        return serialize_book_list_page(
+            rows=items,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor,
+            count=count,
+            facets=facets,
+        )
+
+
+def _cursor_sort(query_params: BookListQueryParams) -> str:
+    return RANK_SORT if query_params.is_fulltext else query_params.sort.value
+
+
+def resolve_list_cursor(query_params: BookListQueryParams) -> KeysetCursor | None:
+    """
+    Decode the signed `cursor` token, or build the cursor for the legacy
+    `cursor_id`/`cursor_rank` params. Raises 422 for tokens that are forged or were
+    issued for another sort order.
+    """
+    sort = _cursor_sort(query_params)
+    if query_params.cursor:
+        try:
+            cursor = KeysetCursor.decode(query_params.cursor, _cursor_secret())
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)
+            )
+        if cursor.sort != sort or cursor.direction != query_params.direction:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Cursor was issued for a different sort order",
+            )
+        # JSON round trip turned e.g. `created_at` into a string
+        cursor.value = _SORT_VALUE_TYPES[sort].validate_python(cursor.value)
+        return cursor
+
+    if query_params.cursor_id:
+        return KeysetCursor(
+            sort=sort,
+            direction=query_params.direction,
+            value=query_params.cursor_rank,
+            id=query_params.cursor_id,
+        )
+    return None
+
+
+def _page_cursor(
+    row: Row,
+    *,
+    query_params: BookListQueryParams,
+    ranked: bool,
+    backward: bool = False,
+) -> PaginationCursor:
+    sort = _cursor_sort(query_params)
+    rank = row.rank if ranked else None
+    if ranked:
+        value = rank
+    elif sort == BookSortField.ID:
+        value = None
+    else:
+        value = getattr(row, sort)
+    token = KeysetCursor(
+        sort=sort,
+        direction=query_params.direction,
+        value=value,
+        id=row.id,
+        backward=backward,
+    ).encode(_cursor_secret())
+    return PaginationCursor(id=row.id, rank=rank, token=token)
+
+
+def _cursor_secret() -> bytes:
+    assert config.cursor_secret is not None  # set by `Config.validate_cursor_secret`
+    return config.cursor_secret.get_secret_value().encode()
+
+
+async def get_book_by_isbn(*, isbn: str, async_db: AsyncSession) -> BookResponse:
+    """
+    Return the book matching an ISBN-10/13 (any formatting) via the `isbn13` B-tree index.
+    """
+    try:
+        isbn13 = to_isbn13_digits(isbn)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Invalid ISBN",
+        )
+
+    result = await async_db.execute(build_book_by_isbn13_query(isbn13=isbn13))
+    with timed("hydrate"):
+        book = result.scalars().first()
+    if book is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Book not found",
+        )
+    return BookResponse.model_validate(book)
+
+
+async def get_books_by_id(
+    *, ids: list[int], session_factory: async_sessionmaker[AsyncSession]
+) -> tuple[list[Row[Any]], list[int]]:
+    """
+    `BOOK_RESPONSE_COLUMNS` rows of `ids` in request order (each id once) and the
+    ids without a book.
+
+    Hot ids are served by `book_row_cache`, the others read in one primary key
+    lookup (chunks of `SQLITE_MAX_BOUND_IDS` on SQLite). A session is only opened
+    for those.
+    """
+    requested = list(dict.fromkeys(ids))
+    rows, uncached = book_row_cache.get_many(requested)
+    if uncached:
+        async with session_factory() as async_db:
+            dialect_name = async_db.bind.dialect.name
+            chunk_size = (
+                len(uncached) if dialect_name == "postgresql" else SQLITE_MAX_BOUND_IDS
+            )
+            for start in range(0, len(uncached), chunk_size):
+                result = await async_db.execute(
+                    build_books_by_id_query(
+                        ids=uncached[start : start + chunk_size],
+                        dialect_name=dialect_name,
+                    )
+                )
+                with timed("hydrate"):
+                    for row in result:
+                        rows[row.id] = row
+                        book_row_cache.set(row.id, row)
+    found = [rows[book_id] for book_id in requested if book_id in rows]
+    missing = [book_id for book_id in requested if book_id not in rows]
+    return found, missing
@@ -0,0 +1,289 @@
+import asyncio
+import heapq
+import logging
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.model_books import Book
+from helpers.metrics import Gauge
+from schemas.books import BookSuggestField, BookSuggestion
+from settings import get_config
+
+config = get_config()
+
+logger = logging.getLogger(__name__)
+
+# largest `limit` of a suggestion request, the size of the precomputed top lists
+SUGGEST_MAX_LIMIT = 20
+# prefixes matching more entries get a precomputed top list instead of a scan
+SUGGEST_SCAN_LIMIT = 1_000
+# past the last code point, `prefix + _PREFIX_END` sorts after every completion
+_PREFIX_END = "\U0010ffff"
+
+suggest_index_entries = Gauge(
+    "suggest_index_entries", "Distinct values in the suggestion index", ("field",)
+)
+suggest_index_bytes = Gauge(
+    "suggest_index_bytes",
+    "Approximate memory held by the suggestion index",
+    ("field",),
+)
+
+
+def normalize_suggestion(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+class PrefixIndex:
+    """
+    Distinct normalized values in a sorted array with their book counts.
+
+    The completions of a prefix are a contiguous range of the array, found with
+    two binary searches. Ranges longer than `SUGGEST_SCAN_LIMIT` (short prefixes)
+    have their top `SUGGEST_MAX_LIMIT` entries precomputed, so a lookup never
+    scans more than `SUGGEST_SCAN_LIMIT` entries.
+
+    At most `max_entries` values are kept (the most frequent when built), new
+    values are dropped once full. `nbytes` is kept up to date on every change.
+    """
+
+    def __init__(self, *, max_entries: int):
+        self.max_entries = max_entries
+        self._keys: list[str] = []
+        # display value (the most frequent spelling), the key object when equal
+        self._texts: list[str] = []
+        self._weights = array("q")
+        # prefix -> keys of its heaviest completions, heaviest first
+        self._tops: dict[str, list[str]] = {}
+        self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @classmethod
+    def build(
+        cls, values: Iterable[tuple[str, int]], *, max_entries: int
+    ) -> "PrefixIndex":
+        """
+        Index `(value, count)` pairs, values equal once normalized are merged.
+        """
+        merged: dict[str, list] = {}
+        for text, count in values:
+            key = normalize_suggestion(text)
+            if not key:
+                continue
+            entry = merged.get(key)
+            if entry is None:
+                merged[key] = [text, count, count]
+            else:
+                if count > entry[2]:
+                    entry[0], entry[2] = text, count
+                entry[1] += count
+
+        index = cls(max_entries=max_entries)
+        kept = heapq.nlargest(max_entries, merged.items(), key=lambda item: item[1][1])
+        for key, (text, count, _) in sorted(kept):
+            index._keys.append(key)
+            index._texts.append(key if text == key else text)
+            index._weights.append(count)
+        index._build_tops(0, len(index._keys), 1)
+        index.nbytes = index._measure()
+        return index
+
+    def _build_tops(self, lo: int, hi: int, depth: int) -> None:
+        """
+        Precompute the top lists of the prefixes of length >= `depth` in `[lo, hi)`.
+        """
+        while lo < hi:
+            key = self._keys[lo]
+            if len(key) < depth:
+                lo += 1
+                continue
+            prefix = key[:depth]
+            end = bisect_left(self._keys, prefix + _PREFIX_END, lo, hi)
+            if end - lo > SUGGEST_SCAN_LIMIT:
+                self._tops[prefix] = [
+                    self._keys[position]
+                    for position in heapq.nlargest(
+                        SUGGEST_MAX_LIMIT, range(lo, end), key=self._weights.__getitem__
+                    )
+                ]
+                self._build_tops(lo, end, depth + 1)
+            lo = end
+
+    def _measure(self) -> int:
+        nbytes = sys.getsizeof(self._keys) + sys.getsizeof(self._texts)
+        nbytes += self._weights.buffer_info()[1] * self._weights.itemsize
+        for key, text in zip(self._keys, self._texts):
+            nbytes += sys.getsizeof(key)
+            if text is not key:
+                nbytes += sys.getsizeof(text)
+        nbytes += sys.getsizeof(self._tops)
+        for prefix, top in self._tops.items():
+            nbytes += sys.getsizeof(prefix) + sys.getsizeof(top)
+        return nbytes
+
+    def _position(self, key: str) -> int | None:
+        position = bisect_left(self._keys, key)
+        if position < len(self._keys) and self._keys[position] == key:
+            return position
+        return None
+
+    def _weight(self, key: str) -> int:
+        position = self._position(key)
+        return 0 if position is None else self._weights[position]
+
+    def add(self, text: str) -> None:
+        """
+        Count one more book with `text`.
+        """
+        key = normalize_suggestion(text)
+        if not key:
+            return
+        position = bisect_left(self._keys, key)
+        if position < len(self._keys) and self._keys[position] == key:
+            self._weights[position] += 1
+        elif len(self._keys) < self.max_entries:
+            self._keys.insert(position, key)
+            self._texts.insert(position, key if text == key else text)
+            self._weights.insert(position, 1)
+            self.nbytes += sys.getsizeof(key) + 2 * 8 + self._weights.itemsize
+            if text != key:
+                self.nbytes += sys.getsizeof(text)
+        else:
+            return
+
+        # weights only grow, so the entry can only move up the top lists
+        for length in range(1, len(key) + 1):
+            top = self._tops.get(key[:length])
+            if top is None:
+                continue
+            if key not in top:
+                if len(top) >= SUGGEST_MAX_LIMIT:
+                    if self._weight(top[-1]) >= self._weight(key):
+                        continue
+                    top.pop()
+                top.append(key)
+            top.sort(key=self._weight, reverse=True)
+
+    def suggest(self, prefix: str, *, limit: int) -> list[BookSuggestion]:
+        # a typed trailing space ends the word: "the " does not complete to "theory"
+        trailing_space = prefix[-1:].isspace()
+        prefix = normalize_suggestion(prefix)
+        if trailing_space and prefix:
+            prefix += " "
+        top = self._tops.get(prefix)
+        if top is not None:
+            positions = [self._position(key) for key in top[:limit]]
+        else:
+            lo = bisect_left(self._keys, prefix)
+            hi = bisect_left(self._keys, prefix + _PREFIX_END, lo)
+            # ranges grown past the scan limit since the build are cut short
+            hi = min(hi, lo + 2 * SUGGEST_SCAN_LIMIT)
+            positions = heapq.nlargest(
+                limit, range(lo, hi), key=self._weights.__getitem__
+            )
+        return [
+            BookSuggestion(text=self._texts[position], books=self._weights[position])
+            for position in positions
+            if position is not None
+        ]
+
+
+class BookSuggestions:
+    """
+    Per-process prefix indexes of the book titles and authors.
+
+    Built from the database in the background at startup and every
+    `suggest_reload_interval` seconds, creates served by this process are added
+    as they commit. Creates of other processes (and bulk uploads) show up after
+    the next reload.
+    """
+
+    def __init__(self, *, max_entries: int):
+        self.max_entries = max_entries
+        self.indexes: dict[BookSuggestField, PrefixIndex] | None = None
+        # books added while a reload is running, replayed onto the new indexes
+        self._added_during_load: list[tuple[str, str]] | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self.indexes is not None
+
+    async def load(self, *, async_db: AsyncSession) -> None:
+        self._added_during_load = []
+        try:
+            indexes = {}
+            for field in BookSuggestField:
+                column = getattr(Book, field.value)
+                rows = (
+                    await async_db.execute(
+                        select(column, func.count())
+                        .group_by(column)
+                        .order_by(func.count().desc())
+                        .limit(self.max_entries)
+                    )
+                ).all()
+                # sorting and the top lists take seconds for millions of values
+                indexes[field] = await asyncio.to_thread(
+                    PrefixIndex.build, rows, max_entries=self.max_entries
+                )
+            added, self._added_during_load = self._added_during_load, None
+        except BaseException:
+            self._added_during_load = None
+            raise
+        # counted twice when committed before the queries' snapshot, never lost
+        for title, author in added:
+            indexes[BookSuggestField.TITLE].add(title)
+            indexes[BookSuggestField.AUTHOR].add(author)
+        self.indexes = indexes
+        self._report()
+
+    async def load_periodically(
+        self, *, session_factory: Callable[[], AsyncSession], interval: float
+    ) -> None:
+        """
+        Load now, then every `interval` seconds (0 loads once) until cancelled.
+        """
+        while True:
+            try:
+                async with session_factory() as async_db:
+                    await self.load(async_db=async_db)
+            except (SQLAlchemyError, OSError):
+                logger.exception("Failed to load the book suggestions")
+            if interval <= 0:
+                return
+            await asyncio.sleep(interval)
+
+    def add(self, *, title: str, author: str) -> None:
+        if self._added_during_load is not None:
+            self._added_during_load.append((title, author))
+        if self.indexes is not None:
+            self.indexes[BookSuggestField.TITLE].add(title)
+            self.indexes[BookSuggestField.AUTHOR].add(author)
+            self._report()
+
+    def suggest(
+        self, prefix: str, *, field: BookSuggestField, limit: int
+    ) -> list[BookSuggestion]:
+        assert self.indexes is not None
+        return self.indexes[field].suggest(prefix, limit=limit)
+
+    def _report(self) -> None:
+        assert self.indexes is not None
+        for field, index in self.indexes.items():
+            suggest_index_entries.set(len(index), field=field.value)
+            suggest_index_bytes.set(index.nbytes, field=field.value)
+
+
+book_suggestions = BookSuggestions(max_entries=config.suggest_max_entries)
+
+
+def get_book_suggestions() -> BookSuggestions:
+    return book_suggestions
@@ -0,0 +1,215 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from starlette import status
+from starlette.exceptions import HTTPException
+
+from db.database import AsyncSessionLocal
+from db.model_books import Book
+from helpers.isbn import to_isbn13_digits
+from helpers.metrics import Gauge, Histogram
+from schemas.books import BookCreateRequest, BookCreateResponse
+from services.books.cache import book_list_cache
+from services.books.queries import build_existing_isbn13_query
+from settings import get_config
+
+config = get_config()
+
+logger = logging.getLogger(__name__)
+
+book_create_queue_depth = Gauge(
+    "book_create_queue_depth", "Book creates waiting for their batch"
+)
+book_create_batch_size = Histogram(
+    "book_create_batch_size",
+    "Book creates committed per batch",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+
+
+def _duplicate_isbn() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Book with this ISBN already exists",
+    )
+
+
+@dataclass
+class _PendingCreate:
+    row: dict[str, Any]
+    future: asyncio.Future[BookCreateResponse] = field(
+        default_factory=lambda: asyncio.get_running_loop().create_future()
+    )
+
+    def resolve(self, result: BookCreateResponse | HTTPException) -> None:
+        # the request may have been cancelled while waiting, the row stays committed
+        if self.future.done():
+            return
+        if isinstance(result, HTTPException):
+            self.future.set_exception(result)
+        else:
+            self.future.set_result(result)
+
+
+class BookCreateQueue:
+    """
+    Write-behind path of `POST /book/create`: validated books are queued and a
+    background task inserts them in batches of up to `max_batch_size`, waiting at
+    most `max_delay` seconds for a batch to fill.
+
+    `create` returns only once the book's batch committed, so an acknowledged
+    book is as durable as with `service.create_book`. A batch hitting the unique
+    ISBN index (a concurrent create on another worker) is retried row by row,
+    failing only the duplicates. The queue holds at most `maxsize` books, further
+    creates wait for room.
+    """
+
+    def __init__(
+        self,
+        *,
+        session_factory: async_sessionmaker[AsyncSession],
+        max_batch_size: int,
+        max_delay: float,
+        maxsize: int = 0,
+    ):
+        self.session_factory = session_factory
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.maxsize = maxsize
+        self._queue: asyncio.Queue[_PendingCreate] | None = None
+        self._worker: asyncio.Task | None = None
+
+    def _ensure_worker(self) -> asyncio.Queue[_PendingCreate]:
+        # started on first use, in the event loop serving the requests
+        if self._queue is None or self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue(self.maxsize)
+            self._worker = asyncio.create_task(self._run(self._queue))
+        return self._queue
+
+    async def create(self, request_data: BookCreateRequest) -> BookCreateResponse:
+        queue = self._ensure_worker()
+        pending = _PendingCreate(
+            row={
+                **request_data.model_dump(),
+                "isbn13": to_isbn13_digits(request_data.isbn),
+            }
+        )
+        await queue.put(pending)
+        book_create_queue_depth.set(queue.qsize())
+        return await pending.future
+
+    async def close(self) -> None:
+        """
+        Commit the queued books, then stop the background task.
+        """
+        if self._queue is None or self._worker is None:
+            return
+        if not self._worker.done():
+            await self._queue.join()
+            self._worker.cancel()
+        self._queue = self._worker = None
+
+    async def _run(self, queue: asyncio.Queue[_PendingCreate]) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(
+                        await asyncio.wait_for(queue.get(), deadline - loop.time())
+                    )
+                except asyncio.TimeoutError:
+                    break
+            book_create_queue_depth.set(queue.qsize())
+            try:
+                await self._commit_batch(batch)
+            except Exception:
+                logger.exception("Failed to commit a batch of %s books", len(batch))
+                for pending in batch:
+                    pending.resolve(
+                        HTTPException(
+                            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="Failed to create book",
+                        )
+                    )
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _commit_batch(self, batch: list[_PendingCreate]) -> None:
+        async with self.session_factory() as async_db:
+            existing = set(
+                (
+                    await async_db.execute(
+                        build_existing_isbn13_query(
+                            isbn13_list=[pending.row["isbn13"] for pending in batch]
+                        )
+                    )
+                ).scalars()
+            )
+            accepted = []
+            for pending in batch:
+                if pending.row["isbn13"] in existing:
+                    pending.resolve(_duplicate_isbn())
+                    continue
+                existing.add(pending.row["isbn13"])
+                accepted.append(pending)
+            if not accepted:
+                return
+
+            try:
+                result = await async_db.execute(
+                    insert(Book).returning(Book.id, sort_by_parameter_order=True),
+                    [pending.row for pending in accepted],
+                )
+                ids = list(result.scalars())
+                await async_db.commit()
+            except IntegrityError:
+                await async_db.rollback()
+                await self._commit_rows(accepted, async_db=async_db)
+                return
+            book_create_batch_size.observe(len(accepted))
+            await book_list_cache.invalidate()
+            for pending, book_id in zip(accepted, ids):
+                pending.resolve(BookCreateResponse(id=book_id))
+
+    async def _commit_rows(
+        self, batch: list[_PendingCreate], *, async_db: AsyncSession
+    ) -> None:
+        for pending in batch:
+            try:
+                book_id = (
+                    await async_db.execute(insert(Book).returning(Book.id), pending.row)
+                ).scalar_one()
+                await async_db.commit()
+            except IntegrityError:
+                await async_db.rollback()
+                pending.resolve(_duplicate_isbn())
+            except SQLAlchemyError:
+                await async_db.rollback()
+                raise
+            else:
+                book_create_batch_size.observe(1)
+                await book_list_cache.invalidate()
+                pending.resolve(BookCreateResponse(id=book_id))
+
+
+book_create_queue = BookCreateQueue(
+    session_factory=AsyncSessionLocal,
+    max_batch_size=config.book_create_batch_max_size,
+    max_delay=config.book_create_batch_max_delay_ms / 1000,
+    maxsize=config.book_create_queue_maxsize,
+)
+
+
+def get_book_create_queue() -> BookCreateQueue | None:
+    """
+    The write-behind queue, None when creates commit within their request.
+    """
+    return book_create_queue if config.book_create_write_behind else None
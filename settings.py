@@ -1,14 +1,30 @@
 import os
+import secrets
 
-from pydantic import SecretStr
+from pydantic import SecretStr, model_validator
 from pydantic_settings import BaseSettings
 
 
+# shared by every `Config` of a process, so cursors survive `get_config()` calls
+_DEBUG_CURSOR_SECRET = secrets.token_urlsafe(32)
+
+
 class Config(BaseSettings):
     debug: bool = True
     swagger_username: SecretStr = SecretStr(os.environ.get("SWAGGER_USERNAME", "admin"))
     swagger_password: SecretStr = SecretStr(os.environ.get("SWAGGER_PASSWORD", "admin"))
 
+    # Signs the opaque pagination cursors, must be the same for all workers.
+    # Required unless `debug` with a single worker, which falls back to a random
+    # per-process secret.
+    cursor_secret: SecretStr | None = (
+        SecretStr(os.environ["CURSOR_SECRET"])
+        if os.environ.get("CURSOR_SECRET")
+        else None
+    )
+    # Worker processes `scripts/serve.sh` starts
+    web_concurrency: int = int(os.environ.get("WEB_CONCURRENCY", "1"))
+
     # Database configuration
     postgres_password: SecretStr = SecretStr(
         os.environ.get("POSTGRES_PASSWORD", "postgres")
@@ -18,10 +34,183 @@ class Config(BaseSettings):
     postgres_host: SecretStr = SecretStr(os.environ.get("POSTGRES_HOST", "postgres"))
     postgres_port: int = int(os.environ.get("POSTGRES_PORT", "5432"))
 
+    # Connection pool of the API engine, per worker process: the database must
+    # allow workers * (db_pool_size + db_max_overflow) connections
+    db_pool_size: int = int(os.environ.get("DB_POOL_SIZE", "5"))
+    db_max_overflow: int = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+    # seconds a request waits for a free connection before failing
+    db_pool_timeout: float = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+    # seconds after which connections are replaced, -1 keeps them forever
+    db_pool_recycle: int = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+    db_pool_pre_ping: bool = (
+        os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+    )
+    # prepared statements kept per asyncpg connection, 0 behind PgBouncer in
+    # transaction pooling mode
+    db_statement_cache_size: int = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", "100"))
+
+    # Read replicas serving the book list, search and export: comma separated
+    # async URLs, each with its own pool sized like the primary's
+    database_replica_urls: str = os.environ.get("DATABASE_REPLICA_URLS", "")
+    # round_robin or least_connections
+    replica_selection: str = os.environ.get("REPLICA_SELECTION", "round_robin")
+    # seconds a replica that failed to connect is skipped
+    replica_retry_interval: float = float(
+        os.environ.get("REPLICA_RETRY_INTERVAL", "30")
+    )
+    # seconds between health checks of the replicas, 0 disables the check task
+    replica_health_check_interval: float = float(
+        os.environ.get("REPLICA_HEALTH_CHECK_INTERVAL", "10")
+    )
+    # seconds a client's reads stay on the primary after it created books
+    read_your_writes_window: float = float(
+        os.environ.get("READ_YOUR_WRITES_WINDOW", "5")
+    )
+
+    # Write-behind `POST /book/create`: creates are committed in batches by a
+    # background task, each request still waits for its batch's commit
+    book_create_write_behind: bool = (
+        os.environ.get("BOOK_CREATE_WRITE_BEHIND", "false").lower() == "true"
+    )
+    book_create_batch_max_size: int = int(
+        os.environ.get("BOOK_CREATE_BATCH_MAX_SIZE", "100")
+    )
+    # how long the first create of a batch waits for more to join it
+    book_create_batch_max_delay_ms: float = float(
+        os.environ.get("BOOK_CREATE_BATCH_MAX_DELAY_MS", "5")
+    )
+    book_create_queue_maxsize: int = int(
+        os.environ.get("BOOK_CREATE_QUEUE_MAXSIZE", "10000")
+    )
+
+    # Book list response cache
+    book_list_cache_enabled: bool = (
+        os.environ.get("BOOK_LIST_CACHE_ENABLED", "true").lower() == "true"
+    )
+    book_list_cache_maxsize: int = int(
+        os.environ.get("BOOK_LIST_CACHE_MAXSIZE", "1024")
+    )
+    book_list_cache_ttl: float = float(os.environ.get("BOOK_LIST_CACHE_TTL", "30"))
+    # identical concurrent list requests share one query
+    book_list_coalescing_enabled: bool = (
+        os.environ.get("BOOK_LIST_COALESCING_ENABLED", "true").lower() == "true"
+    )
+
+    # Book rows by id (`GET /book/{id}`, `POST /book/batch-get`)
+    book_row_cache_enabled: bool = (
+        os.environ.get("BOOK_ROW_CACHE_ENABLED", "true").lower() == "true"
+    )
+    book_row_cache_maxsize: int = int(os.environ.get("BOOK_ROW_CACHE_MAXSIZE", "50000"))
+    book_row_cache_ttl: float = float(os.environ.get("BOOK_ROW_CACHE_TTL", "600"))
+
+    # Search strategy
+    search_min_length: int = int(os.environ.get("SEARCH_MIN_LENGTH", "2"))
+    search_sample_rows: int = int(os.environ.get("SEARCH_SAMPLE_ROWS", "10000"))
+    search_estimate_ttl: float = float(os.environ.get("SEARCH_ESTIMATE_TTL", "300"))
+    # how many rows an id ordered index walk may read per row a bitmap scan would fetch
+    search_index_walk_factor: float = float(
+        os.environ.get("SEARCH_INDEX_WALK_FACTOR", "1.0")
+    )
+
+    # Book list `include=count,facets`
+    book_count_budget_ms: int = int(os.environ.get("BOOK_COUNT_BUDGET_MS", "500"))
+    # seconds between refreshes of the facet summary, 0 disables the refresh task
+    book_facets_refresh_interval: float = float(
+        os.environ.get("BOOK_FACETS_REFRESH_INTERVAL", "300")
+    )
+
+    # seconds between checks creating the `books` partitions ahead of the id
+    # sequence (migration 0008), the partitions ahead must outlast the inserts of
+    # one interval; 0 disables the task
+    book_partitions_extend_interval: float = float(
+        os.environ.get("BOOK_PARTITIONS_EXTEND_INTERVAL", "60")
+    )
+
+    # `/book/suggest` prefix indexes: distinct values kept per field (the most
+    # frequent), about 150 bytes each, see the `suggest_index_bytes` metric
+    suggest_max_entries: int = int(os.environ.get("SUGGEST_MAX_ENTRIES", "200000"))
+    # seconds between rebuilds from the database, 0 builds only at startup
+    suggest_reload_interval: float = float(
+        os.environ.get("SUGGEST_RELOAD_INTERVAL", "3600")
+    )
+
+    # Rows fetched per round trip from the server-side cursor of `/book/export`
+    export_fetch_size: int = int(os.environ.get("EXPORT_FETCH_SIZE", "1000"))
+
+    # Admission control, see `helpers.admission.AdmissionControlMiddleware`:
+    # requests per second per client (token bucket refill rate, 0 disables) and
+    # the bucket size, i.e. the burst a client may send at once
+    rate_limit_per_second: float = float(os.environ.get("RATE_LIMIT_PER_SECOND", "0"))
+    rate_limit_burst: int = int(os.environ.get("RATE_LIMIT_BURST", "40"))
+    # buckets kept in memory, the least recently seen clients are dropped first
+    rate_limit_max_clients: int = int(
+        os.environ.get("RATE_LIMIT_MAX_CLIENTS", "100000")
+    )
+    # client key header, e.g. X-Forwarded-For behind a proxy; the peer address when empty
+    rate_limit_client_header: str = os.environ.get("RATE_LIMIT_CLIENT_HEADER", "")
+    # expensive requests (searches, large pages, exact counts, exports) running at
+    # once per worker, keep it below the pool size so cheap requests still get a
+    # connection; more wait in a queue of `expensive_request_max_queue`, for at most
+    # `expensive_request_queue_timeout` seconds
+    expensive_request_concurrency: int = int(
+        os.environ.get("EXPENSIVE_REQUEST_CONCURRENCY", "3")
+    )
+    expensive_request_max_queue: int = int(
+        os.environ.get("EXPENSIVE_REQUEST_MAX_QUEUE", "20")
+    )
+    expensive_request_queue_timeout: float = float(
+        os.environ.get("EXPENSIVE_REQUEST_QUEUE_TIMEOUT", "2")
+    )
+    # book list pages from this `limit` up are expensive even without a search
+    expensive_list_limit: int = int(os.environ.get("EXPENSIVE_LIST_LIMIT", "100"))
+
+    # Response compression, see `helpers.compression.CompressionMiddleware`
+    compression_enabled: bool = (
+        os.environ.get("COMPRESSION_ENABLED", "true").lower() == "true"
+    )
+    # smaller bodies are sent as is, compressing them saves less than it costs
+    compression_minimum_size: int = int(
+        os.environ.get("COMPRESSION_MINIMUM_SIZE", "1024")
+    )
+    # bodies (or streamed chunks) from this size up are compressed off the event loop
+    compression_offload_size: int = int(
+        os.environ.get("COMPRESSION_OFFLOAD_SIZE", "65536")
+    )
+    # levels per encoding: gzip 1-9, brotli 0-11, zstd 1-22
+    compression_gzip_level: int = int(os.environ.get("COMPRESSION_GZIP_LEVEL", "5"))
+    compression_brotli_level: int = int(os.environ.get("COMPRESSION_BROTLI_LEVEL", "4"))
+    compression_zstd_level: int = int(os.environ.get("COMPRESSION_ZSTD_LEVEL", "3"))
+
+    # Request instrumentation, see `helpers.timing.ServerTimingMiddleware`
+    server_timing_enabled: bool = (
+        os.environ.get("SERVER_TIMING_ENABLED", "true").lower() == "true"
+    )
+    # requests slower than this are candidates for the slow request log
+    slow_request_threshold_ms: float = float(
+        os.environ.get("SLOW_REQUEST_THRESHOLD_MS", "1000")
+    )
+    # share of the slow requests whose slowest statement gets explained
+    slow_request_sample_rate: float = float(
+        os.environ.get("SLOW_REQUEST_SAMPLE_RATE", "0.1")
+    )
+    slow_request_log_size: int = int(os.environ.get("SLOW_REQUEST_LOG_SIZE", "100"))
+
     class Config:
         env_file = ".env"
         extra = "allow"
 
+    @model_validator(mode="after")
+    def validate_cursor_secret(self) -> "Config":
+        if self.cursor_secret is None:
+            if not self.debug:
+                raise ValueError("CURSOR_SECRET must be set when DEBUG is off")
+            if self.web_concurrency > 1:
+                raise ValueError(
+                    "CURSOR_SECRET must be set when WEB_CONCURRENCY is above 1"
+                )
+            self.cursor_secret = SecretStr(_DEBUG_CURSOR_SECRET)
+        return self
+
     @property
     def async_database_url(self) -> str:
         return (
@@ -29,6 +218,12 @@ class Config(BaseSettings):
             f"@{self.postgres_host.get_secret_value()}:{self.postgres_port}/{self.postgres_db}"
         )
 
+    @property
+    def replica_async_database_urls(self) -> list[str]:
+        return [
+            url.strip() for url in self.database_replica_urls.split(",") if url.strip()
+        ]
+
     @property
     def sync_database_url(self) -> str:
         """Used by Alembic (psychopg2)"""